@@ -1,32 +1,260 @@
-from django.contrib import admin
-from .models import BloodBank, Donor, BloodInventory, BloodRequest, Donation
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from .allocation import allocate_requests
+from .exceptions import InsufficientBloodUnitsError
+from .jobs import enqueue_many
+from .pagination import EstimatedCountPaginator
+from .routers import replica_reads
+from .search import search_filter
+from .tasks import send_request_notices
+from .models import (
+    BloodBank, Donor, BloodInventory, BloodLot, BloodRequest, BloodRequestAllocation, Donation, Job,
+    StockAlert, StockThreshold
+)
+
+class FullTextSearchMixin:
+    """Answer the changelist search box from the full-text index (see search.py)"""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search_filter(queryset, search_term), False
+
+class ReplicaChangeListMixin:
+    """Serve changelist pages (GET) from a read replica when one is configured"""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method not in ('GET', 'HEAD'):
+            return super().changelist_view(request, extra_context)
+        with replica_reads():
+            return super().changelist_view(request, extra_context)
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """Foreign key filter with a search-as-you-type box instead of a link per related row.
+
+    Choices come from the related model's autocomplete view, so its admin
+    needs ``search_fields``. Use as ``list_filter = [('blood_bank', AutocompleteFilter)]``
+    on a LargeTableAdminMixin admin, which adds the widget's scripts.
+    """
+    template = 'admin/blood_bank/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        self.lookup_val = params.get(self.lookup_kwarg)
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.form_field = forms.ModelChoiceField(
+            queryset=field.remote_field.model._default_manager.all(),
+            widget=AutocompleteSelect(field, model_admin.admin_site, attrs={'style': 'width: 100%'}),
+            required=False,
+        )
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg]),
+            'display': _('All'),
+            'widget': self.form_field.widget.render(self.lookup_kwarg, self.lookup_val),
+            'hidden_params': [
+                (name, value) for name, value in changelist.params.items() if name != self.lookup_kwarg
+            ],
+        }
+
+class LargeTableAdminMixin:
+    """Changelist settings for tables with millions of rows.
+
+    Pages are counted with the table statistics instead of COUNT(*) (see
+    EstimatedCountPaginator), the "show all" total is skipped, the date
+    hierarchy finds its periods with index seeks (templatetags/admin_dates.py)
+    and AutocompleteFilter list filters get their scripts. Admins using this
+    should also set list_select_related for the foreign keys they display
+    and put date_hierarchy and ordering on indexed columns.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/blood_bank/large_change_list.html'
+
+    @property
+    def media(self):
+        media = super().media
+        if any(
+            isinstance(spec, (list, tuple)) and issubclass(spec[1], AutocompleteFilter)
+            for spec in self.list_filter
+        ):
+            media += AutocompleteSelect(None, self.admin_site).media
+        return media
 
 @admin.register(BloodBank)
-class BloodBankAdmin(admin.ModelAdmin):
+class BloodBankAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('name', 'contact_number', 'email')
     search_fields = ('name', 'email')
+    # The autocomplete filters and fields page through banks in this order
+    ordering = ('name',)
 
 @admin.register(Donor)
-class DonorAdmin(admin.ModelAdmin):
-    list_display = ('name', 'email', 'age', 'blood_type', 'created_at')
+class DonorAdmin(FullTextSearchMixin, LargeTableAdminMixin, ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ('name', 'email', 'age', 'blood_type', 'last_donation_date', 'next_eligible_date', 'created_at')
     list_filter = ('blood_type', 'created_at')
     search_fields = ('name', 'email')
     ordering = ('-created_at',)
 
 @admin.register(BloodInventory)
-class BloodInventoryAdmin(admin.ModelAdmin):
+class BloodInventoryAdmin(LargeTableAdminMixin, ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('blood_bank', 'blood_group', 'units_available', 'last_updated')
-    list_filter = ('blood_bank', 'blood_group')
+    list_select_related = ('blood_bank',)
+    list_filter = (('blood_bank', AutocompleteFilter), 'blood_group')
+    search_fields = ('blood_bank__name',)
+    autocomplete_fields = ('blood_bank',)
+    # Cached total of the bank's blood lots; changed by donations, approvals and expiry
+    readonly_fields = ('units_available',)
+
+@admin.register(BloodLot)
+class BloodLotAdmin(LargeTableAdminMixin, ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ('blood_bank', 'blood_group', 'units', 'units_remaining', 'collected_at', 'expires_on', 'expired_at')
+    list_select_related = ('blood_bank',)
+    list_filter = (('blood_bank', AutocompleteFilter), 'blood_group', 'expires_on')
     search_fields = ('blood_bank__name',)
+    raw_id_fields = ('donation',)
+
+    # Lots follow donations, approvals and expiry; edits would desync the counters
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+class BloodRequestAllocationInline(admin.TabularInline):
+    model = BloodRequestAllocation
+    extra = 0
+    autocomplete_fields = ('blood_bank',)
 
 @admin.register(BloodRequest)
-class BloodRequestAdmin(admin.ModelAdmin):
-    list_display = ('requester_name', 'blood_group', 'units_required', 'status', 'request_date')
-    list_filter = ('status', 'blood_group')
+class BloodRequestAdmin(FullTextSearchMixin, LargeTableAdminMixin, ReplicaChangeListMixin, admin.ModelAdmin):
+    inlines = [BloodRequestAllocationInline]
+    list_display = (
+        'requester_name', 'blood_group', 'units_required', 'priority', 'status', 'blood_bank', 'request_date'
+    )
+    list_select_related = ('blood_bank',)
+    list_filter = ('status', 'priority', 'blood_group', ('blood_bank', AutocompleteFilter))
     search_fields = ('requester_name', 'hospital_name')
+    autocomplete_fields = ('blood_bank',)
+    # Matches bloodrequest_keyset_idx, so month and day drill-downs are index range scans
+    date_hierarchy = 'request_date'
+    ordering = ('-request_date', '-id')
+    actions = ['approve_selected', 'reject_selected']
+
+    @admin.action(description=_('Approve selected pending requests'), permissions=['change'])
+    def approve_selected(self, request, queryset):
+        # One batch: planned in memory, written in a single transaction.
+        # A request keeps its assigned bank when that bank can fill it.
+        try:
+            report = allocate_requests(queryset)
+        except InsufficientBloodUnitsError as exc:
+            self.message_user(request, f"Nothing was approved: {exc}", messages.ERROR)
+            return
+        self.message_user(
+            request,
+            f"Approved {len(report.approved)} request(s), allocating {report.units_allocated} unit(s)."
+        )
+        if report.left_pending:
+            self.message_user(
+                request,
+                f"{report.left_pending} request(s) left pending: not enough stock.",
+                messages.WARNING,
+            )
+
+    @admin.action(description=_('Reject selected pending requests'), permissions=['change'])
+    def reject_selected(self, request, queryset):
+        # A single UPDATE; only pending requests hold no stock to give back
+        with transaction.atomic():
+            ids = list(
+                queryset.filter(status='pending').select_for_update().values_list('pk', flat=True)
+            )
+            rejected = BloodRequest.objects.filter(pk__in=ids, status='pending').update(
+                status='rejected', updated_at=timezone.now()
+            )
+            enqueue_many(send_request_notices, [{'request_id': pk, 'event': 'rejected'} for pk in ids])
+        self.message_user(request, f"Rejected {rejected} request(s).")
 
 @admin.register(Donation)
-class DonationAdmin(admin.ModelAdmin):
+class DonationAdmin(LargeTableAdminMixin, ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('donor', 'blood_bank', 'blood_group', 'units_donated', 'donation_date')
-    list_filter = ('blood_bank', 'blood_group')
+    list_select_related = ('donor', 'blood_bank')
+    list_filter = (('blood_bank', AutocompleteFilter), ('donor', AutocompleteFilter), 'blood_group')
     search_fields = ('donor__name', 'blood_bank__name')
+    autocomplete_fields = ('donor', 'blood_bank')
+    # Matches donation_keyset_idx
+    date_hierarchy = 'donation_date'
+    ordering = ('-donation_date', '-id')
+
+    def get_search_results(self, request, queryset, search_term):
+        # Donors through their full-text index and banks (a small table) by
+        # name, rather than LIKE over a join for every donation
+        if not search_term.strip():
+            return queryset, False
+        donors = search_filter(Donor.objects.using(queryset.db), search_term)
+        banks = BloodBank.objects.using(queryset.db).filter(name__icontains=search_term)
+        return queryset.filter(Q(donor__in=donors) | Q(blood_bank__in=banks)), False
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('name',)
+    readonly_fields = ('claimed_by', 'claimed_at', 'last_error', 'created_at', 'finished_at')
+    ordering = ('-id',)
+    actions = ['retry_selected']
+
+    @admin.action(description=_('Retry selected failed jobs'), permissions=['change'])
+    def retry_selected(self, request, queryset):
+        retried = queryset.filter(status='failed').update(
+            status='queued', attempts=0, run_at=timezone.now(), finished_at=None
+        )
+        self.message_user(request, f"Queued {retried} job(s) again.")
+
+@admin.register(StockThreshold)
+class StockThresholdAdmin(admin.ModelAdmin):
+    list_display = ('blood_bank', 'blood_group', 'low_units', 'clear_units')
+    list_select_related = ('blood_bank',)
+    list_filter = ('blood_group',)
+    search_fields = ('blood_bank__name',)
+    autocomplete_fields = ('blood_bank',)
+
+class OpenAlertFilter(admin.SimpleListFilter):
+    title = _('state')
+    parameter_name = 'state'
+
+    def lookups(self, request, model_admin):
+        return (('open', _('Open')), ('cleared', _('Cleared')))
+
+    def queryset(self, request, queryset):
+        if self.value() == 'open':
+            return queryset.filter(cleared_at__isnull=True)
+        if self.value() == 'cleared':
+            return queryset.filter(cleared_at__isnull=False)
+        return queryset
+
+@admin.register(StockAlert)
+class StockAlertAdmin(LargeTableAdminMixin, ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ('blood_bank', 'blood_group', 'units_at_open', 'low_units', 'opened_at', 'cleared_at', 'units_at_clear')
+    list_select_related = ('blood_bank',)
+    list_filter = (OpenAlertFilter, ('blood_bank', AutocompleteFilter), 'blood_group')
+    date_hierarchy = 'opened_at'
+    ordering = ('-opened_at', '-id')
+
+    # Alerts follow the stock; see alerts.py
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
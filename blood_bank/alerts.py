@@ -0,0 +1,183 @@
+"""
+Low-stock alerts per bank and blood group.
+
+Every change to a BloodInventory row is checked on its own, in the
+transaction of the change, against the StockThreshold for its bank and
+group: an alert opens when the units cross down to the low level and
+clears when they cross back up to the clear level. The change supplies the
+units before and after, so deciding needs neither a query nor a scan;
+the only writes are the crossings themselves. The thresholds are small
+and cached in each process, reloaded after they change (see signals.py)
+and at least every STOCK_THRESHOLD_TTL seconds.
+
+Changes that don't say what the stock was before (saves of a row), and
+bulk changes such as imports and recounts, are checked against the stored
+state instead: ``evaluate_stock_alerts`` compares the stock of every
+bank with a threshold against the open alerts and writes the difference.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from .models import BloodBank, BloodGroup, BloodInventory, StockAlert, StockThreshold
+
+# Alerts cleared per UPDATE in bulk mode
+BATCH_SIZE = 500
+
+
+class ThresholdCache:
+    """In-process copy of the StockThreshold table"""
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._levels = None
+        self._loaded_at = 0.0
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'STOCK_THRESHOLD_TTL', 300)
+
+    def _get_levels(self):
+        levels = self._levels
+        if levels is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return levels
+        levels = {
+            (bank_id, group): (low, clear)
+            for bank_id, group, low, clear in StockThreshold.objects.values_list(
+                'blood_bank_id', 'blood_group', 'low_units', 'clear_units'
+            )
+        }
+        with self._lock:
+            self._levels = levels
+            self._loaded_at = time.monotonic()
+        return levels
+
+    def invalidate(self):
+        with self._lock:
+            self._levels = None
+
+    def get(self, blood_bank_id, blood_group):
+        """``(low_units, clear_units)`` for a bank's group, or None without a threshold"""
+        levels = self._get_levels()
+        found = levels.get((blood_bank_id, blood_group))
+        if found is None:
+            found = levels.get((None, blood_group))
+        return found
+
+    def is_empty(self):
+        return not self._get_levels()
+
+
+stock_thresholds = ThresholdCache()
+
+
+def _open_alert(blood_bank_id, blood_group, units, low_units):
+    try:
+        # Savepoint: an alert already open for the row is not an error
+        with transaction.atomic():
+            return StockAlert.objects.create(
+                blood_bank_id=blood_bank_id, blood_group=blood_group,
+                low_units=low_units, units_at_open=units
+            )
+    except IntegrityError:
+        return None
+
+
+def _clear_alert(blood_bank_id, blood_group, units):
+    return StockAlert.objects.filter(
+        blood_bank_id=blood_bank_id, blood_group=blood_group, cleared_at__isnull=True
+    ).update(cleared_at=timezone.now(), units_at_clear=units)
+
+
+def stock_changed(blood_bank_id, blood_group, units, previous_units=None):
+    """Open or clear the alert of one bank's group after its stock changed.
+
+    With ``previous_units`` only a crossing of a level writes anything;
+    without it the row is compared with its open alert, costing a query.
+    """
+    levels = stock_thresholds.get(blood_bank_id, blood_group)
+    if levels is None:
+        return
+    low, clear = levels
+    if previous_units is None:
+        if units <= low:
+            if not StockAlert.objects.filter(
+                blood_bank_id=blood_bank_id, blood_group=blood_group, cleared_at__isnull=True
+            ).exists():
+                _open_alert(blood_bank_id, blood_group, units, low)
+        elif units >= clear:
+            _clear_alert(blood_bank_id, blood_group, units)
+    elif units <= low < previous_units:
+        _open_alert(blood_bank_id, blood_group, units, low)
+    elif previous_units < clear <= units:
+        _clear_alert(blood_bank_id, blood_group, units)
+
+
+def stock_levels_changed(changes):
+    """``stock_changed`` for many ``(blood_bank_id, blood_group, units, previous_units)``"""
+    if stock_thresholds.is_empty():
+        return
+    for blood_bank_id, blood_group, units, previous_units in changes:
+        stock_changed(blood_bank_id, blood_group, units, previous_units)
+
+
+def evaluate_stock_alerts(bank_ids=None, blood_groups=None):
+    """Bring the open alerts in line with the current stock; returns ``(opened, cleared)``.
+
+    Reads the stock, the thresholds and the open alerts once each and
+    writes the alerts to open with one insert and those to clear with one
+    UPDATE per batch. Banks without a row for a group have none of it.
+    """
+    if stock_thresholds.is_empty():
+        return 0, 0
+    groups = list(blood_groups or BloodGroup.GROUPS)
+    banks = BloodBank.objects.all()
+    stock = BloodInventory.objects.filter(blood_group__in=groups)
+    alerts = StockAlert.objects.filter(cleared_at__isnull=True, blood_group__in=groups)
+    if bank_ids is not None:
+        banks = banks.filter(pk__in=bank_ids)
+        stock = stock.filter(blood_bank_id__in=bank_ids)
+        alerts = alerts.filter(blood_bank_id__in=bank_ids)
+
+    with transaction.atomic():
+        units = {
+            (bank_id, group): available
+            for bank_id, group, available in stock.values_list('blood_bank_id', 'blood_group', 'units_available')
+        }
+        open_alerts = {
+            (bank_id, group): alert_id
+            for alert_id, bank_id, group in alerts.values_list('id', 'blood_bank_id', 'blood_group')
+        }
+        to_open, to_clear = [], {}
+        for bank_id in banks.values_list('id', flat=True).iterator():
+            for group in groups:
+                levels = stock_thresholds.get(bank_id, group)
+                if levels is None:
+                    continue
+                low, clear = levels
+                available = units.get((bank_id, group), 0)
+                alert_id = open_alerts.get((bank_id, group))
+                if alert_id is None and available <= low:
+                    to_open.append(StockAlert(
+                        blood_bank_id=bank_id, blood_group=group, low_units=low, units_at_open=available
+                    ))
+                elif alert_id is not None and available >= clear:
+                    to_clear[alert_id] = available
+
+        StockAlert.objects.bulk_create(to_open, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        now = timezone.now()
+        cleared = list(to_clear.items())
+        for start in range(0, len(cleared), BATCH_SIZE):
+            chunk = cleared[start:start + BATCH_SIZE]
+            StockAlert.objects.filter(pk__in=[pk for pk, _ in chunk], cleared_at__isnull=True).update(
+                cleared_at=now,
+                units_at_clear=Case(*(When(pk=pk, then=Value(available)) for pk, available in chunk))
+            )
+    return len(to_open), len(to_clear)
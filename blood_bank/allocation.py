@@ -0,0 +1,343 @@
+"""
+Allocation of blood requests to bank stock.
+
+An Allocator works on an in-memory stock matrix (``{group: {bank_id: units}}``,
+as returned by ``availability_matrix.snapshot()``) and plans where the units
+of a request should come from. Donor groups are tried in the order given by
+``BloodGroup.compatible_donors`` and, within a group, the banks holding the
+most units are used first, so a request is served by a single bank whenever
+one bank can cover it. Requests with a hospital location use the nearest
+banks of each group first instead (see geo.py).
+"""
+import heapq
+from collections import Counter, namedtuple
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .alerts import stock_levels_changed
+from .exceptions import InsufficientBloodUnitsError
+from .geo import BULK_CHUNK, bank_locations
+from .jobs import enqueue, enqueue_many
+from .models import BloodGroup, BloodInventory, BloodLot, BloodRequest, BloodRequestAllocation
+from .response_cache import data_changed
+from .tasks import refresh_rollups, send_request_notices
+
+# Rows per UPDATE/INSERT statement, kept well below SQLite's variable limit
+BATCH_SIZE = 500
+
+# Nearest banks tried in order for a located request in a batch; the rest
+# are used largest stock first
+NEAREST_BANKS = 20
+
+AllocationLine = namedtuple('AllocationLine', ['blood_bank_id', 'blood_group', 'units'])
+
+
+class AllocationPlan:
+    """Where the units of one blood request come from"""
+
+    def __init__(self, blood_group, units_required, lines):
+        self.blood_group = blood_group
+        self.units_required = units_required
+        self.lines = lines
+
+    def __repr__(self):
+        return f"<AllocationPlan {self.blood_group} x{self.units_required}: {self.lines}>"
+
+    @property
+    def units_allocated(self):
+        return sum(line.units for line in self.lines)
+
+    @property
+    def shortfall(self):
+        return self.units_required - self.units_allocated
+
+    @property
+    def is_complete(self):
+        return self.shortfall <= 0
+
+    @property
+    def primary_bank_id(self):
+        """The bank supplying the largest share of the request"""
+        if not self.lines:
+            return None
+        return max(self.lines, key=lambda line: line.units).blood_bank_id
+
+
+class Allocator:
+    """Plans allocations against a stock matrix and optionally consumes it.
+
+    Each blood group keeps a max-heap of ``(-units, bank_id)``; entries that
+    no longer match the stock are skipped lazily, so a plan costs
+    O(k log N) for k banks used instead of a scan over every bank.
+    """
+
+    def __init__(self, stock):
+        self.stock = stock
+        self._heaps = {}
+
+    def _heap(self, blood_group):
+        heap = self._heaps.get(blood_group)
+        if heap is None:
+            heap = [(-units, bank_id) for bank_id, units in self.stock.get(blood_group, {}).items() if units > 0]
+            heapq.heapify(heap)
+            self._heaps[blood_group] = heap
+        return heap
+
+    def _pop_largest(self, blood_group):
+        """Remove and return the bank with the most units of a group"""
+        heap = self._heap(blood_group)
+        column = self.stock.get(blood_group, {})
+        while heap:
+            units, bank_id = heapq.heappop(heap)
+            if column.get(bank_id, 0) == -units:
+                return bank_id, -units
+        return None
+
+    def plan(self, blood_group, units_required, bank_order=None):
+        """Plan a request; the returned plan may be incomplete when stock is short.
+
+        ``bank_order`` lists bank ids to draw from first (nearest first);
+        banks not in it are still used afterwards, largest stock first.
+        """
+        lines = []
+        remaining = units_required
+        for donor_group in BloodGroup.compatible_donors(blood_group):
+            used = set()
+            if bank_order is not None and remaining > 0:
+                column = self.stock.get(donor_group, {})
+                for bank_id in bank_order:
+                    units = column.get(bank_id, 0)
+                    if units <= 0 or bank_id in used:
+                        continue
+                    used.add(bank_id)
+                    take = min(units, remaining)
+                    lines.append(AllocationLine(bank_id, donor_group, take))
+                    remaining -= take
+                    if remaining <= 0:
+                        break
+
+            popped = []
+            while remaining > 0:
+                largest = self._pop_largest(donor_group)
+                if largest is None:
+                    break
+                popped.append(largest)
+                bank_id, units = largest
+                if bank_id in used:
+                    continue
+                take = min(units, remaining)
+                lines.append(AllocationLine(bank_id, donor_group, take))
+                remaining -= take
+            # Planning doesn't consume stock, so put the banks back
+            heap = self._heap(donor_group)
+            for bank_id, units in popped:
+                heapq.heappush(heap, (-units, bank_id))
+            if remaining <= 0:
+                break
+        return AllocationPlan(blood_group, units_required, lines)
+
+    def plan_from(self, bank_id, blood_group, units_required):
+        """Plan a request from a single bank, or None when it can't fill it"""
+        lines = []
+        remaining = units_required
+        for donor_group in BloodGroup.compatible_donors(blood_group):
+            units = self.stock.get(donor_group, {}).get(bank_id, 0)
+            if units <= 0:
+                continue
+            take = min(units, remaining)
+            lines.append(AllocationLine(bank_id, donor_group, take))
+            remaining -= take
+            if remaining <= 0:
+                return AllocationPlan(blood_group, units_required, lines)
+        return None
+
+    def commit(self, plan):
+        """Take the units of a plan out of the stock matrix"""
+        for bank_id, group, units in plan.lines:
+            column = self.stock[group]
+            left = column[bank_id] - units
+            if left > 0:
+                column[bank_id] = left
+                heapq.heappush(self._heap(group), (-left, bank_id))
+            else:
+                column.pop(bank_id, None)
+
+
+def plan_allocation(blood_group, units_required, stock=None, near=None):
+    """Plan a single request against the current (cached) stock.
+
+    ``near`` is an optional ``(latitude, longitude)`` of the hospital.
+    """
+    if stock is None:
+        from .availability import availability_matrix
+
+        stock = availability_matrix.snapshot()
+    bank_order = None
+    if near is not None:
+        # As in a batch: the NEAREST_BANKS nearest banks with stock to use,
+        # then the rest largest stock first
+        columns = [stock.get(group, {}) for group in BloodGroup.compatible_donors(blood_group)]
+        nearest = bank_locations.iter_nearest(
+            *near, accept=lambda bank_id: any(column.get(bank_id, 0) > 0 for column in columns)
+        )
+        bank_order = [bank_id for bank_id, _ in islice(nearest, NEAREST_BANKS)]
+    return Allocator(stock).plan(blood_group, units_required, bank_order)
+
+
+class BatchAllocationReport:
+    """Outcome of allocating a batch of pending requests"""
+
+    def __init__(self):
+        self.considered = 0
+        self.approved = []
+        self.units_allocated = 0
+        self.units_by_group = Counter()
+
+    @property
+    def left_pending(self):
+        return self.considered - len(self.approved)
+
+
+def _chunks(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def allocate_requests(requests=None, dry_run=False):
+    """Allocate and approve pending requests in one batch.
+
+    The backlog and the stock are each read with a single query, every
+    request is planned in memory by priority and age, and the approvals
+    are written in one transaction with bulk statements. A request keeps
+    the bank it was assigned when that bank alone can fill it; otherwise
+    it is assigned the bank supplying most of its units. Requests that
+    cannot be filled completely stay pending. Raises
+    InsufficientBloodUnitsError, rolling everything back, when stock or
+    requests were changed by someone else while the batch was planned.
+    """
+    if requests is None:
+        requests = BloodRequest.objects.all()
+    if not dry_run:
+        # Expired lots aren't stock, whether or not the daily sweep has run
+        BloodLot.objects.expire()
+    pending = list(
+        requests.filter(status='pending')
+        .order_by('-priority', 'request_date', 'id')
+        .values_list(
+            'id', 'blood_group', 'units_required', 'hospital_latitude', 'hospital_longitude', 'blood_bank_id'
+        )
+    )
+
+    stock = {group: {} for group in BloodGroup.GROUPS}
+    inventory_ids = {}
+    rows = BloodInventory.objects.filter(units_available__gt=0).values_list(
+        'id', 'blood_bank_id', 'blood_group', 'units_available'
+    )
+    for inventory_id, bank_id, group, units in rows:
+        stock[group][bank_id] = units
+        inventory_ids[bank_id, group] = inventory_id
+
+    report = BatchAllocationReport()
+    report.considered = len(pending)
+    allocator = Allocator(stock)
+    plans = {}
+    stocked_banks = {bank_id for bank_id, _ in inventory_ids}
+    for chunk in _chunks(pending, BULK_CHUNK):
+        # Nearest-first bank orders for the located requests of the chunk,
+        # from one distance matrix
+        located = [row for row in chunk if row[3] is not None and row[4] is not None]
+        orders = {}
+        if located:
+            points = [(lat, lon) for _, _, _, lat, lon, _ in located]
+            bank_orders = bank_locations.orders_for(points, stocked_banks, limit=NEAREST_BANKS)
+            for row, order in zip(located, bank_orders):
+                orders[row[0]] = order
+
+        for request_id, blood_group, units_required, _, _, assigned_bank_id in chunk:
+            plan = None
+            if assigned_bank_id is not None:
+                plan = allocator.plan_from(assigned_bank_id, blood_group, units_required)
+            if plan is None:
+                plan = allocator.plan(blood_group, units_required, orders.get(request_id))
+            if not plan.is_complete:
+                continue
+            allocator.commit(plan)
+            plans[request_id] = plan
+            report.approved.append(request_id)
+            report.units_allocated += units_required
+            report.units_by_group[blood_group] += units_required
+
+    if dry_run or not plans:
+        return report
+
+    consumed = Counter()
+    consumed_lots = Counter()
+    for plan in plans.values():
+        for bank_id, group, units in plan.lines:
+            consumed[inventory_ids[bank_id, group]] += units
+            consumed_lots[bank_id, group] += units
+
+    request_ids = list(plans)
+    with transaction.atomic():
+        now = timezone.now()
+        for chunk in _chunks(list(consumed.items())):
+            BloodInventory.objects.filter(pk__in=[pk for pk, _ in chunk]).update(
+                units_available=Case(
+                    *(When(pk=pk, then=F('units_available') - Value(units)) for pk, units in chunk)
+                ),
+                last_updated=now
+            )
+        if BloodInventory.objects.filter(pk__in=list(consumed), units_available__lt=0).exists():
+            raise InsufficientBloodUnitsError("Stock changed while allocating; run the batch again")
+        BloodLot.objects.consume_fifo(consumed_lots)
+
+        # Approve and assign in one statement per primary bank, only
+        # touching requests that are still pending
+        by_bank = {}
+        for pk in request_ids:
+            by_bank.setdefault(plans[pk].primary_bank_id, []).append(pk)
+        claimed = 0
+        for bank_id, pks in by_bank.items():
+            for chunk in _chunks(pks):
+                claimed += BloodRequest.objects.filter(pk__in=chunk, status='pending').update(
+                    status='approved', blood_bank_id=bank_id, updated_at=now
+                )
+        if claimed != len(request_ids):
+            raise InsufficientBloodUnitsError("Requests changed while allocating; run the batch again")
+
+        for chunk in _chunks(request_ids):
+            BloodRequestAllocation.objects.filter(request_id__in=chunk).delete()
+        BloodRequestAllocation.objects.bulk_create(
+            (
+                BloodRequestAllocation(
+                    request_id=pk,
+                    blood_bank_id=line.blood_bank_id,
+                    blood_group=line.blood_group,
+                    units=line.units
+                )
+                for pk in request_ids
+                for line in plans[pk].lines
+            ),
+            batch_size=BATCH_SIZE
+        )
+
+        # Bulk updates bypass the signals that patch the caches
+        from .availability import availability_matrix
+
+        transaction.on_commit(availability_matrix.invalidate)
+        data_changed(BloodInventory, bank_ids={bank_id for bank_id, _ in consumed_lots})
+
+        levels = BloodInventory.objects.filter(pk__in=list(consumed)).values_list(
+            'pk', 'blood_bank_id', 'blood_group', 'units_available'
+        )
+        stock_levels_changed(
+            (bank_id, group, units, units + consumed[pk]) for pk, bank_id, group, units in levels
+        )
+
+        enqueue_many(send_request_notices, [{'request_id': pk, 'event': 'approved'} for pk in request_ids])
+        enqueue(refresh_rollups)
+
+    return report
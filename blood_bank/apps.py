@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BloodBankConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blood_bank'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import tasks  # noqa: F401  registers the background jobs
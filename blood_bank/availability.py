@@ -0,0 +1,132 @@
+"""
+Process-local cache of blood stock for fast availability lookups.
+
+Stock is small and dense: 8 blood groups times N banks. The whole matrix is
+loaded with one query, kept in memory and patched by the signal handlers in
+``blood_bank.signals`` whenever a BloodInventory row changes in this process.
+Changes made by other processes become visible once the TTL expires
+(``BLOOD_AVAILABILITY_CACHE_TTL`` seconds, 0 disables the cache).
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from .models import BloodGroup, BloodInventory
+
+
+class AvailabilityMatrix:
+    """Blood group x blood bank matrix of available units"""
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._loaded_at = 0.0
+        # Changes recorded while loads are running, so each load can replay
+        # the ones committed after it started; None when nothing is loading
+        self._pending = None
+        self._loading = 0
+        # Bumped by invalidate(), so a load started before it isn't installed
+        self._generation = 0
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'BLOOD_AVAILABILITY_CACHE_TTL', 30)
+
+    def is_warm(self):
+        return (
+            self._matrix is not None
+            and time.monotonic() - self._loaded_at < self.ttl
+        )
+
+    def _rows(self):
+        return BloodInventory.objects.filter(units_available__gt=0).values_list(
+            'blood_bank_id', 'blood_group', 'units_available'
+        )
+
+    def _load(self):
+        """Rebuild the matrix from the database"""
+        with self._lock:
+            if self._pending is None:
+                self._pending = []
+            self._loading += 1
+            start = len(self._pending)
+            generation = self._generation
+        try:
+            matrix = {group: {} for group, _ in BloodGroup.BLOOD_GROUPS}
+            for bank_id, group, units in self._rows():
+                matrix[group][bank_id] = units
+            with self._lock:
+                # Replay changes committed while the query was running
+                for bank_id, group, units in self._pending[start:]:
+                    self._apply(matrix, bank_id, group, units)
+                if generation == self._generation:
+                    self._matrix = matrix
+                    self._loaded_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._loading -= 1
+                if not self._loading:
+                    self._pending = None
+        return matrix
+
+    def _get_matrix(self):
+        if self.is_warm():
+            return self._matrix
+        return self._load()
+
+    @staticmethod
+    def _apply(matrix, bank_id, blood_group, units):
+        column = matrix.setdefault(blood_group, {})
+        if units and units > 0:
+            column[bank_id] = units
+        else:
+            column.pop(bank_id, None)
+
+    def get_units(self, blood_bank_id, blood_group):
+        return self._get_matrix()[blood_group].get(blood_bank_id, 0)
+
+    def get_group(self, blood_group):
+        """Return ``{bank_id: units}`` for every bank holding the group"""
+        return dict(self._get_matrix()[blood_group])
+
+    def snapshot(self):
+        """Return a copy of the whole matrix that callers may modify"""
+        return {group: dict(column) for group, column in self._get_matrix().items()}
+
+    def banks_with_stock(self, blood_group, units_required):
+        """Return ``(bank_id, units)`` pairs holding enough units, largest stock first"""
+        column = self._get_matrix()[blood_group]
+        return sorted(
+            ((bank_id, units) for bank_id, units in column.items() if units >= units_required),
+            key=lambda item: (-item[1], item[0])
+        )
+
+    def set_units(self, blood_bank_id, blood_group, units):
+        """Record the current stock level of one bank/group cell"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((blood_bank_id, blood_group, units))
+            if self._matrix is not None:
+                self._apply(self._matrix, blood_bank_id, blood_group, units)
+
+    def discard_bank(self, blood_bank_id):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.extend(
+                    (blood_bank_id, group, 0) for group, _ in BloodGroup.BLOOD_GROUPS
+                )
+            if self._matrix is not None:
+                for column in self._matrix.values():
+                    column.pop(blood_bank_id, None)
+
+    def invalidate(self):
+        with self._lock:
+            self._matrix = None
+            self._generation += 1
+
+
+availability_matrix = AvailabilityMatrix()
@@ -0,0 +1,121 @@
+"""
+Streaming exports of donations, blood requests and inventory.
+
+Rows are read with ``QuerySet.iterator()`` and written out one at a time
+through a StreamingHttpResponse, so memory use does not grow with the size
+of the table.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import BloodInventory, BloodRequest, Donation
+
+# Rows fetched from the database per round trip
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose write() just returns the value, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+# Each export: (queryset, date field used for the range filter, columns).
+# Columns are (header, lookup) pairs read with values_list().
+EXPORTS = {
+    'donations': (
+        lambda: Donation.objects.order_by('id'),
+        'donation_date',
+        [
+            ('id', 'id'),
+            ('donation_date', 'donation_date'),
+            ('donor', 'donor__name'),
+            ('donor_email', 'donor__email'),
+            ('blood_bank_id', 'blood_bank_id'),
+            ('blood_bank', 'blood_bank__name'),
+            ('blood_group', 'blood_group'),
+            ('units_donated', 'units_donated'),
+        ],
+    ),
+    'requests': (
+        lambda: BloodRequest.objects.order_by('id'),
+        'request_date',
+        [
+            ('id', 'id'),
+            ('request_date', 'request_date'),
+            ('requester_name', 'requester_name'),
+            ('hospital_name', 'hospital_name'),
+            ('blood_bank_id', 'blood_bank_id'),
+            ('blood_bank', 'blood_bank__name'),
+            ('blood_group', 'blood_group'),
+            ('units_required', 'units_required'),
+            ('priority', 'priority'),
+            ('status', 'status'),
+        ],
+    ),
+    'inventory': (
+        lambda: BloodInventory.objects.order_by('blood_bank_id', 'blood_group'),
+        'last_updated',
+        [
+            ('blood_bank_id', 'blood_bank_id'),
+            ('blood_bank', 'blood_bank__name'),
+            ('blood_group', 'blood_group'),
+            ('units_available', 'units_available'),
+            ('last_updated', 'last_updated'),
+        ],
+    ),
+}
+
+
+def export_rows(name, start=None, end=None, blood_bank=None, blood_group=None):
+    """Return the column headers and a row iterator for one export"""
+    get_queryset, date_field, columns = EXPORTS[name]
+    queryset = get_queryset()
+    # Compare against datetimes rather than with __date so the date
+    # column's index can be used
+    if start:
+        since = timezone.make_aware(datetime.combine(start, time.min))
+        queryset = queryset.filter(**{f'{date_field}__gte': since})
+    if end:
+        until = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+        queryset = queryset.filter(**{f'{date_field}__lt': until})
+    if blood_bank:
+        queryset = queryset.filter(blood_bank=blood_bank)
+    if blood_group:
+        queryset = queryset.filter(blood_group=blood_group)
+    # The rows are only read once the response streams, after the view has
+    # returned, so fix the database alias while the view's routing applies
+    queryset = queryset.using(queryset.db)
+    headers = [header for header, _ in columns]
+    rows = queryset.values_list(*(lookup for _, lookup in columns)).iterator(chunk_size=CHUNK_SIZE)
+    return headers, rows
+
+
+def stream_csv(headers, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(headers, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def export_response(name, export_format='csv', **filters):
+    headers, rows = export_rows(name, **filters)
+    if export_format == 'ndjson':
+        response = StreamingHttpResponse(stream_ndjson(headers, rows), content_type='application/x-ndjson')
+        extension = 'ndjson'
+    else:
+        response = StreamingHttpResponse(stream_csv(headers, rows), content_type='text/csv')
+        extension = 'csv'
+    response['Content-Disposition'] = f'attachment; filename="{name}.{extension}"'
+    return response
@@ -1,6 +1,7 @@
 from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from .models import BloodBank, Donor, BloodRequest, Donation
+from .models import BloodBank, BloodGroup, Donor, BloodRequest, Donation
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -44,13 +45,23 @@ class DonorProfileForm(forms.ModelForm):
             raise ValidationError("Donor must be at least 18 years old.")
         return dob
 
+def _check_coordinates(cleaned_data, latitude, longitude):
+    """A location needs both coordinates or neither"""
+    if (cleaned_data.get(latitude) is None) != (cleaned_data.get(longitude) is None):
+        raise ValidationError("Give both latitude and longitude, or neither.")
+
 # Blood Request Form
 class BloodRequestForm(forms.ModelForm):
-    """Form for blood requests"""
+    """Form for blood requests.
+
+    Open to anyone, so it leaves out ``priority``: public requests are
+    Routine and only staff raise them, in the admin.
+    """
     class Meta:
         model = BloodRequest
-        fields = ['requester_name', 'blood_group', 'units_required', 
-                 'hospital_name', 'hospital_address', 'contact_number', 'email']
+        fields = ['requester_name', 'blood_group', 'units_required',
+                 'hospital_name', 'hospital_address', 'hospital_latitude', 'hospital_longitude',
+                 'contact_number', 'email']
         
     def clean_units_required(self):
         units = self.cleaned_data['units_required']
@@ -60,6 +71,11 @@ class BloodRequestForm(forms.ModelForm):
             raise ValidationError("Cannot request more than 10 units at once")
         return units
 
+    def clean(self):
+        cleaned_data = super().clean()
+        _check_coordinates(cleaned_data, 'hospital_latitude', 'hospital_longitude')
+        return cleaned_data
+
 # Donation Form
 class DonationForm(forms.ModelForm):
     """Form for blood donations"""
@@ -78,7 +94,8 @@ class DonationForm(forms.ModelForm):
         cleaned_data = super().clean()
         if self.donor and not self.donor.can_donate():
             raise ValidationError(
-                "You must wait at least 90 days between donations."
+                f"You must wait at least {settings.MINIMUM_DONATION_INTERVAL_DAYS} days between "
+                f"donations. You can donate again from {self.donor.next_eligible_date:%B %d, %Y}."
             )
         return cleaned_data
 
@@ -87,7 +104,7 @@ class BloodBankForm(forms.ModelForm):
     """Form for blood bank registration"""
     class Meta:
         model = BloodBank
-        fields = ['name', 'address', 'contact_number', 'email']
+        fields = ['name', 'address', 'latitude', 'longitude', 'contact_number', 'email']
         widgets = {
             'address': forms.Textarea(attrs={'rows': 3}),
         }
@@ -97,3 +114,62 @@ class BloodBankForm(forms.ModelForm):
         if not phone.startswith('+'):
             raise ValidationError("Phone number must start with country code (e.g., +1)")
         return phone
+
+    def clean(self):
+        cleaned_data = super().clean()
+        _check_coordinates(cleaned_data, 'latitude', 'longitude')
+        return cleaned_data
+
+
+# Export filters
+class ExportFilterForm(forms.Form):
+    """Filters accepted by the CSV/NDJSON export endpoints"""
+    FORMAT_CHOICES = [('csv', 'CSV'), ('ndjson', 'NDJSON')]
+
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    blood_bank = forms.IntegerField(required=False, min_value=1)
+    blood_group = forms.ChoiceField(
+        choices=[('', 'Any')] + BloodGroup.BLOOD_GROUPS, required=False
+    )
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and start > end:
+            raise ValidationError("The start date must not be after the end date.")
+        return cleaned_data
+
+class RollupFilterForm(ExportFilterForm):
+    """Filters accepted by the rollup report endpoint"""
+    BY_CHOICES = [('day', 'Day'), ('bank', 'Blood bank'), ('group', 'Blood group')]
+
+    format = None
+    by = forms.ChoiceField(choices=BY_CHOICES, required=False)
+
+# Bulk import forms. Uniqueness is checked per chunk by the import command
+# rather than with one query per row.
+class BloodBankImportForm(BloodBankForm):
+    def validate_unique(self):
+        pass
+
+class DonorImportForm(DonorRegistrationForm):
+    created_at = forms.DateTimeField(required=False)
+
+    class Meta(DonorRegistrationForm.Meta):
+        fields = ['name', 'email', 'age', 'blood_type', 'created_at']
+
+    def validate_unique(self):
+        pass
+
+class DonationImportForm(forms.Form):
+    """Form for one row of a historical donations file"""
+    donor_email = forms.EmailField()
+    bank_name = forms.CharField(max_length=100)
+    blood_group = forms.ChoiceField(choices=BloodGroup.BLOOD_GROUPS)
+    units_donated = forms.IntegerField(min_value=1)
+    donation_date = forms.DateTimeField(required=False)
+
+    def clean_blood_group(self):
+        return BloodGroup.validate_blood_group(self.cleaned_data['blood_group'])
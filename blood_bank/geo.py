@@ -0,0 +1,267 @@
+"""
+Nearest blood bank lookups.
+
+``bank_locations`` keeps the coordinates of every located bank in memory,
+bucketed into a grid of CELL_DEGREES squares. A nearest-first search visits
+rings of cells around the query point and stops as soon as no unvisited
+cell can hold anything closer, so it only looks at the banks near the
+point instead of all of them. Distances are great-circle (haversine) and
+computed with numpy, a whole ring or batch at a time, when numpy is
+installed; a plain Python fallback is used otherwise. Cells are not
+wrapped at the antimeridian, so searches across it visit more rings, but
+distances and results are still exact.
+
+The index is rebuilt lazily after a bank changes (see signals.py) and at
+least every BLOOD_BANK_LOCATION_TTL seconds, so changes made by other
+processes are picked up too.
+"""
+import heapq
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from .models import BloodBank
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Grid cell size; about 55 km north-south
+CELL_DEGREES = 0.5
+
+# Rows of a bulk distance matrix computed at once
+BULK_CHUNK = 1000
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distances_km(lat, lon, lats, lons):
+    """Distances from one point to many; a numpy array when numpy is available"""
+    if np is None:
+        return [haversine_km(lat, lon, other_lat, other_lon) for other_lat, other_lon in zip(lats, lons)]
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lats) * np.sin((lons - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def distance_matrix_km(points, lats, lons):
+    """``len(points) x len(lats)`` distances, broadcast in one numpy expression"""
+    if np is None:
+        return [distances_km(lat, lon, lats, lons) for lat, lon in points]
+    points = np.radians(np.asarray(points, dtype=float).reshape(-1, 2))
+    lat1, lon1 = points[:, :1], points[:, 1:]
+    lats, lons = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lons, dtype=float))
+    a = (
+        np.sin((lats - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lats) * np.sin((lons - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _cell(lat, lon):
+    return math.floor(lat / CELL_DEGREES), math.floor(lon / CELL_DEGREES)
+
+
+class _Grid:
+    """Immutable snapshot of bank coordinates bucketed by cell"""
+
+    def __init__(self, rows):
+        self.ids = [bank_id for bank_id, _, _ in rows]
+        self.position = {bank_id: position for position, bank_id in enumerate(self.ids)}
+        self.lats = [lat for _, lat, _ in rows]
+        self.lons = [lon for _, _, lon in rows]
+        if np is not None:
+            self.lats, self.lons = np.array(self.lats), np.array(self.lons)
+        self.cells = {}
+        for position, (_, lat, lon) in enumerate(rows):
+            self.cells.setdefault(_cell(lat, lon), []).append(position)
+        self.max_abs_lat = max((abs(lat) for _, lat, _ in rows), default=0.0)
+        self.min_lon = min((lon for _, _, lon in rows), default=0.0)
+        self.max_lon = max((lon for _, _, lon in rows), default=0.0)
+        ys = [y for y, _ in self.cells] or [0]
+        xs = [x for _, x in self.cells] or [0]
+        self.bounds = (min(ys), max(ys), min(xs), max(xs))
+
+    def ring(self, center, radius):
+        """Positions of banks in the cells exactly ``radius`` cells from ``center``"""
+        cy, cx = center
+        if radius == 0:
+            return list(self.cells.get(center, ()))
+        positions = []
+        if 8 * radius > len(self.cells):
+            for (y, x), members in self.cells.items():
+                if max(abs(y - cy), abs(x - cx)) == radius:
+                    positions.extend(members)
+            return positions
+        for x in range(cx - radius, cx + radius + 1):
+            positions.extend(self.cells.get((cy - radius, x), ()))
+            positions.extend(self.cells.get((cy + radius, x), ()))
+        for y in range(cy - radius + 1, cy + radius):
+            positions.extend(self.cells.get((y, cx - radius), ()))
+            positions.extend(self.cells.get((y, cx + radius), ()))
+        return positions
+
+    def max_radius(self, center):
+        """Rings needed to cover every occupied cell"""
+        if not self.cells:
+            return -1
+        cy, cx = center
+        min_y, max_y, min_x, max_x = self.bounds
+        return max(cy - min_y, max_y - cy, cx - min_x, max_x - cx, 0)
+
+    def min_distance_beyond(self, lat, lon, radius):
+        """Lower bound in km for banks more than ``radius`` rings out"""
+        # Such banks are more than radius cells away in latitude, or in
+        # longitude, where the gap may be shorter the other way round the
+        # globe. By the haversine formula hav(d) >= cos(lat1) cos(lat2) hav(dlon).
+        degrees = radius * CELL_DEGREES
+        by_latitude = math.radians(degrees)
+        farthest = max(lon - self.min_lon, self.max_lon - lon)
+        dlon = math.radians(max(0.0, min(degrees, 360.0 - farthest, 180.0)))
+        scale = math.cos(math.radians(min(90.0, abs(lat)))) * math.cos(math.radians(self.max_abs_lat))
+        by_longitude = 2 * math.asin(min(1.0, math.sqrt(max(0.0, scale)) * math.sin(dlon / 2)))
+        return EARTH_RADIUS_KM * min(by_latitude, by_longitude)
+
+
+class BankLocationIndex:
+    """In-memory spatial index of located blood banks"""
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._grid = None
+        self._loaded_at = 0.0
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'BLOOD_BANK_LOCATION_TTL', 300)
+
+    def _get_grid(self):
+        grid = self._grid
+        if grid is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return grid
+        rows = list(
+            BloodBank.objects.filter(latitude__isnull=False, longitude__isnull=False)
+            .values_list('id', 'latitude', 'longitude')
+        )
+        grid = _Grid(rows)
+        with self._lock:
+            self._grid = grid
+            self._loaded_at = time.monotonic()
+        return grid
+
+    def invalidate(self):
+        with self._lock:
+            self._grid = None
+
+    def location(self, bank_id):
+        grid = self._get_grid()
+        position = grid.position.get(bank_id)
+        if position is None:
+            return None
+        return float(grid.lats[position]), float(grid.lons[position])
+
+    def iter_nearest(self, lat, lon, accept=None):
+        """Yield ``(bank_id, km)`` nearest first, for banks passing ``accept(bank_id)``"""
+        grid = self._get_grid()
+        center = _cell(lat, lon)
+        last_ring = grid.max_radius(center)
+        heap = []
+        for radius in range(last_ring + 1):
+            positions = grid.ring(center, radius)
+            if accept is not None:
+                positions = [p for p in positions if accept(grid.ids[p])]
+            if positions:
+                if np is not None:
+                    km = distances_km(lat, lon, grid.lats[positions], grid.lons[positions])
+                else:
+                    km = distances_km(
+                        lat, lon, [grid.lats[p] for p in positions], [grid.lons[p] for p in positions]
+                    )
+                for position, distance in zip(positions, km):
+                    heapq.heappush(heap, (float(distance), grid.ids[position]))
+            bound = grid.min_distance_beyond(lat, lon, radius)
+            while heap and heap[0][0] <= bound:
+                distance, bank_id = heapq.heappop(heap)
+                yield bank_id, distance
+        while heap:
+            distance, bank_id = heapq.heappop(heap)
+            yield bank_id, distance
+
+    def nearest(self, lat, lon, k=5, accept=None):
+        """The ``k`` nearest ``(bank_id, km)`` pairs passing ``accept``"""
+        found = []
+        for item in self.iter_nearest(lat, lon, accept):
+            found.append(item)
+            if len(found) >= k:
+                break
+        return found
+
+    def nearest_with_stock(self, lat, lon, blood_group, units_required=1, k=5):
+        """The ``k`` nearest banks holding ``units_required`` units of a group"""
+        from .availability import availability_matrix
+
+        column = availability_matrix.get_group(blood_group)
+        return [
+            (bank_id, distance, column[bank_id])
+            for bank_id, distance in self.nearest(
+                lat, lon, k, accept=lambda bank_id: column.get(bank_id, 0) >= units_required
+            )
+        ]
+
+    def orders_for(self, points, bank_ids=None, limit=None):
+        """Bank ids sorted nearest first for each of many points.
+
+        Distances for a batch of points are computed as one matrix, so
+        planning many located requests costs a few numpy operations
+        rather than a ring search each. ``bank_ids`` limits the banks and
+        ``limit`` the length of each order.
+        """
+        grid = self._get_grid()
+        positions = list(range(len(grid.ids)))
+        if bank_ids is not None:
+            wanted = set(bank_ids)
+            positions = [p for p in positions if grid.ids[p] in wanted]
+        if not positions:
+            return [[] for _ in points]
+        ids = [grid.ids[p] for p in positions]
+        count = len(ids) if limit is None else min(limit, len(ids))
+        if np is None:
+            lats = [grid.lats[p] for p in positions]
+            lons = [grid.lons[p] for p in positions]
+            return [
+                [ids[i] for i in heapq.nsmallest(count, range(len(ids)), key=row.__getitem__)]
+                for row in distance_matrix_km(points, lats, lons)
+            ]
+        ids = np.array(ids)
+        lats, lons = grid.lats[positions], grid.lons[positions]
+        orders = []
+        for start in range(0, len(points), BULK_CHUNK):
+            matrix = distance_matrix_km(points[start:start + BULK_CHUNK], lats, lons)
+            if count < len(ids):
+                # Only the nearest ``count`` columns of each row get sorted
+                nearest = np.argpartition(matrix, count - 1, axis=1)[:, :count]
+                matrix = np.take_along_axis(matrix, nearest, axis=1)
+                order = np.take_along_axis(nearest, np.argsort(matrix, axis=1, kind='stable'), axis=1)
+            else:
+                order = np.argsort(matrix, axis=1, kind='stable')
+            orders.extend(ids[order].tolist())
+        return orders
+
+
+bank_locations = BankLocationIndex()
@@ -0,0 +1,240 @@
+"""
+Database-backed background jobs.
+
+Side effects that needn't finish before the response, such as emails and
+recomputations, are queued as Job rows with ``enqueue()`` and run by the
+``run_jobs`` worker in a thread pool. The row is written in the caller's
+transaction: a job exists exactly when the change that queued it was
+committed, and the worker can't see it any earlier. No broker is needed;
+the worker polls the table.
+
+Jobs are functions registered with ``@job`` (the ones shipped are in
+tasks.py) and called with their payload as keyword arguments. A ``batch``
+job is called once with the list of payloads of all its due jobs claimed
+together, so a run of emails goes out over one mail connection and repeated
+recomputations collapse into one. A job that raises is retried with
+exponential backoff up to ``max_attempts`` times and then left failed, with
+its error, for the admin to retry. Delivery is at least once: a batch that
+fails part way is retried whole.
+"""
+import logging
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Registered jobs by name
+registry = {}
+
+
+class JobSpec:
+    def __init__(self, func, name, batch, max_attempts, retry_delay):
+        self.func = func
+        self.name = name
+        self.batch = batch
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+
+    @property
+    def max_attempts(self):
+        if self._max_attempts is not None:
+            return self._max_attempts
+        return getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+
+    def retry_delay(self, attempts):
+        """Seconds to wait before the attempt after ``attempts`` failed ones"""
+        base = self._retry_delay
+        if base is None:
+            base = getattr(settings, 'JOB_RETRY_DELAY', 30)
+        return base * 2 ** (attempts - 1)
+
+
+def job(name=None, batch=False, max_attempts=None, retry_delay=None):
+    """Register a function as a job; ``batch`` jobs take a list of payloads"""
+    def decorator(func):
+        spec = JobSpec(func, name or func.__name__, batch, max_attempts, retry_delay)
+        registry[spec.name] = spec
+        func.job_name = spec.name
+        return func
+    return decorator
+
+
+def _job_name(job):
+    return getattr(job, 'job_name', job)
+
+
+def enqueue(job, payload=None, delay=None):
+    """Queue ``job`` (a registered function or its name) within the current transaction"""
+    return Job.objects.create(
+        name=_job_name(job),
+        payload=payload or {},
+        run_at=timezone.now() + (delay or timedelta()),
+    )
+
+
+def enqueue_many(job, payloads, delay=None):
+    """Queue one job per payload with a single insert"""
+    run_at = timezone.now() + (delay or timedelta())
+    name = _job_name(job)
+    return Job.objects.bulk_create(
+        [Job(name=name, payload=payload, run_at=run_at) for payload in payloads]
+    )
+
+
+def _error(exc):
+    return ''.join(traceback.format_exception(exc)).strip()[-5000:]
+
+
+class Worker:
+    """Claims due jobs in batches and runs them on a thread pool"""
+
+    def __init__(self, threads=None, batch_size=None, poll_interval=None):
+        self.threads = threads or getattr(settings, 'JOB_WORKER_THREADS', 4)
+        self.batch_size = batch_size or getattr(settings, 'JOB_BATCH_SIZE', 100)
+        self.poll_interval = poll_interval or getattr(settings, 'JOB_POLL_INTERVAL', 1.0)
+        self.lock_timeout = timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 600))
+        self.retention = timedelta(days=getattr(settings, 'JOB_RETENTION_DAYS', 7))
+        self.done = 0
+        self.failed = 0
+        self._counts = threading.Lock()
+        self._purged_at = 0.0
+
+    def claim(self):
+        """Mark up to ``batch_size`` due jobs as running for this worker and return them.
+
+        The UPDATE repeats the due condition, so when workers race for the
+        same rows each row goes to exactly one of them. The ids are read
+        outside a transaction: on SQLite a read transaction that then writes
+        fails at once, without waiting, when another worker wrote meanwhile.
+        """
+        token = uuid.uuid4().hex
+        while True:
+            now = timezone.now()
+            # Jobs whose worker died; rare, so looked at first
+            stale = Job.objects.filter(status='running', claimed_at__lt=now - self.lock_timeout)
+            ids = list(stale.values_list('id', flat=True)[:self.batch_size])
+            queued = Job.objects.filter(status='queued', run_at__lte=now)
+            ids += queued.order_by('run_at', 'id').values_list('id', flat=True)[:self.batch_size - len(ids)]
+            if not ids:
+                return []
+            claimed = (stale | queued).filter(pk__in=ids).update(
+                status='running', claimed_by=token, claimed_at=now, attempts=F('attempts') + 1
+            )
+            if claimed:
+                return list(Job.objects.filter(pk__in=ids, claimed_by=token).order_by('run_at', 'id'))
+            # Another worker took them all first; look again
+
+    def units(self, jobs):
+        """Split claimed jobs into ``(spec, jobs)`` calls; a batch job's jobs run as one call"""
+        by_name = {}
+        for claimed in jobs:
+            by_name.setdefault(claimed.name, []).append(claimed)
+        units = []
+        for name, group in by_name.items():
+            spec = registry.get(name)
+            if spec is None:
+                Job.objects.filter(pk__in=[j.pk for j in group]).update(
+                    status='failed', finished_at=timezone.now(), last_error=f"Unknown job {name!r}"
+                )
+                self.failed += len(group)
+            elif spec.batch:
+                units.append((spec, group))
+            else:
+                units.extend((spec, [claimed]) for claimed in group)
+        return units
+
+    def execute(self, spec, jobs):
+        """Run one call of a job and record the outcome on its rows"""
+        ids = [claimed.pk for claimed in jobs]
+        try:
+            if spec.batch:
+                spec.func([claimed.payload for claimed in jobs])
+            else:
+                spec.func(**jobs[0].payload)
+        except Exception as exc:
+            logger.exception("Job %s failed (ids %s)", spec.name, ids)
+            self._failed(spec, jobs, _error(exc))
+        else:
+            Job.objects.filter(pk__in=ids).update(
+                status='done', finished_at=timezone.now(), last_error=''
+            )
+            with self._counts:
+                self.done += len(jobs)
+        finally:
+            close_old_connections()
+
+    def _failed(self, spec, jobs, error):
+        now = timezone.now()
+        by_attempts = {}
+        for claimed in jobs:
+            by_attempts.setdefault(claimed.attempts, []).append(claimed.pk)
+        for attempts, ids in by_attempts.items():
+            if attempts >= spec.max_attempts:
+                Job.objects.filter(pk__in=ids).update(status='failed', finished_at=now, last_error=error)
+                with self._counts:
+                    self.failed += len(ids)
+            else:
+                Job.objects.filter(pk__in=ids).update(
+                    status='queued', last_error=error,
+                    run_at=now + timedelta(seconds=spec.retry_delay(attempts)),
+                )
+
+    def release(self, jobs):
+        """Put claimed jobs that never started back in the queue"""
+        Job.objects.filter(pk__in=[claimed.pk for claimed in jobs], status='running').update(
+            status='queued', attempts=F('attempts') - 1, claimed_by='', claimed_at=None
+        )
+
+    def purge(self):
+        """Delete finished jobs older than JOB_RETENTION_DAYS, at most once an hour"""
+        if time.monotonic() - self._purged_at < 3600:
+            return 0
+        self._purged_at = time.monotonic()
+        deleted, _ = Job.objects.filter(
+            status='done', finished_at__lt=timezone.now() - self.retention
+        ).delete()
+        return deleted
+
+    def run(self, once=False):
+        """Run jobs until interrupted, or until the queue is empty with ``once``"""
+        running = {}
+        with ThreadPoolExecutor(self.threads, thread_name_prefix='job') as pool:
+            try:
+                while True:
+                    # Claim only when a thread is free, so claimed jobs
+                    # don't queue up behind slow ones
+                    if len(running) < self.threads:
+                        try:
+                            claimed = self.claim()
+                        except DatabaseError:
+                            # e.g. the database is busy; try again next round
+                            logger.exception("Could not claim jobs")
+                            claimed = []
+                        for spec, jobs in self.units(claimed):
+                            running[pool.submit(self.execute, spec, jobs)] = jobs
+                    if running:
+                        finished, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            del running[future]
+                        continue
+                    if once:
+                        break
+                    self.purge()
+                    close_old_connections()
+                    time.sleep(self.poll_interval)
+            except KeyboardInterrupt:
+                for future, jobs in running.items():
+                    if future.cancel():
+                        self.release(jobs)
+                raise
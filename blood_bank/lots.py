@@ -0,0 +1,90 @@
+"""
+Keeping blood lots and the inventory counters in step.
+
+``reconstruct_lots`` creates lots for stock that predates lot tracking.
+Since stock is consumed oldest first, what a bank still holds of a group is
+taken to be its most recent donations of that group; any units not covered
+by donations become one lot collected at the inventory row's last update.
+Migration 0009 keeps its own copy of ``reconstruct_lots``, so changes here
+don't alter what that migration did.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+
+def reconstruct_lots(BloodInventory, Donation, BloodLot, using='default', batch_size=1000):
+    """Create lots covering every inventory row that has none; returns lots created"""
+    shelf_life = timedelta(days=settings.BLOOD_SHELF_LIFE_DAYS)
+    covered = set(
+        BloodLot.objects.using(using).filter(units_remaining__gt=0)
+        .values_list('blood_bank_id', 'blood_group').distinct()
+    )
+    lots = []
+    created = 0
+    stock = BloodInventory.objects.using(using).filter(units_available__gt=0).values_list(
+        'blood_bank_id', 'blood_group', 'units_available', 'last_updated'
+    )
+    for bank_id, group, units_available, last_updated in stock.iterator():
+        if (bank_id, group) in covered:
+            continue
+        left = units_available
+        donations = Donation.objects.using(using).filter(
+            blood_bank_id=bank_id, blood_group=group, lot__isnull=True
+        ).order_by('-donation_date', '-id').values_list('id', 'units_donated', 'donation_date')
+        for donation_id, units, donated_at in donations.iterator(chunk_size=100):
+            if left <= 0:
+                break
+            take = min(units, left)
+            left -= take
+            lots.append(BloodLot(
+                blood_bank_id=bank_id, blood_group=group, donation_id=donation_id,
+                units=units, units_remaining=take, collected_at=donated_at,
+                expires_on=timezone.localdate(donated_at) + shelf_life
+            ))
+        if left > 0:
+            lots.append(BloodLot(
+                blood_bank_id=bank_id, blood_group=group, units=left, units_remaining=left,
+                collected_at=last_updated, expires_on=timezone.localdate(last_updated) + shelf_life
+            ))
+        if len(lots) >= batch_size:
+            BloodLot.objects.using(using).bulk_create(lots)
+            created += len(lots)
+            lots = []
+    BloodLot.objects.using(using).bulk_create(lots)
+    return created + len(lots)
+
+
+def recount_inventory():
+    """Reset every counter to the units left in its lots; returns rows corrected"""
+    from .models import BloodInventory, BloodLot
+
+    totals = dict(
+        ((row['blood_bank_id'], row['blood_group']), row['units'])
+        for row in BloodLot.objects.available().values('blood_bank_id', 'blood_group')
+        .annotate(units=Sum('units_remaining'))
+    )
+    corrected = []
+    for inventory in BloodInventory.objects.all():
+        units = totals.pop((inventory.blood_bank_id, inventory.blood_group), 0)
+        if inventory.units_available != units:
+            inventory.units_available = units
+            corrected.append(inventory)
+    BloodInventory.objects.bulk_update(corrected, ['units_available'], batch_size=500)
+    # Lots without a counter row at all
+    BloodInventory.objects.bulk_create([
+        BloodInventory(blood_bank_id=bank_id, blood_group=group, units_available=units)
+        for (bank_id, group), units in totals.items()
+    ])
+
+    from .alerts import evaluate_stock_alerts
+    from .availability import availability_matrix
+    from .response_cache import data_changed
+
+    availability_matrix.invalidate()
+    data_changed(BloodInventory, all_banks=True)
+    if corrected or totals:
+        evaluate_stock_alerts()
+    return len(corrected) + len(totals)
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blood_bank.allocation import allocate_requests
+from blood_bank.exceptions import BloodBankError
+
+
+class Command(BaseCommand):
+    help = "Allocate stock to pending blood requests by priority and age and approve those that can be filled"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Plan the allocations and report them without changing anything"
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            report = allocate_requests(dry_run=options['dry_run'])
+        except BloodBankError as e:
+            raise CommandError(str(e))
+        elapsed = time.monotonic() - started
+
+        action = "Would approve" if options['dry_run'] else "Approved"
+        self.stdout.write(
+            f"{action} {len(report.approved)} of {report.considered} pending requests "
+            f"({report.units_allocated} units) in {elapsed:.2f}s; "
+            f"{report.left_pending} left pending"
+        )
+        for group, units in sorted(report.units_by_group.items()):
+            self.stdout.write(f"  {group}: {units} units")
@@ -0,0 +1,140 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from blood_bank.backends.sqlite3.base import PRODUCTION_PRAGMAS, apply_pragmas
+from blood_bank.models import BloodGroup
+
+BANKS = 300
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent read/write throughput of SQLite with the default "
+        "settings and with the production profile (blood_bank.backends.sqlite3) "
+        "on a scratch database shaped like the inventory tables"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        profiles = [
+            ('default', {}, 'BEGIN'),
+            ('production', PRODUCTION_PRAGMAS, 'BEGIN IMMEDIATE'),
+        ]
+        self.stdout.write(
+            f"{options['writers']} writers, {options['readers']} readers, "
+            f"{options['seconds']:.0f}s per profile"
+        )
+        self.stdout.write(f"{'profile':<12}{'writes/s':>10}{'reads/s':>10}{'locked':>8}{'p99 write ms':>14}")
+        for name, pragmas, begin in profiles:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self.create_schema(path, pragmas)
+                result = self.run_profile(path, pragmas, begin, options)
+            self.stdout.write(
+                f"{name:<12}{result['writes']:>10.0f}{result['reads']:>10.0f}"
+                f"{result['locked']:>8}{result['p99']:>14.1f}"
+            )
+
+    @staticmethod
+    def connect(path, pragmas):
+        # Same busy timeout as Django's default (5s) unless the pragmas set one
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        apply_pragmas(conn, pragmas)
+        return conn
+
+    def create_schema(self, path, pragmas):
+        conn = self.connect(path, pragmas)
+        conn.executescript("""
+            CREATE TABLE inventory (
+                id INTEGER PRIMARY KEY, bank INTEGER, blood_group TEXT, units INTEGER,
+                UNIQUE (bank, blood_group)
+            );
+            CREATE TABLE donation (
+                id INTEGER PRIMARY KEY, bank INTEGER, blood_group TEXT, units INTEGER
+            );
+        """)
+        conn.executemany(
+            "INSERT INTO inventory (bank, blood_group, units) VALUES (?, ?, 0)",
+            [(bank, group) for bank in range(BANKS) for group in BloodGroup.GROUPS]
+        )
+        conn.close()
+
+    def run_profile(self, path, pragmas, begin, options):
+        deadline = time.monotonic() + options['seconds']
+        lock = threading.Lock()
+        totals = {'writes': 0, 'reads': 0, 'locked': 0, 'latencies': []}
+
+        def writer(seed):
+            rnd = random.Random(seed)
+            conn = self.connect(path, pragmas)
+            writes, locked, latencies = 0, 0, []
+            while time.monotonic() < deadline:
+                bank, group = rnd.randrange(BANKS), rnd.choice(BloodGroup.GROUPS)
+                started = time.monotonic()
+                try:
+                    # Read then write, like a donation checking stock first
+                    conn.execute(begin)
+                    conn.execute(
+                        "SELECT units FROM inventory WHERE bank = ? AND blood_group = ?", (bank, group)
+                    ).fetchone()
+                    conn.execute(
+                        "INSERT INTO donation (bank, blood_group, units) VALUES (?, ?, 1)", (bank, group)
+                    )
+                    conn.execute(
+                        "UPDATE inventory SET units = units + 1 WHERE bank = ? AND blood_group = ?",
+                        (bank, group)
+                    )
+                    conn.execute("COMMIT")
+                    writes += 1
+                    latencies.append(time.monotonic() - started)
+                except sqlite3.OperationalError:
+                    locked += 1
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+            conn.close()
+            with lock:
+                totals['writes'] += writes
+                totals['locked'] += locked
+                totals['latencies'].extend(latencies)
+
+        def reader():
+            conn = self.connect(path, pragmas)
+            reads = 0
+            while time.monotonic() < deadline:
+                try:
+                    conn.execute("SELECT bank, SUM(units) FROM inventory GROUP BY bank").fetchall()
+                    reads += 1
+                except sqlite3.OperationalError:
+                    with lock:
+                        totals['locked'] += 1
+            conn.close()
+            with lock:
+                totals['reads'] += reads
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        latencies = sorted(totals['latencies'])
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0
+        return {
+            'writes': totals['writes'] / elapsed,
+            'reads': totals['reads'] / elapsed,
+            'locked': totals['locked'],
+            'p99': p99,
+        }
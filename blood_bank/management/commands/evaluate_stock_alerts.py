@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blood_bank.alerts import evaluate_stock_alerts
+from blood_bank.models import StockAlert
+
+
+class Command(BaseCommand):
+    help = (
+        "Check the stock of every bank against the low-stock thresholds, opening and "
+        "clearing alerts. Changes are checked as they happen; run this after bulk loads "
+        "or direct database edits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bank', type=int, action='append', dest='banks',
+            help="Only this blood bank id (repeatable)"
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        opened, cleared = evaluate_stock_alerts(bank_ids=options['banks'])
+        self.stdout.write(
+            f"Opened {opened} and cleared {cleared} alert(s) in {time.monotonic() - started:.2f}s; "
+            f"{StockAlert.objects.filter(cleared_at__isnull=True).count()} open"
+        )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from blood_bank.lots import recount_inventory
+from blood_bank.models import BloodLot
+
+
+class Command(BaseCommand):
+    help = (
+        "Retire blood lots past their expiry date and take their units off the "
+        "inventory counters. Meant to run daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recount', action='store_true',
+            help="Afterwards reset every inventory counter to the units left in its lots"
+        )
+
+    def handle(self, *args, **options):
+        expired = BloodLot.objects.expire()
+        self.stdout.write(
+            f"Expired {sum(expired.values())} units across {len(expired)} bank/group stocks"
+        )
+        for (bank_id, group), units in sorted(expired.items()):
+            self.stdout.write(f"  bank {bank_id} {group}: {units} units")
+        if options['recount']:
+            corrected = recount_inventory()
+            self.stdout.write(f"Recount corrected {corrected} inventory rows")
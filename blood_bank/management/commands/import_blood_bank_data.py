@@ -0,0 +1,226 @@
+import csv
+import json
+import os
+from collections import Counter
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from blood_bank.alerts import evaluate_stock_alerts
+from blood_bank.forms import BloodBankImportForm, DonationImportForm, DonorImportForm
+from blood_bank.geo import bank_locations
+from blood_bank.response_cache import data_changed
+from blood_bank.models import BloodBank, BloodInventory, BloodLot, Donation, Donor, ImportProgress
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream blood banks, donors and historical donations from CSV files into the "
+        "database in chunks. Progress is checkpointed in the database with each chunk "
+        "so an interrupted import can be resumed by running the same command again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--banks', help="CSV with name,address,contact_number,email")
+        parser.add_argument('--donors', help="CSV with name,email,age,blood_type[,created_at]")
+        parser.add_argument(
+            '--donations',
+            help="CSV with donor_email,bank_name,blood_group,units_donated[,donation_date]"
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument(
+            '--restart', action='store_true',
+            help="Ignore saved progress and import every file from the first row"
+        )
+
+    def handle(self, *args, **options):
+        steps = [
+            ('banks', self.import_banks),
+            ('donors', self.import_donors),
+            ('donations', self.import_donations),
+        ]
+        if not any(options[name] for name, _ in steps):
+            raise CommandError("Nothing to import; pass --banks, --donors and/or --donations")
+
+        for name, importer in steps:
+            path = options[name]
+            if not path:
+                continue
+            if not os.path.exists(path):
+                raise CommandError(f"{path} does not exist")
+            self.import_file(name, path, importer, options['chunk_size'], options['restart'])
+
+        # Stock imported in bulk, and new banks with no stock at all, are
+        # checked against the low-stock thresholds in one pass
+        opened, cleared = evaluate_stock_alerts()
+        self.stdout.write(f"Low-stock alerts: {opened} opened, {cleared} cleared")
+
+    # Progress, kept per file in ImportProgress and written in the
+    # transaction of each chunk
+
+    @staticmethod
+    def progress_key(path):
+        return os.path.abspath(path)
+
+    @staticmethod
+    def legacy_progress_path(path):
+        """Where earlier versions checkpointed next to the file"""
+        return f"{path}.progress"
+
+    def load_progress(self, path, restart):
+        key = self.progress_key(path)
+        if restart:
+            ImportProgress.objects.filter(path=key).delete()
+            return 0
+        rows = ImportProgress.objects.filter(path=key).values_list('rows', flat=True).first()
+        if rows is not None:
+            return rows
+        legacy_path = self.legacy_progress_path(path)
+        if os.path.exists(legacy_path):
+            with open(legacy_path) as f:
+                return json.load(f)['rows']
+        return 0
+
+    def save_progress(self, path, rows):
+        ImportProgress.objects.update_or_create(path=self.progress_key(path), defaults={'rows': rows})
+
+    def import_file(self, name, path, importer, chunk_size, restart):
+        done = self.load_progress(path, restart)
+        imported = skipped = 0
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            rows = enumerate(reader, start=1)
+            for _ in islice(rows, done):
+                pass
+            if done:
+                self.stdout.write(f"{name}: resuming after row {done}")
+
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                done = chunk[-1][0]
+                with transaction.atomic():
+                    created, errors = importer(chunk)
+                    self.save_progress(path, done)
+                for line, error in sorted(errors):
+                    self.stderr.write(f"{name} row {line}: {error}")
+                imported += created
+                skipped += len(chunk) - created
+                self.stdout.write(f"{name}: {done} rows read, {imported} imported, {skipped} skipped")
+
+        self.stdout.write(self.style.SUCCESS(f"{name}: finished {path}"))
+
+    # Validation
+
+    @staticmethod
+    def validate(form_class, chunk):
+        """Split a chunk into valid ``(line, cleaned_data)`` rows and ``(line, error)`` pairs"""
+        valid, errors = [], []
+        for line, row in chunk:
+            form = form_class(data=row)
+            if form.is_valid():
+                valid.append((line, form.cleaned_data))
+            else:
+                errors.append((line, '; '.join(
+                    f"{field}: {' '.join(messages)}" for field, messages in form.errors.items()
+                )))
+        return valid, errors
+
+    # Importers; each handles one chunk inside a transaction and returns
+    # (rows created, [(line, error), ...])
+
+    def import_banks(self, chunk):
+        valid, errors = self.validate(BloodBankImportForm, chunk)
+        names = {data['name'] for _, data in valid}
+        existing = set(BloodBank.objects.filter(name__in=names).values_list('name', flat=True))
+        banks = []
+        for line, data in valid:
+            if data['name'] in existing:
+                errors.append((line, f"blood bank {data['name']!r} already exists"))
+                continue
+            existing.add(data['name'])
+            banks.append(BloodBank(**data))
+        BloodBank.objects.bulk_create(banks)
+        # bulk_create sends no post_save for the location index or the
+        # page versions to see
+        if any(bank.latitude is not None for bank in banks):
+            transaction.on_commit(bank_locations.invalidate)
+        if banks:
+            data_changed(BloodBank)
+        return len(banks), errors
+
+    def import_donors(self, chunk):
+        valid, errors = self.validate(DonorImportForm, chunk)
+        emails = {data['email'] for _, data in valid}
+        existing = set(Donor.objects.filter(email__in=emails).values_list('email', flat=True))
+        now = timezone.now()
+        donors = []
+        for line, data in valid:
+            if data['email'] in existing:
+                errors.append((line, f"donor {data['email']!r} already exists"))
+                continue
+            existing.add(data['email'])
+            data['created_at'] = data['created_at'] or now
+            donors.append(Donor(**data, next_eligible_date=timezone.localdate(data['created_at'])))
+        Donor.objects.bulk_create(donors)
+        if donors:
+            data_changed(Donor)
+        return len(donors), errors
+
+    def import_donations(self, chunk):
+        valid, errors = self.validate(DonationImportForm, chunk)
+        donors = dict(Donor.objects.filter(
+            email__in={data['donor_email'] for _, data in valid}
+        ).values_list('email', 'id'))
+        banks = dict(BloodBank.objects.filter(
+            name__in={data['bank_name'] for _, data in valid}
+        ).values_list('name', 'id'))
+
+        now = timezone.now()
+        donations = []
+        latest = {}
+        for line, data in valid:
+            donor_id = donors.get(data['donor_email'])
+            bank_id = banks.get(data['bank_name'])
+            if donor_id is None:
+                errors.append((line, f"unknown donor {data['donor_email']!r}"))
+                continue
+            if bank_id is None:
+                errors.append((line, f"unknown blood bank {data['bank_name']!r}"))
+                continue
+            donations.append(Donation(
+                donor_id=donor_id,
+                blood_bank_id=bank_id,
+                blood_group=data['blood_group'],
+                units_donated=data['units_donated'],
+                donation_date=data['donation_date'] or now
+            ))
+            donated_on = timezone.localdate(donations[-1].donation_date)
+            latest[donor_id] = max(latest.get(donor_id, donated_on), donated_on)
+
+        # bulk_create skips Donation.save(), so stock is brought up to date
+        # here with one lot per donation, one atomic increment per bank and
+        # blood group and donor eligibility with one bulk update. Historical
+        # rows aren't checked against the donation interval. Lots already
+        # past their expiry are stored as expired and never reach the counters.
+        Donation.objects.bulk_create(donations)
+        today = timezone.localdate()
+        lots = []
+        units_by_stock = Counter()
+        for donation in donations:
+            lot = BloodLot.for_donation(donation)
+            if lot.expires_on < today:
+                lot.units_remaining = 0
+                lot.units_expired = lot.units
+                lot.expired_at = now
+            else:
+                units_by_stock[lot.blood_bank_id, lot.blood_group] += lot.units
+            lots.append(lot)
+        BloodLot.objects.bulk_create(lots)
+        for (bank_id, blood_group), units in units_by_stock.items():
+            BloodInventory.add_units(bank_id, blood_group, units)
+        Donor.objects.record_donations(latest)
+        return len(donations), errors
@@ -0,0 +1,356 @@
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+)
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from blood_bank import urls as blood_bank_urls
+from blood_bank.exceptions import BloodBankError
+from blood_bank.geo import bank_locations
+from blood_bank.middleware import QueryRecorder
+from blood_bank.pagination import KeysetPaginationMixin
+from blood_bank.models import BloodBank, BloodGroup, BloodInventory, BloodRequest, Donation, Donor
+from blood_bank.seeding import REGION, SIZES, flush, seed
+
+# URL names that can't be exercised with a plain GET
+SKIPPED_URLS = {'logout'}
+
+# Query strings for URLs that need parameters
+URL_QUERIES = {
+    'nearest_banks_api': '?lat=39.0&lon=-95.0&group=O%2B&units=2&k=5',
+}
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    rank = max(1, round(p / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database at one or more sizes and time every URL of "
+        "the blood_bank app plus the model hot paths (Donation.save, approve_request, "
+        "get_available_blood_banks) and the list templates. Reports p50/p95/p99 latency and query counts and "
+        "writes them to JSON so runs can be compared."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='small',
+            help=f"Comma-separated data sizes out of {', '.join(SIZES)}"
+        )
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output',
+            help="JSON file for the results (default: benchmarks/<timestamp>.json)"
+        )
+        parser.add_argument('--compare', help="Earlier results file to print p50 changes against")
+
+    def handle(self, *args, **options):
+        sizes = [size.strip() for size in options['sizes'].split(',') if size.strip()]
+        unknown = [size for size in sizes if size not in SIZES]
+        if unknown:
+            raise CommandError(f"Unknown size(s): {', '.join(unknown)}")
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1")
+        previous = self.load(options['compare']) if options['compare'] else None
+
+        self.rng = random.Random(options['seed'])
+        self.iterations = options['iterations']
+        self.warmup = options['warmup']
+
+        started = datetime.now(dt_timezone.utc)
+        results = []
+        # Failing views show up in the results; their tracebacks would drown them
+        request_logger = logging.getLogger('django.request')
+        request_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            # Instrumentation would add its own overhead and log noise
+            with override_settings(INSTRUMENTATION_SAMPLE_RATE=0):
+                user = User.objects.create_user('benchmark', password='benchmark', is_staff=True)
+                for size in sizes:
+                    results.extend(self.run_size(size, user, options['seed']))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            request_logger.setLevel(request_level)
+
+        report = {
+            'started': started.isoformat(),
+            'commit': self.git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': self.iterations,
+            'seed': options['seed'],
+            'results': results,
+        }
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', f"{started:%Y%m%dT%H%M%SZ}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        if previous:
+            self.compare(previous, report)
+
+    # Running
+
+    def run_size(self, size, user, seed_value):
+        self.stdout.write(f"\n== {size} ==")
+        flush()
+        started = time.monotonic()
+        seed(seed=seed_value, **SIZES[size])
+        self.stdout.write(f"seeded in {time.monotonic() - started:.1f}s")
+        self.stdout.write(
+            f"{'benchmark':<48}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'writes':>8}  status"
+        )
+
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+        results = []
+        for name, path in self.urls():
+            results.append(self.measure(size, 'url', name, lambda: self.get(client, path)))
+        results.append(self.measure(
+            size, 'flow', 'blood_request_create POST + redirect', lambda: self.submit_request(client)
+        ))
+        for name, setup, run in self.hot_paths():
+            results.append(self.measure(size, 'model', name, run, setup))
+        for name, setup, run, overrides in self.list_renders():
+            with override_settings(**overrides):
+                results.append(self.measure(size, 'template', name, run, setup))
+        return results
+
+    def measure(self, size, kind, name, run, setup=None):
+        """Time ``run(setup())`` after a few warmup calls; setup isn't timed"""
+        timings, queries, writes, outcomes = [], [], [], set()
+        for i in range(self.warmup + self.iterations):
+            argument = setup() if setup else None
+            recorder = QueryRecorder()
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(recorder))
+                began = time.perf_counter()
+                outcome = run(argument) if setup else run()
+                elapsed = time.perf_counter() - began
+            if i >= self.warmup:
+                timings.append(elapsed * 1000)
+                queries.append(recorder.count)
+                writes.append(recorder.writes)
+                outcomes.add(outcome)
+
+        timings.sort()
+        result = {
+            'size': size,
+            'kind': kind,
+            'name': name,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries': max(queries),
+            'writes': max(writes),
+            'outcomes': sorted(str(outcome) for outcome in outcomes),
+        }
+        self.stdout.write(
+            f"{kind + ' ' + name:<48}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+            f"{result['p99_ms']:>9.2f}{result['queries']:>9}{result['writes']:>8}  {','.join(result['outcomes'])}"
+        )
+        return result
+
+    @staticmethod
+    def get(client, path):
+        response = client.get(path)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response.status_code
+
+    def submit_request(self, client):
+        """Submit the blood request form and follow the redirect that shows its message"""
+        response = client.post(reverse('blood_request_create'), {
+            'requester_name': 'Benchmark',
+            'blood_group': self.rng.choice(BloodGroup.GROUPS),
+            'units_required': 1,
+            'priority': 0,
+            'hospital_name': 'Benchmark Hospital',
+            'hospital_address': '1 Main St',
+            'contact_number': '+15550000000',
+            'email': 'bench@bench.example.org',
+        })
+        if response.status_code != 302:
+            return response.status_code
+        return self.get(client, response.url)
+
+    # What is measured
+
+    def urls(self):
+        """``(name, path)`` for every URL in blood_bank/urls.py reachable with GET"""
+        bank_id = BloodBank.objects.order_by('pk').values_list('pk', flat=True).first()
+        for pattern in blood_bank_urls.urlpatterns:
+            if pattern.name in SKIPPED_URLS:
+                continue
+            kwargs = {'bank_id': bank_id} if 'bank_id' in pattern.pattern.converters else {}
+            yield pattern.name, reverse(pattern.name, kwargs=kwargs) + URL_QUERIES.get(pattern.name, '')
+
+    def hot_paths(self):
+        bank_ids = list(BloodBank.objects.values_list('pk', flat=True))
+        counter = iter(range(10 ** 9))
+
+        def new_donor():
+            # A fresh donor each time, so eligibility rules never get in the way
+            return Donor.objects.create(
+                name='Benchmark Donor',
+                email=f"bench{next(counter)}.{time.monotonic_ns()}@bench.example.org",
+                age=30,
+                blood_type=self.rng.choice(BloodGroup.GROUPS),
+            )
+
+        def donate(donor):
+            try:
+                Donation(
+                    donor=donor,
+                    blood_bank_id=self.rng.choice(bank_ids),
+                    blood_group=donor.blood_type,
+                    units_donated=1,
+                ).save()
+                return 'ok'
+            except BloodBankError as e:
+                return type(e).__name__
+
+        def pending_request():
+            stock = BloodInventory.objects.filter(units_available__gte=1).order_by('?').first()
+            return BloodRequest.objects.create(
+                requester_name='Benchmark',
+                blood_group=stock.blood_group,
+                units_required=1,
+                hospital_name='Benchmark Hospital',
+                hospital_address='1 Main St',
+                contact_number='+15550000000',
+                email='bench@bench.example.org',
+                blood_bank_id=stock.blood_bank_id,
+            )
+
+        def approve(request):
+            try:
+                request.approve_request()
+                return 'ok'
+            except BloodBankError as e:
+                return type(e).__name__
+
+        def random_lookup():
+            return self.rng.choice(BloodGroup.GROUPS), self.rng.randint(1, 5)
+
+        def available_banks(lookup):
+            return f"{len(list(BloodInventory.get_available_blood_banks(*lookup)))} banks"
+
+        def available_stock(lookup):
+            return f"{len(BloodInventory.find_available_stock(*lookup))} banks"
+
+        def random_point():
+            (south, north), (west, east) = REGION
+            return (
+                self.rng.uniform(south, north), self.rng.uniform(west, east),
+                self.rng.choice(BloodGroup.GROUPS), self.rng.randint(1, 5),
+            )
+
+        def nearest_with_stock(point):
+            return f"{len(bank_locations.nearest_with_stock(*point))} banks"
+
+        return [
+            ('Donation.save', new_donor, donate),
+            ('BloodRequest.approve_request', pending_request, approve),
+            ('BloodInventory.get_available_blood_banks', random_lookup, available_banks),
+            ('BloodInventory.find_available_stock', random_lookup, available_stock),
+            ('bank_locations.nearest_with_stock', random_point, nearest_with_stock),
+        ]
+
+    def list_renders(self):
+        """Render a page of the donor and request lists with row caching off,
+        with every row cached, and with one row changed since it was cached"""
+        pages = [
+            ('donor_list', 'blood_bank/donor_list.html', 'donors',
+             Donor.objects.order_by('-created_at', '-id')),
+            ('bloodrequest_list', 'blood_bank/bloodrequest_list.html', 'requests',
+             BloodRequest.objects.order_by('-request_date', '-id')),
+        ]
+        renders = []
+        for name, template, context_name, queryset in pages:
+            objects = list(queryset[:KeysetPaginationMixin.paginate_by])
+            context = {context_name: objects, 'total_count': len(objects), 'is_paginated': False}
+
+            def render(_=None, template=template, context=context):
+                return f"{len(render_to_string(template, context)) // 1024} KiB"
+
+            def one_changed(objects=objects):
+                # A new updated_at gives the first row a new key
+                objects[0].updated_at = timezone.now()
+
+            renders += [
+                (f"{name} rows uncached", None, render, {'FRAGMENT_CACHE_TTL': 0}),
+                (f"{name} rows cached", lambda: None, render, {}),
+                (f"{name} one row changed", one_changed, render, {}),
+            ]
+        return renders
+
+    # Reporting
+
+    @staticmethod
+    def load(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Can't read {path}: {e}")
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def compare(self, previous, current):
+        before = {(r['size'], r['kind'], r['name']): r for r in previous['results']}
+        self.stdout.write(f"\nChange in p50 against {previous.get('commit') or previous['started']}")
+        for result in current['results']:
+            old = before.get((result['size'], result['kind'], result['name']))
+            if old is None or not old['p50_ms']:
+                continue
+            change = (result['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+            self.stdout.write(
+                f"{result['size']:<8}{result['kind'] + ' ' + result['name']:<48}"
+                f"{old['p50_ms']:>9.2f} -> {result['p50_ms']:>9.2f} ms ({change:+.0f}%)"
+                f"  queries {old['queries']} -> {result['queries']}"
+                f"  writes {old.get('writes', '?')} -> {result['writes']}"
+            )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from blood_bank.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs (emails, recomputations) on a thread pool. "
+        "Keep one or more running next to the web server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int,
+            help="Jobs run at once (default JOB_WORKER_THREADS)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help="Jobs claimed per round (default JOB_BATCH_SIZE)"
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit when the queue is empty instead of polling for new jobs"
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(threads=options['threads'], batch_size=options['batch_size'])
+        try:
+            worker.run(once=options['once'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Ran {worker.done} job(s), {worker.failed} failed")
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blood_bank.rollups import update_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Bring the daily donation/request rollups up to date by recomputing the days "
+        "touched since the last run. Meant to run every few minutes from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help="Rebuild the rollups of every day from the raw tables"
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        days, rows = update_rollups(backfill=options['backfill'])
+        self.stdout.write(
+            f"Rebuilt {days} day(s), {rows} rollup rows in {time.monotonic() - started:.2f}s"
+        )
@@ -1,18 +1,41 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
 from django.http import JsonResponse
 from django.contrib import messages
 from django.shortcuts import redirect
+from .routers import pinned_to_primary
 from .exceptions import (
     BloodBankError, DonorNotFoundError, InsufficientBloodUnitsError,
     BloodRequestError, InvalidBloodGroupError, DonationError
 )
 
 class BloodBankExceptionMiddleware:
+    # Supports both modes so async views aren't forced through a thread
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         return self.get_response(request)
 
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
     def process_exception(self, request, exception):
         """Handle custom exceptions and provide appropriate responses"""
         if isinstance(exception, (BloodBankError, DonorNotFoundError,
@@ -31,4 +54,159 @@ class BloodBankExceptionMiddleware:
             return redirect(request.META.get('HTTP_REFERER', '/'))
         
         # Let Django handle other exceptions
-        return None 
\ No newline at end of file
+        return None 
+
+class ReplicaStickinessMiddleware:
+    """Read-your-writes for replica routing.
+
+    After a request that may have written (any unsafe method) the client
+    gets a short-lived cookie; while it is present every read of that
+    client's requests stays on the primary, so it never sees replica lag
+    on its own changes.
+    """
+    sync_capable = True
+    async_capable = True
+    cookie_name = 'bb_primary_until'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _is_pinned(self, request):
+        try:
+            return float(request.COOKIES.get(self.cookie_name, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def _stick(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+            response.set_cookie(
+                self.cookie_name, str(time.time() + seconds),
+                max_age=seconds, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with pinned_to_primary(self._is_pinned(request)):
+            return self._stick(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        with pinned_to_primary(self._is_pinned(request)):
+            return self._stick(request, await self.get_response(request))
+
+instrumentation_logger = logging.getLogger('blood_bank.instrumentation')
+
+class QueryRecorder:
+    """execute_wrapper that counts queries, writes, their time and repeated shapes"""
+    # Collapse IN (%s, %s, ...) lists so batches of any size share one shape
+    in_list = re.compile(r'\((?:%s, )+%s\)')
+    write = re.compile(r'\s*(?:INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+    def __init__(self):
+        self.count = 0
+        self.writes = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            if self.write.match(sql):
+                self.writes += 1
+            self.shapes[self.in_list.sub('(...)', sql)] += 1
+
+    def repeated(self, threshold):
+        return [(sql, count) for sql, count in self.shapes.most_common() if count >= threshold]
+
+class RequestInstrumentationMiddleware:
+    """Per-request query count, SQL time and render time.
+
+    Sampled requests (INSTRUMENTATION_SAMPLE_RATE) get a Server-Timing
+    header and one structured log line on ``blood_bank.instrumentation``.
+    Identical query shapes repeated INSTRUMENTATION_N_PLUS_ONE_THRESHOLD
+    times or more are logged as N+1 suspects. Unsampled requests only pay
+    for one random() call. Async requests are timed as a whole, since
+    their queries run on other threads' connections.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _sampled():
+        rate = getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 0)
+        return rate > 0 and random.random() < rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+        return self._report(request, response, total, recorder)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        return self._report(request, response, time.perf_counter() - started, None)
+
+    def process_template_response(self, request, response):
+        # TemplateResponses are rendered right after this hook runs
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._instrumentation_render = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def _report(self, request, response, total, recorder):
+        render = getattr(request, '_instrumentation_render', None)
+        timings = []
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+        }
+        if recorder is not None:
+            threshold = getattr(settings, 'INSTRUMENTATION_N_PLUS_ONE_THRESHOLD', 5)
+            suspects = recorder.repeated(threshold)
+            timings.append(f'db;dur={recorder.duration * 1000:.2f};desc="{recorder.count} queries"')
+            record.update({
+                'queries': recorder.count,
+                'writes': recorder.writes,
+                'db_ms': round(recorder.duration * 1000, 2),
+                'n_plus_one': [{'sql': sql, 'count': count} for sql, count in suspects],
+            })
+        if render is not None:
+            timings.append(f'render;dur={render * 1000:.2f}')
+            record['render_ms'] = round(render * 1000, 2)
+        timings.append(f'total;dur={total * 1000:.2f}')
+        response['Server-Timing'] = ', '.join(timings)
+
+        level = logging.WARNING if record.get('n_plus_one') else logging.INFO
+        instrumentation_logger.log(level, json.dumps(record))
+        return response
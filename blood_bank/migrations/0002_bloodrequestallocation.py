@@ -0,0 +1,25 @@
+# Generated by Django 4.2.20 on 2026-10-18 02:51
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_bank', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BloodRequestAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blood_group', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('O+', 'O+'), ('O-', 'O-'), ('AB+', 'AB+'), ('AB-', 'AB-')], max_length=3)),
+                ('units', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('blood_bank', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='blood_bank.bloodbank')),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='blood_bank.bloodrequest')),
+            ],
+        ),
+    ]
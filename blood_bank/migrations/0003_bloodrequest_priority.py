@@ -0,0 +1,22 @@
+# Generated by Django 4.2.20 on 2026-10-18 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_bank', '0002_bloodrequestallocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bloodrequest',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Routine'), (1, 'Urgent'), (2, 'Emergency')], default=0),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['status', '-priority', 'request_date'], name='bloodrequest_backlog_idx'),
+        ),
+    ]
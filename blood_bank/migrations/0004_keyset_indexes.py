@@ -0,0 +1,25 @@
+# Generated by Django 4.2.20 on 2026-10-18 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_bank', '0003_bloodrequest_priority'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['-request_date', '-id'], name='bloodrequest_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(fields=['-donation_date', '-id'], name='donation_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='donor',
+            index=models.Index(fields=['-created_at', '-id'], name='donor_keyset_idx'),
+        ),
+    ]
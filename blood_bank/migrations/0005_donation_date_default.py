@@ -0,0 +1,19 @@
+# Generated by Django 4.2.20 on 2026-10-18 02:54
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_bank', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='donation',
+            name='donation_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:04
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils import timezone
+import django.utils.timezone
+
+
+def _local_date(value):
+    return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+
+
+def backfill_eligibility(apps, schema_editor):
+    """Derive last/next donation dates from the donation history"""
+    Donor = apps.get_model('blood_bank', 'Donor')
+    Donation = apps.get_model('blood_bank', 'Donation')
+    db = schema_editor.connection.alias
+    interval = timedelta(days=settings.MINIMUM_DONATION_INTERVAL_DAYS)
+
+    latest = dict(
+        Donation.objects.using(db).values('donor_id')
+        .annotate(last=Max('donation_date')).values_list('donor_id', 'last')
+    )
+    batch = []
+    rows = Donor.objects.using(db).values_list('pk', 'created_at').iterator(chunk_size=2000)
+    for pk, created_at in rows:
+        last = latest.get(pk)
+        if last is None:
+            batch.append(Donor(pk=pk, next_eligible_date=_local_date(created_at)))
+        else:
+            last = _local_date(last)
+            batch.append(Donor(pk=pk, last_donation_date=last, next_eligible_date=last + interval))
+        if len(batch) >= 1000:
+            Donor.objects.using(db).bulk_update(batch, ['last_donation_date', 'next_eligible_date'])
+            batch = []
+    Donor.objects.using(db).bulk_update(batch, ['last_donation_date', 'next_eligible_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_bank', '0005_donation_date_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donor',
+            name='last_donation_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='donor',
+            name='next_eligible_date',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False),
+        ),
+        migrations.RunPython(backfill_eligibility, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='donor',
+            index=models.Index(fields=['blood_type', 'next_eligible_date'], name='donor_eligibility_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+from django.db import OperationalError, migrations
+
+# The FTS5 tables and sync triggers as blood_bank.search defined them when
+# this migration was written; later changes belong in new migrations.
+SEARCH_INDEXES = [
+    ('blood_bank_donor_fts', [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS blood_bank_donor_fts USING fts5("
+        "name, email, content='blood_bank_donor', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE TRIGGER IF NOT EXISTS blood_bank_donor_fts_ai AFTER INSERT ON blood_bank_donor BEGIN "
+        "INSERT INTO blood_bank_donor_fts (rowid, name, email) VALUES (new.id, new.name, new.email); END",
+        "CREATE TRIGGER IF NOT EXISTS blood_bank_donor_fts_ad AFTER DELETE ON blood_bank_donor BEGIN "
+        "INSERT INTO blood_bank_donor_fts (blood_bank_donor_fts, rowid, name, email) "
+        "VALUES ('delete', old.id, old.name, old.email); END",
+        "CREATE TRIGGER IF NOT EXISTS blood_bank_donor_fts_au AFTER UPDATE OF name, email ON blood_bank_donor BEGIN "
+        "INSERT INTO blood_bank_donor_fts (blood_bank_donor_fts, rowid, name, email) "
+        "VALUES ('delete', old.id, old.name, old.email); "
+        "INSERT INTO blood_bank_donor_fts (rowid, name, email) VALUES (new.id, new.name, new.email); END",
+    ]),
+    ('blood_bank_bloodrequest_fts', [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS blood_bank_bloodrequest_fts USING fts5("
+        "requester_name, hospital_name, content='blood_bank_bloodrequest', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE TRIGGER IF NOT EXISTS blood_bank_bloodrequest_fts_ai AFTER INSERT ON blood_bank_bloodrequest BEGIN "
+        "INSERT INTO blood_bank_bloodrequest_fts (rowid, requester_name, hospital_name) "
+        "VALUES (new.id, new.requester_name, new.hospital_name); END",
+        "CREATE TRIGGER IF NOT EXISTS blood_bank_bloodrequest_fts_ad AFTER DELETE ON blood_bank_bloodrequest BEGIN "
+        "INSERT INTO blood_bank_bloodrequest_fts (blood_bank_bloodrequest_fts, rowid, requester_name, hospital_name) "
+        "VALUES ('delete', old.id, old.requester_name, old.hospital_name); END",
+        "CREATE TRIGGER IF NOT EXISTS blood_bank_bloodrequest_fts_au AFTER UPDATE OF requester_name, hospital_name "
+        "ON blood_bank_bloodrequest BEGIN "
+        "INSERT INTO blood_bank_bloodrequest_fts (blood_bank_bloodrequest_fts, rowid, requester_name, hospital_name) "
+        "VALUES ('delete', old.id, old.requester_name, old.hospital_name); "
+        "INSERT INTO blood_bank_bloodrequest_fts (rowid, requester_name, hospital_name) "
+        "VALUES (new.id, new.requester_name, new.hospital_name); END",
+    ]),
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        with schema_editor.connection.cursor() as cursor:
+            for fts, statements in SEARCH_INDEXES:
+                for sql in statements:
+                    cursor.execute(sql)
+                cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+    except OperationalError:
+        # SQLite built without FTS5; search falls back to icontains
+        pass
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for fts, _ in SEARCH_INDEXES:
+            for suffix in ('_au', '_ad', '_ai'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {fts}{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+class Migration(migrations.Migration):
+    """FTS5 donor and blood request search on SQLite; a no-op elsewhere"""
+
+    dependencies = [
+        ('blood_bank', '0006_donor_eligibility'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
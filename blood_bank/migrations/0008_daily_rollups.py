@@ -0,0 +1,56 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_bank', '0007_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('blood_group', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('O+', 'O+'), ('O-', 'O-'), ('AB+', 'AB+'), ('AB-', 'AB-')], max_length=3)),
+                ('donations', models.IntegerField(default=0)),
+                ('units_donated', models.IntegerField(default=0)),
+                ('units_requested', models.IntegerField(default=0)),
+                ('requests_pending', models.IntegerField(default=0)),
+                ('requests_approved', models.IntegerField(default=0)),
+                ('requests_rejected', models.IntegerField(default=0)),
+                ('requests_completed', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_donation_id', models.BigIntegerField(default=0)),
+                ('last_request_update', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='bloodrequest',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['updated_at'], name='bloodrequest_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailyrollup',
+            name='blood_bank',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='blood_bank.bloodbank'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyrollup',
+            unique_together={('day', 'blood_bank', 'blood_group')},
+        ),
+    ]
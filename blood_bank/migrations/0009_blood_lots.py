@@ -0,0 +1,83 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:10
+
+from datetime import timedelta
+
+import django.core.validators
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def create_lots_for_stock(apps, schema_editor):
+    """Lots covering the stock held before lots were tracked.
+
+    Follows blood_bank.lots.reconstruct_lots as it was when this migration
+    was written, less its checks for existing lots, as there are none yet:
+    what a bank holds of a group is taken to be its most recent donations of
+    that group, and units not covered by donations become one lot collected
+    at the inventory row's last update.
+    """
+    BloodInventory = apps.get_model('blood_bank', 'BloodInventory')
+    Donation = apps.get_model('blood_bank', 'Donation')
+    BloodLot = apps.get_model('blood_bank', 'BloodLot')
+    using = schema_editor.connection.alias
+    shelf_life = timedelta(days=settings.BLOOD_SHELF_LIFE_DAYS)
+
+    lots = []
+    stock = BloodInventory.objects.using(using).filter(units_available__gt=0).values_list(
+        'blood_bank_id', 'blood_group', 'units_available', 'last_updated'
+    )
+    for bank_id, group, units_available, last_updated in stock.iterator():
+        left = units_available
+        donations = Donation.objects.using(using).filter(
+            blood_bank_id=bank_id, blood_group=group
+        ).order_by('-donation_date', '-id').values_list('id', 'units_donated', 'donation_date')
+        for donation_id, units, donated_at in donations.iterator(chunk_size=100):
+            if left <= 0:
+                break
+            take = min(units, left)
+            left -= take
+            lots.append(BloodLot(
+                blood_bank_id=bank_id, blood_group=group, donation_id=donation_id,
+                units=units, units_remaining=take, collected_at=donated_at,
+                expires_on=timezone.localdate(donated_at) + shelf_life
+            ))
+        if left > 0:
+            lots.append(BloodLot(
+                blood_bank_id=bank_id, blood_group=group, units=left, units_remaining=left,
+                collected_at=last_updated, expires_on=timezone.localdate(last_updated) + shelf_life
+            ))
+        if len(lots) >= 1000:
+            BloodLot.objects.using(using).bulk_create(lots)
+            lots = []
+    BloodLot.objects.using(using).bulk_create(lots)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_bank', '0008_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BloodLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blood_group', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('O+', 'O+'), ('O-', 'O-'), ('AB+', 'AB+'), ('AB-', 'AB-')], max_length=3)),
+                ('units', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('units_remaining', models.IntegerField(validators=[django.core.validators.MinValueValidator(0)])),
+                ('units_expired', models.IntegerField(default=0)),
+                ('collected_at', models.DateTimeField()),
+                ('expires_on', models.DateField()),
+                ('expired_at', models.DateTimeField(blank=True, null=True)),
+                ('blood_bank', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='blood_bank.bloodbank')),
+                ('donation', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lot', to='blood_bank.donation')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('units_remaining__gt', 0)), fields=['blood_bank', 'blood_group', 'expires_on'], name='bloodlot_fifo_idx'), models.Index(condition=models.Q(('units_remaining__gt', 0)), fields=['expires_on'], name='bloodlot_expiry_idx')],
+            },
+        ),
+        migrations.RunPython(create_lots_for_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_bank', '0011_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockThreshold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blood_group', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('O+', 'O+'), ('O-', 'O-'), ('AB+', 'AB+'), ('AB-', 'AB-')], max_length=3)),
+                ('low_units', models.PositiveIntegerField()),
+                ('clear_units', models.PositiveIntegerField()),
+                ('blood_bank', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='blood_bank.bloodbank')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blood_group', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('O+', 'O+'), ('O-', 'O-'), ('AB+', 'AB+'), ('AB-', 'AB-')], max_length=3)),
+                ('low_units', models.PositiveIntegerField()),
+                ('units_at_open', models.IntegerField()),
+                ('opened_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cleared_at', models.DateTimeField(blank=True, null=True)),
+                ('units_at_clear', models.IntegerField(blank=True, null=True)),
+                ('blood_bank', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='blood_bank.bloodbank')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='stockthreshold',
+            constraint=models.UniqueConstraint(fields=('blood_bank', 'blood_group'), name='stockthreshold_bank_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockthreshold',
+            constraint=models.UniqueConstraint(condition=models.Q(('blood_bank__isnull', True)), fields=('blood_group',), name='stockthreshold_default_uniq', violation_error_message='Levels for all banks are already set for this blood group.'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockthreshold',
+            constraint=models.CheckConstraint(check=models.Q(('clear_units__gt', models.F('low_units'))), name='stockthreshold_band', violation_error_message='The clear level must be above the low level.'),
+        ),
+        migrations.AddIndex(
+            model_name='stockalert',
+            index=models.Index(fields=['-opened_at', '-id'], name='stockalert_keyset_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockalert',
+            constraint=models.UniqueConstraint(condition=models.Q(('cleared_at__isnull', True)), fields=('blood_bank', 'blood_group'), name='stockalert_open_uniq'),
+        ),
+    ]
@@ -1,6 +1,10 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.conf import settings
-from django.core.validators import RegexValidator, MinValueValidator
+from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
 from django.utils import timezone
 from .exceptions import *
 
@@ -15,6 +19,38 @@ email_regex = RegexValidator(
     message="Enter a valid email address."
 )
 
+latitude_validators = [MinValueValidator(-90), MaxValueValidator(90)]
+longitude_validators = [MinValueValidator(-180), MaxValueValidator(180)]
+
+def _can_donate_to(donor, recipient):
+    """Red cell compatibility: every antigen of the donor must be present in the recipient"""
+    donor_antigens = set(donor[:-1].replace('O', ''))
+    recipient_antigens = set(recipient[:-1].replace('O', ''))
+    return donor_antigens <= recipient_antigens and (donor[-1] == '-' or recipient[-1] == '+')
+
+def _donor_masks(groups):
+    """Map each recipient group to a bitmask over ``groups`` of the groups it can receive"""
+    return {
+        recipient: sum(1 << i for i, donor in enumerate(groups) if _can_donate_to(donor, recipient))
+        for recipient in groups
+    }
+
+def _donor_preference(groups, masks):
+    """Order each recipient's donor groups: own group, then the least universal ones"""
+    recipient_count = {
+        donor: sum(1 for mask in masks.values() if mask >> i & 1)
+        for i, donor in enumerate(groups)
+    }
+    return {
+        recipient: sorted(
+            (donor for i, donor in enumerate(groups) if mask >> i & 1),
+            key=lambda donor: (
+                donor != recipient, recipient_count[donor], donor[-1] != recipient[-1]
+            )
+        )
+        for recipient, mask in masks.items()
+    }
+
 class BloodGroup:
     """Class to handle blood group related operations"""
     BLOOD_GROUPS = [
@@ -23,6 +59,10 @@ class BloodGroup:
         ('O+', 'O+'), ('O-', 'O-'),
         ('AB+', 'AB+'), ('AB-', 'AB-')
     ]
+    GROUPS = [group for group, _ in BLOOD_GROUPS]
+    # Bit i of DONOR_MASKS[recipient] is set when GROUPS[i] can donate to recipient
+    DONOR_MASKS = _donor_masks(GROUPS)
+    _DONOR_PREFERENCE = _donor_preference(GROUPS, DONOR_MASKS)
 
     @classmethod
     def validate_blood_group(cls, blood_group):
@@ -31,6 +71,38 @@ class BloodGroup:
             raise InvalidBloodGroupError(f"Invalid blood group: {blood_group}")
         return blood_group
 
+    @classmethod
+    def compatible_donors(cls, recipient):
+        """Donor groups a recipient can receive, in order of preference.
+
+        The recipient's own group comes first and the most widely usable
+        groups (O- last) are kept for when nothing else is left.
+        """
+        try:
+            return cls._DONOR_PREFERENCE[recipient]
+        except KeyError:
+            raise InvalidBloodGroupError(f"Invalid blood group: {recipient}")
+
+    @staticmethod
+    def field_suffix(blood_group):
+        """Turn a blood group such as 'AB-' into an identifier-safe suffix ('ab_neg')"""
+        return blood_group.lower().replace('+', '_pos').replace('-', '_neg')
+
+class BloodBankQuerySet(models.QuerySet):
+    def with_inventory_totals(self):
+        """Annotate each bank with its total units and units per blood group.
+
+        The totals are computed by the database in the same query that loads
+        the banks, so listing N banks costs one query instead of N + 1.
+        """
+        units = 'bloodinventory__units_available'
+        annotations = {'total_inventory': Coalesce(Sum(units), 0)}
+        for group, _ in BloodGroup.BLOOD_GROUPS:
+            annotations[f'units_{BloodGroup.field_suffix(group)}'] = Coalesce(
+                Sum(units, filter=Q(bloodinventory__blood_group=group)), 0
+            )
+        return self.annotate(**annotations)
+
 class BloodBank(models.Model):
     name = models.CharField(max_length=100)
     address = models.TextField()
@@ -39,21 +111,79 @@ class BloodBank(models.Model):
         validators=[phone_regex]
     )
     email = models.EmailField(validators=[email_regex])
+    latitude = models.FloatField(null=True, blank=True, validators=latitude_validators)
+    longitude = models.FloatField(null=True, blank=True, validators=longitude_validators)
+
+    objects = BloodBankQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
     def get_total_inventory(self):
         """Get total blood units available in the blood bank"""
+        if hasattr(self, 'total_inventory'):
+            return self.total_inventory
         try:
-            return sum(inv.units_available for inv in self.bloodinventory_set.all())
+            return self.bloodinventory_set.aggregate(
+                total=Coalesce(Sum('units_available'), 0)
+            )['total']
         except Exception as e:
             raise BloodBankError(f"Error calculating inventory: {str(e)}")
 
+    def get_inventory_by_group(self):
+        """Get units available per blood group, using annotations when present"""
+        if hasattr(self, 'total_inventory'):
+            return {
+                group: getattr(self, f'units_{BloodGroup.field_suffix(group)}')
+                for group, _ in BloodGroup.BLOOD_GROUPS
+            }
+        inventory = dict.fromkeys((group for group, _ in BloodGroup.BLOOD_GROUPS), 0)
+        inventory.update(self.bloodinventory_set.values_list('blood_group', 'units_available'))
+        return inventory
+
     class Meta:
         verbose_name = "Blood Bank"
         verbose_name_plural = "Blood Banks"
 
+class DonorQuerySet(models.QuerySet):
+    def eligible(self, blood_group=None, on=None):
+        """Donors allowed to donate on ``on`` (default today), longest waiting first.
+
+        ``blood_group`` may be one group or a list of them. Answered by a
+        range scan of donor_eligibility_idx per group.
+        """
+        on = on or timezone.localdate()
+        queryset = self.filter(next_eligible_date__lte=on)
+        if blood_group is not None:
+            groups = [blood_group] if isinstance(blood_group, str) else list(blood_group)
+            for group in groups:
+                BloodGroup.validate_blood_group(group)
+            queryset = queryset.filter(blood_type__in=groups)
+        return queryset.order_by('next_eligible_date', 'id')
+
+    def eligible_for(self, recipient, on=None):
+        """Eligible donors whose blood a recipient of the given group can receive"""
+        return self.eligible(BloodGroup.compatible_donors(recipient), on=on)
+
+    def record_donations(self, latest):
+        """Apply ``{donor_id: date}`` of donations made outside Donation.save.
+
+        Dates older than a donor's recorded last donation are ignored.
+        Used by the bulk importer and the seeder.
+        """
+        donors = []
+        current = dict(self.filter(pk__in=list(latest)).values_list('pk', 'last_donation_date'))
+        for pk, last in current.items():
+            donated = latest[pk]
+            if last is None or donated > last:
+                donors.append(Donor(
+                    pk=pk,
+                    last_donation_date=donated,
+                    next_eligible_date=Donor.next_eligible_after(donated)
+                ))
+        self.bulk_update(donors, ['last_donation_date', 'next_eligible_date'], batch_size=500)
+        return len(donors)
+
 class Donor(models.Model):
     BLOOD_GROUPS = [
         ('A+', 'A+'),
@@ -72,47 +202,99 @@ class Donor(models.Model):
     blood_type = models.CharField(max_length=3, choices=BLOOD_GROUPS, default='O+')
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    last_donation_date = models.DateField(null=True, blank=True, editable=False)
+    # Stored so eligibility can be queried; new donors are eligible at once
+    next_eligible_date = models.DateField(default=timezone.localdate, editable=False)
+
+    objects = DonorQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.name} ({self.blood_type})"
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='donor_keyset_idx'),
+            models.Index(fields=['blood_type', 'next_eligible_date'], name='donor_eligibility_idx'),
+        ]
+
+    @staticmethod
+    def next_eligible_after(donation_date):
+        """First day a donor may give blood again after donating on ``donation_date``"""
+        return donation_date + timedelta(days=settings.MINIMUM_DONATION_INTERVAL_DAYS)
+
+    def can_donate(self, on=None):
+        """Check if the donor may donate on ``on`` (default today)"""
+        return self.next_eligible_date <= (on or timezone.localdate())
+
+    def record_donation(self, donated_on=None):
+        """Claim the donor's eligibility for a donation made on ``donated_on``.
+
+        The update only applies while the donor is still eligible, so two
+        concurrent donations can't both get through. Raises DonationError
+        otherwise.
+        """
+        donated_on = donated_on or timezone.localdate()
+        next_eligible_date = self.next_eligible_after(donated_on)
+        claimed = Donor.objects.filter(pk=self.pk, next_eligible_date__lte=donated_on).update(
+            last_donation_date=donated_on,
+            next_eligible_date=next_eligible_date,
+            updated_at=timezone.now()
+        )
+        if not claimed:
+            raise DonationError("Donor is not eligible to donate yet")
+        self.last_donation_date = donated_on
+        self.next_eligible_date = next_eligible_date
+
+        from .response_cache import data_changed
+
+        # The donor list shows updated_at, and update() sends no post_save
+        data_changed(Donor)
 
 class Donation(models.Model):
     donor = models.ForeignKey(Donor, on_delete=models.CASCADE)
     blood_bank = models.ForeignKey(BloodBank, on_delete=models.CASCADE)
     blood_group = models.CharField(max_length=3, choices=BloodGroup.BLOOD_GROUPS)
     units_donated = models.IntegerField(validators=[MinValueValidator(1)])
-    donation_date = models.DateTimeField(auto_now_add=True)
+    donation_date = models.DateTimeField(default=timezone.now, editable=False)
+    # Bulk .update() calls must set this explicitly; rollups rely on it
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.donor} - {self.units_donated} units on {self.donation_date.date()}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-donation_date', '-id'], name='donation_keyset_idx'),
+            models.Index(fields=['updated_at'], name='donation_updated_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         """Override save to validate donation and update inventory"""
         try:
-            if not self.donor.can_donate():
-                raise DonationError("Donor is not eligible to donate yet")
-
+            adding = self._state.adding
             BloodGroup.validate_blood_group(self.blood_group)
-            
-            # Create the donation record
-            super().save(*args, **kwargs)
-
-            # Update inventory
-            inventory, created = BloodInventory.objects.get_or_create(
-                blood_bank=self.blood_bank,
-                blood_group=self.blood_group,
-                defaults={'units_available': 0}
-            )
-            inventory.units_available += self.units_donated
-            inventory.save()
 
-            # Update donor's last donation date
-            self.donor.last_donation_date = timezone.now().date()
-            self.donor.save()
+            # The eligibility claim, the donation and the stock increment
+            # either all happen or none of them do
+            with transaction.atomic():
+                if adding:
+                    self.donor.record_donation(timezone.localdate(self.donation_date))
+                super().save(*args, **kwargs)
+                if not adding:
+                    return
+
+                BloodInventory.add_units(self.blood_bank, self.blood_group, self.units_donated)
+                BloodLot.for_donation(self).save()
+
+                # Mailed by the job worker, after the commit
+                from .jobs import enqueue
+                from .tasks import send_donation_thanks
 
+                enqueue(send_donation_thanks, {'donation_id': self.pk})
+
+        except DonationError:
+            raise
         except Exception as e:
             raise DonationError(f"Error processing donation: {str(e)}")
 
@@ -123,6 +305,11 @@ class BloodRequest(models.Model):
         ('rejected', 'Rejected'),
         ('completed', 'Completed')
     ]
+    PRIORITY_CHOICES = [
+        (0, 'Routine'),
+        (1, 'Urgent'),
+        (2, 'Emergency')
+    ]
 
     requester_name = models.CharField(max_length=100)
     blood_group = models.CharField(max_length=3, choices=BloodGroup.BLOOD_GROUPS)
@@ -131,40 +318,81 @@ class BloodRequest(models.Model):
     hospital_address = models.TextField()
     contact_number = models.CharField(max_length=15, validators=[phone_regex])
     email = models.EmailField(validators=[email_regex])
+    hospital_latitude = models.FloatField(null=True, blank=True, validators=latitude_validators)
+    hospital_longitude = models.FloatField(null=True, blank=True, validators=longitude_validators)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    priority = models.PositiveSmallIntegerField(choices=PRIORITY_CHOICES, default=0)
     request_date = models.DateTimeField(auto_now_add=True)
+    # Bulk .update() calls must set this explicitly; rollups rely on it
+    updated_at = models.DateTimeField(auto_now=True)
     blood_bank = models.ForeignKey(BloodBank, on_delete=models.CASCADE, null=True, blank=True)
 
     def __str__(self):
         return f"{self.requester_name} - {self.blood_group} ({self.status})"
 
+    @property
+    def hospital_location(self):
+        """``(latitude, longitude)`` of the hospital, or None when unknown"""
+        if self.hospital_latitude is None or self.hospital_longitude is None:
+            return None
+        return self.hospital_latitude, self.hospital_longitude
+
+    class Meta:
+        indexes = [
+            # Pending backlog in allocation order
+            models.Index(fields=['status', '-priority', 'request_date'], name='bloodrequest_backlog_idx'),
+            models.Index(fields=['-request_date', '-id'], name='bloodrequest_keyset_idx'),
+            models.Index(fields=['updated_at'], name='bloodrequest_updated_idx'),
+        ]
+
     def approve_request(self):
         """Approve blood request if sufficient units are available"""
         try:
             if not self.blood_bank:
                 raise BloodRequestError("No blood bank assigned to this request")
 
-            inventory = BloodInventory.objects.get(
-                blood_bank=self.blood_bank,
-                blood_group=self.blood_group
-            )
+            with transaction.atomic():
+                # Claim the request first so two concurrent approvals of the
+                # same request cannot both take stock
+                claimed = BloodRequest.objects.filter(
+                    pk=self.pk, status='pending'
+                ).update(status='approved', updated_at=timezone.now())
+                if not claimed:
+                    raise BloodRequestError("Only pending requests can be approved")
 
-            if inventory.units_available < self.units_required:
-                raise InsufficientBloodUnitsError(
-                    f"Only {inventory.units_available} units available"
-                )
+                allocations = list(self.allocations.all())
+                if allocations:
+                    for allocation in allocations:
+                        BloodInventory.remove_units(
+                            allocation.blood_bank_id, allocation.blood_group, allocation.units
+                        )
+                else:
+                    BloodInventory.remove_units(
+                        self.blood_bank, self.blood_group, self.units_required
+                    )
+
+                from .jobs import enqueue
+                from .tasks import send_request_notices
+
+                enqueue(send_request_notices, {'request_id': self.pk, 'event': 'approved'})
 
-            inventory.units_available -= self.units_required
-            inventory.save()
-            
             self.status = 'approved'
-            self.save()
-            
-        except BloodInventory.DoesNotExist:
-            raise BloodRequestError(f"No inventory found for blood group {self.blood_group}")
+
+        except (BloodRequestError, InsufficientBloodUnitsError):
+            raise
         except Exception as e:
             raise BloodRequestError(f"Error processing request: {str(e)}")
 
+class BloodRequestAllocation(models.Model):
+    """Units of a blood request to be supplied by one bank from one donor group"""
+    request = models.ForeignKey(BloodRequest, on_delete=models.CASCADE, related_name='allocations')
+    blood_bank = models.ForeignKey(BloodBank, on_delete=models.CASCADE)
+    blood_group = models.CharField(max_length=3, choices=BloodGroup.BLOOD_GROUPS)
+    units = models.IntegerField(validators=[MinValueValidator(1)])
+
+    def __str__(self):
+        return f"{self.request} <- {self.units} x {self.blood_group} from {self.blood_bank}"
+
 class BloodInventory(models.Model):
     blood_bank = models.ForeignKey(BloodBank, on_delete=models.CASCADE)
     blood_group = models.CharField(max_length=3, choices=BloodGroup.BLOOD_GROUPS)
@@ -181,7 +409,11 @@ class BloodInventory(models.Model):
 
     @classmethod
     def get_available_blood_banks(cls, blood_group, units_required):
-        """Find blood banks with sufficient units of required blood group"""
+        """Find blood banks with sufficient units of required blood group.
+
+        Always queries the database; see find_available_stock for the
+        cached lookup used on the request path.
+        """
         try:
             return cls.objects.filter(
                 blood_group=blood_group,
@@ -189,3 +421,395 @@ class BloodInventory(models.Model):
             ).select_related('blood_bank')
         except Exception as e:
             raise BloodBankError(f"Error finding available blood banks: {str(e)}")
+
+    @classmethod
+    def add_units(cls, blood_bank, blood_group, units):
+        """Atomically add units to a bank's stock and return the new level.
+
+        The increment is applied by the database (``units_available + n``),
+        so concurrent donations never overwrite each other. ``blood_bank``
+        may be a BloodBank or its primary key.
+        """
+        bank_id = getattr(blood_bank, 'pk', blood_bank)
+        with transaction.atomic():
+            updated = cls.objects.filter(
+                blood_bank_id=bank_id, blood_group=blood_group
+            ).update(
+                units_available=F('units_available') + units,
+                last_updated=timezone.now()
+            )
+            if not updated:
+                try:
+                    # Savepoint so a concurrent insert of the same row doesn't
+                    # break the outer transaction
+                    with transaction.atomic():
+                        cls.objects.create(
+                            blood_bank_id=bank_id,
+                            blood_group=blood_group,
+                            units_available=units
+                        )
+                    return units
+                except IntegrityError:
+                    cls.objects.filter(
+                        blood_bank_id=bank_id, blood_group=blood_group
+                    ).update(
+                        units_available=F('units_available') + units,
+                        last_updated=timezone.now()
+                    )
+            available = cls.objects.filter(
+                blood_bank_id=bank_id, blood_group=blood_group
+            ).values_list('units_available', flat=True).get()
+            cls._send_inventory_changed(bank_id, blood_group, available, available - units)
+            return available
+
+    @classmethod
+    def remove_units(cls, blood_bank, blood_group, units):
+        """Atomically take units from a bank's stock and return the new level.
+
+        The decrement only applies while ``units_available >= units``, so
+        stock can never go negative however many approvals run at once.
+        The units are then taken from the bank's lots, soonest expiry first;
+        lots past their expiry date are retired first, so they never count
+        as stock. Raises InsufficientBloodUnitsError when the stock is too low.
+        """
+        bank_id = getattr(blood_bank, 'pk', blood_bank)
+        with transaction.atomic():
+            BloodLot.objects.expire()
+            updated = cls.objects.filter(
+                blood_bank_id=bank_id,
+                blood_group=blood_group,
+                units_available__gte=units
+            ).update(
+                units_available=F('units_available') - units,
+                last_updated=timezone.now()
+            )
+            available = cls.objects.filter(
+                blood_bank_id=bank_id, blood_group=blood_group
+            ).values_list('units_available', flat=True).first()
+            if not updated:
+                if available is None:
+                    raise BloodRequestError(f"No inventory found for blood group {blood_group}")
+                raise InsufficientBloodUnitsError(f"Only {available} units available")
+            BloodLot.objects.consume_fifo({(bank_id, blood_group): units})
+            cls._send_inventory_changed(bank_id, blood_group, available, available + units)
+            return available
+
+    @classmethod
+    def _send_inventory_changed(cls, blood_bank_id, blood_group, units_available, previous_units):
+        from .signals import inventory_changed
+
+        inventory_changed.send(
+            sender=cls,
+            blood_bank_id=blood_bank_id,
+            blood_group=blood_group,
+            units_available=units_available,
+            previous_units=previous_units
+        )
+
+    @classmethod
+    def find_available_stock(cls, blood_group, units_required):
+        """Find ``(blood_bank_id, units)`` pairs with enough units of a blood group.
+
+        Answered from the in-process availability matrix, which falls back
+        to the database when it is cold or expired.
+        """
+        from .availability import availability_matrix
+
+        try:
+            return availability_matrix.banks_with_stock(blood_group, units_required)
+        except Exception as e:
+            raise BloodBankError(f"Error finding available blood banks: {str(e)}")
+
+class BloodLotQuerySet(models.QuerySet):
+    def available(self):
+        return self.filter(units_remaining__gt=0)
+
+    def consume_fifo(self, needed):
+        """Take ``{(blood_bank_id, blood_group): units}`` from lots, soonest expiry first.
+
+        The candidate lots come from one ordered query over bloodlot_fifo_idx
+        and are written back with at most two UPDATEs per batch of lots.
+        Lots past their expiry date are never taken, even before ``expire()``
+        has retired them. Raises InsufficientBloodUnitsError when the lots
+        can't cover a need, which means the cached inventory counter has
+        drifted or still counts expired lots.
+        """
+        needed = {key: units for key, units in needed.items() if units > 0}
+        if not needed:
+            return
+        lots = self.available().filter(expires_on__gte=timezone.localdate())
+        if len(needed) == 1:
+            (bank_id, group), = needed
+            lots = lots.filter(blood_bank_id=bank_id, blood_group=group)
+        else:
+            lots = lots.filter(
+                blood_bank_id__in={bank_id for bank_id, _ in needed},
+                blood_group__in={group for _, group in needed}
+            )
+        rows = lots.order_by('blood_bank_id', 'blood_group', 'expires_on', 'id').values_list(
+            'id', 'blood_bank_id', 'blood_group', 'units_remaining'
+        )
+
+        remaining = dict(needed)
+        emptied, partial = [], {}
+        for lot_id, bank_id, group, units in rows.iterator(chunk_size=100):
+            want = remaining.get((bank_id, group), 0)
+            if want <= 0:
+                if len(needed) == 1:
+                    break
+                continue
+            take = min(want, units)
+            remaining[bank_id, group] = want - take
+            if take == units:
+                emptied.append(lot_id)
+            else:
+                partial[lot_id] = units - take
+
+        short = {key: units for key, units in remaining.items() if units > 0}
+        if short:
+            (bank_id, group), units = next(iter(short.items()))
+            raise InsufficientBloodUnitsError(
+                f"Blood lots are {units} units of {group} short at bank {bank_id}; recount the inventory"
+            )
+        for start in range(0, len(emptied), 500):
+            BloodLot.objects.filter(pk__in=emptied[start:start + 500]).update(units_remaining=0)
+        if partial:
+            BloodLot.objects.filter(pk__in=list(partial)).update(units_remaining=Case(
+                *(When(pk=pk, then=Value(units)) for pk, units in partial.items())
+            ))
+
+    def expire(self, today=None):
+        """Retire every lot past its expiry date and take it off the counters.
+
+        One UPDATE marks the lots expired (moving what was left into
+        units_expired); the counters are then decremented by those units.
+        With nothing to expire it costs a single seek on bloodlot_expiry_idx,
+        so it is cheap enough to run before every consumption.
+        Returns ``{(blood_bank_id, blood_group): units expired}``.
+        """
+        today = today or timezone.localdate()
+        swept_at = timezone.now()
+        if not self.available().filter(expires_on__lt=today).exists():
+            return {}
+        with transaction.atomic():
+            self.available().filter(expires_on__lt=today).update(
+                units_expired=F('units_remaining'),
+                units_remaining=0,
+                expired_at=swept_at
+            )
+            expired = {
+                (row['blood_bank_id'], row['blood_group']): row['units']
+                for row in BloodLot.objects.filter(expired_at=swept_at)
+                .values('blood_bank_id', 'blood_group').annotate(units=Sum('units_expired'))
+            }
+            for (bank_id, group), units in expired.items():
+                BloodInventory.objects.filter(blood_bank_id=bank_id, blood_group=group).update(
+                    units_available=F('units_available') - units,
+                    last_updated=swept_at
+                )
+
+            if expired:
+                from .alerts import stock_levels_changed
+                from .availability import availability_matrix
+                from .response_cache import data_changed
+
+                transaction.on_commit(availability_matrix.invalidate)
+                data_changed(BloodInventory, bank_ids={bank_id for bank_id, _ in expired})
+                levels = BloodInventory.objects.filter(
+                    blood_bank_id__in={bank_id for bank_id, _ in expired},
+                    blood_group__in={group for _, group in expired}
+                ).values_list('blood_bank_id', 'blood_group', 'units_available')
+                stock_levels_changed(
+                    (bank_id, group, units, units + expired[bank_id, group])
+                    for bank_id, group, units in levels if (bank_id, group) in expired
+                )
+        return expired
+
+class BloodLot(models.Model):
+    """Units of one collection held by a bank, consumed soonest-expiry first.
+
+    BloodInventory.units_available is the cached total of units_remaining
+    over a bank's lots of a group.
+    """
+    blood_bank = models.ForeignKey(BloodBank, on_delete=models.CASCADE)
+    blood_group = models.CharField(max_length=3, choices=BloodGroup.BLOOD_GROUPS)
+    donation = models.OneToOneField(
+        Donation, on_delete=models.SET_NULL, null=True, blank=True, related_name='lot'
+    )
+    units = models.IntegerField(validators=[MinValueValidator(1)])
+    units_remaining = models.IntegerField(validators=[MinValueValidator(0)])
+    units_expired = models.IntegerField(default=0)
+    collected_at = models.DateTimeField()
+    expires_on = models.DateField()
+    expired_at = models.DateTimeField(null=True, blank=True)
+
+    objects = BloodLotQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.blood_bank} - {self.blood_group}: {self.units_remaining}/{self.units} units, expires {self.expires_on}"
+
+    class Meta:
+        indexes = [
+            # Only lots with units left are ever searched, so only they are indexed
+            models.Index(
+                fields=['blood_bank', 'blood_group', 'expires_on'], name='bloodlot_fifo_idx',
+                condition=Q(units_remaining__gt=0)
+            ),
+            models.Index(
+                fields=['expires_on'], name='bloodlot_expiry_idx',
+                condition=Q(units_remaining__gt=0)
+            ),
+        ]
+
+    @staticmethod
+    def expiry_for(collected_at):
+        """Last day units collected at ``collected_at`` may be used"""
+        return timezone.localdate(collected_at) + timedelta(days=settings.BLOOD_SHELF_LIFE_DAYS)
+
+    @classmethod
+    def for_donation(cls, donation):
+        """Unsaved lot for the units of a donation"""
+        return cls(
+            blood_bank_id=donation.blood_bank_id,
+            blood_group=donation.blood_group,
+            donation=donation,
+            units=donation.units_donated,
+            units_remaining=donation.units_donated,
+            collected_at=donation.donation_date,
+            expires_on=cls.expiry_for(donation.donation_date)
+        )
+
+class DailyRollup(models.Model):
+    """Donations and requests per day, bank and blood group (see rollups.py).
+
+    Requests are counted on the day they were made, by their current
+    status; ``blood_bank`` is empty for requests not assigned to a bank.
+    """
+    day = models.DateField()
+    blood_bank = models.ForeignKey(BloodBank, on_delete=models.CASCADE, null=True, blank=True)
+    blood_group = models.CharField(max_length=3, choices=BloodGroup.BLOOD_GROUPS)
+    donations = models.IntegerField(default=0)
+    units_donated = models.IntegerField(default=0)
+    units_requested = models.IntegerField(default=0)
+    requests_pending = models.IntegerField(default=0)
+    requests_approved = models.IntegerField(default=0)
+    requests_rejected = models.IntegerField(default=0)
+    requests_completed = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.blood_bank or 'unassigned'} {self.blood_group}"
+
+    class Meta:
+        unique_together = ['day', 'blood_bank', 'blood_group']
+
+class RollupWatermark(models.Model):
+    """How far the daily rollups have been brought up to date; a single row"""
+    last_donation_id = models.BigIntegerField(default=0)
+    last_donation_update = models.DateTimeField(null=True, blank=True)
+    last_request_update = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+class ImportProgress(models.Model):
+    """Rows of a CSV file already imported by import_blood_bank_data.
+
+    Written in the transaction of each imported chunk, so the checkpoint
+    and the rows it counts are committed together.
+    """
+    path = models.CharField(max_length=500, unique=True)
+    rows = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.path}: {self.rows} rows"
+
+class Job(models.Model):
+    """A side effect queued to run outside the request (see jobs.py)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    # Set by the worker that claimed the job; a job running past
+    # JOB_LOCK_TIMEOUT is taken to be abandoned and claimed again
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    class Meta:
+        indexes = [
+            # Due jobs in claim order
+            models.Index(fields=['status', 'run_at', 'id'], name='job_queue_idx'),
+        ]
+
+class StockThreshold(models.Model):
+    """Low-stock alert levels for a blood group at a bank (see alerts.py).
+
+    An alert opens when the bank's units fall to ``low_units`` or below and
+    clears once they are back at ``clear_units`` or more, so stock moving
+    around the low level doesn't open an alert every time. Levels without a
+    bank apply to every bank that has none of its own for the group.
+    """
+    blood_bank = models.ForeignKey(BloodBank, on_delete=models.CASCADE, null=True, blank=True)
+    blood_group = models.CharField(max_length=3, choices=BloodGroup.BLOOD_GROUPS)
+    low_units = models.PositiveIntegerField()
+    clear_units = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.blood_bank or 'All banks'} - {self.blood_group}: low at {self.low_units}, clear at {self.clear_units}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['blood_bank', 'blood_group'], name='stockthreshold_bank_uniq'),
+            models.UniqueConstraint(
+                fields=['blood_group'], condition=Q(blood_bank__isnull=True),
+                name='stockthreshold_default_uniq',
+                violation_error_message="Levels for all banks are already set for this blood group."
+            ),
+            models.CheckConstraint(
+                check=Q(clear_units__gt=F('low_units')), name='stockthreshold_band',
+                violation_error_message="The clear level must be above the low level."
+            ),
+        ]
+
+class StockAlert(models.Model):
+    """A spell of low stock of a blood group at a bank; open until ``cleared_at`` is set"""
+    blood_bank = models.ForeignKey(BloodBank, on_delete=models.CASCADE)
+    blood_group = models.CharField(max_length=3, choices=BloodGroup.BLOOD_GROUPS)
+    # The level crossed and the units left when the alert opened
+    low_units = models.PositiveIntegerField()
+    units_at_open = models.IntegerField()
+    opened_at = models.DateTimeField(default=timezone.now)
+    cleared_at = models.DateTimeField(null=True, blank=True)
+    units_at_clear = models.IntegerField(null=True, blank=True)
+
+    def __str__(self):
+        state = f"cleared {self.cleared_at:%Y-%m-%d %H:%M}" if self.cleared_at else 'open'
+        return f"{self.blood_bank} - {self.blood_group}: {self.units_at_open} units ({state})"
+
+    @property
+    def is_open(self):
+        return self.cleared_at is None
+
+    class Meta:
+        constraints = [
+            # At most one open alert per bank and group
+            models.UniqueConstraint(
+                fields=['blood_bank', 'blood_group'], condition=Q(cleared_at__isnull=True),
+                name='stockalert_open_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['-opened_at', '-id'], name='stockalert_keyset_idx'),
+        ]
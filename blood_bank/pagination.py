@@ -0,0 +1,184 @@
+"""
+Keyset (cursor) pagination for list views.
+
+Pages are selected with ``WHERE (date, id) < (last_date, last_id)`` on a
+composite index instead of ``OFFSET``, so every page costs the same as the
+first one. The cursor handed to the client encodes the key of the last (or
+first) row of the current page.
+"""
+import base64
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+def encode_cursor(values):
+    raw = json.dumps([str(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields):
+    """Turn a cursor back into typed values for the given model fields"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if len(values) != len(fields):
+            raise ValueError
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except Exception:
+        raise Http404("Invalid page cursor")
+
+
+def estimated_count(queryset):
+    """Return ``(count, is_estimate)`` without a full COUNT(*) where possible.
+
+    Filtered querysets are counted exactly, since a table-level estimate
+    says nothing about them. Unfiltered ones use the planner statistics
+    (``ANALYZE``) when available and the largest primary key otherwise.
+    """
+    if queryset.query.where:
+        return queryset.count(), False
+
+    model = queryset.model
+    table = model._meta.db_table
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+            row = cursor.fetchone()
+            if row and row[0] > 0:
+                return row[0], True
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone():
+                cursor.execute(
+                    "SELECT stat FROM sqlite_stat1 WHERE tbl = %s ORDER BY idx IS NOT NULL LIMIT 1",
+                    [table]
+                )
+                row = cursor.fetchone()
+                if row:
+                    return int(row[0].split()[0]), True
+
+    pk = model._meta.pk
+    if pk.get_internal_type() in ('AutoField', 'BigAutoField', 'SmallAutoField'):
+        newest = model._default_manager.using(queryset.db).order_by('-pk').values_list('pk', flat=True).first()
+        return newest or 0, True
+    return queryset.count(), False
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator counting with ``estimated_count`` instead of COUNT(*).
+
+    For admin changelists of large tables: an unfiltered list gets its
+    page count from the table statistics, a filtered one is counted
+    exactly. The last page may come out short or empty when the estimate
+    is off.
+    """
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)[0]
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset"""
+
+    def __init__(self, object_list, keyset, has_next, has_previous):
+        self.object_list = object_list
+        self.keyset = keyset
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _cursor(self, obj):
+        return encode_cursor(getattr(obj, name) for name in self.keyset)
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return self._cursor(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return self._cursor(self.object_list[0])
+        return None
+
+
+class KeysetPaginationMixin:
+    """Paginate a ListView by cursor on ``keyset``, newest first.
+
+    ``keyset`` names the fields of a matching descending composite index,
+    ending with a unique field. ``count_strategy`` controls the total shown
+    with the list: ``'exact'``, ``'estimate'`` or ``None`` to skip it.
+    """
+    keyset = ('id',)
+    paginate_by = 25
+    count_strategy = None
+
+    def get_ordering(self):
+        return [f'-{name}' for name in self.keyset]
+
+    def _after(self, values, descending=True):
+        """Q for rows strictly past ``values`` in the (descending) keyset order"""
+        lookup = 'lt' if descending else 'gt'
+        condition = Q()
+        for i, name in enumerate(self.keyset):
+            equal = {self.keyset[j]: values[j] for j in range(i)}
+            condition |= Q(**equal, **{f'{name}__{lookup}': values[i]})
+        # The redundant bound on the leading field lets the index range scan
+        # start at the cursor instead of filtering the whole index
+        return Q(**{f'{self.keyset[0]}__{lookup}e': values[0]}) & condition
+
+    def paginate_queryset(self, queryset, page_size):
+        fields = [queryset.model._meta.get_field(name) for name in self.keyset]
+        after = self.request.GET.get('after')
+        before = self.request.GET.get('before')
+
+        if before:
+            values = decode_cursor(before, fields)
+            rows = list(
+                queryset.filter(self._after(values, descending=False))
+                .order_by(*self.keyset)[:page_size + 1]
+            )
+            has_previous = len(rows) > page_size
+            object_list = rows[:page_size][::-1]
+            page = KeysetPage(object_list, self.keyset, has_next=True, has_previous=has_previous)
+        else:
+            if after:
+                queryset = queryset.filter(self._after(decode_cursor(after, fields)))
+            rows = list(queryset.order_by(*self.get_ordering())[:page_size + 1])
+            page = KeysetPage(
+                rows[:page_size], self.keyset,
+                has_next=len(rows) > page_size, has_previous=bool(after)
+            )
+        return None, page, page.object_list, page.has_other_pages()
+
+    def get_total_count(self):
+        """Return ``(count, is_estimate)`` per ``count_strategy``, or ``(None, False)``"""
+        if self.count_strategy is None:
+            return None, False
+        queryset = self.get_queryset()
+        if self.count_strategy == 'estimate':
+            return estimated_count(queryset)
+        return queryset.count(), False
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['total_count'], context['total_is_estimate'] = self.get_total_count()
+        return context
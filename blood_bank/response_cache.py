@@ -0,0 +1,182 @@
+"""
+Versioned response caching for public pages.
+
+Every model a page shows, and every bank with pages of its own, has a
+version stamp kept in the cache. A cached response is stored under a key
+made of the URL and the current stamps of the data it depends on, so
+bumping a stamp makes every response built from the old data unreachable
+at once; nothing has to be found and deleted. Signal handlers and the bulk
+stock operations bump the stamps when a transaction commits (see
+``data_changed``).
+
+Stamps are random rather than incremented, so bumps don't need an atomic
+``incr`` (the file backend has none) and a stamp evicted from the cache
+can never come back with an old value. Works with any cache backend; the
+local-memory backend is per process, so deployments with several worker
+processes should use a shared one such as the file backend
+(``BLOOD_BANK_CACHE_DIR``).
+
+Only pages that look the same for every visitor may be cached this way;
+requests with flash messages waiting to be shown bypass the cache.
+"""
+import functools
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .routers import pinned_to_primary
+
+VERSION_PREFIX = 'blood_bank:version'
+RESPONSE_PREFIX = 'blood_bank:response'
+
+# Bumped when stock changed at banks that weren't identified
+ALL_BANKS = 'bank:*'
+
+
+def _cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'RESPONSE_CACHE_TTL', 600)
+
+
+def model_scope(model):
+    return f"model:{model._meta.label_lower}"
+
+
+def bank_scope(bank_id):
+    return f"bank:{bank_id}"
+
+
+def _new_stamp():
+    return uuid.uuid4().hex
+
+
+def get_versions(scopes):
+    """Current stamps of ``scopes``, creating the missing ones; one cache round trip when warm"""
+    cache = _cache()
+    keys = [f"{VERSION_PREFIX}:{scope}" for scope in scopes]
+    found = cache.get_many(keys) if keys else {}
+    for key in keys:
+        if key not in found:
+            # add() keeps a stamp another process created meanwhile
+            cache.add(key, _new_stamp(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump_versions(*scopes):
+    if scopes:
+        _cache().set_many(
+            {f"{VERSION_PREFIX}:{scope}": _new_stamp() for scope in scopes}, timeout=None
+        )
+
+
+def data_changed(*models, bank_ids=(), all_banks=False):
+    """Invalidate pages showing ``models`` (and pages of ``bank_ids``) once the transaction commits.
+
+    ``all_banks`` is for changes that may have touched any bank. Bumping
+    after the commit means a page rendered before it is stored under the
+    old stamps, where it will never be found again.
+    """
+    scopes = [model_scope(model) for model in models]
+    scopes.extend(bank_scope(bank_id) for bank_id in set(bank_ids))
+    if all_banks:
+        scopes.append(ALL_BANKS)
+    transaction.on_commit(lambda: bump_versions(*scopes))
+
+
+def _response_key(request, versions):
+    query = sorted(request.GET.lists())
+    url = f"{request.scheme}://{request.get_host()}{request.path}?{query!r}"
+    digest = hashlib.md5(f"{url}|{'|'.join(map(str, versions))}".encode(), usedforsecurity=False)
+    return f"{RESPONSE_PREFIX}:{digest.hexdigest()}"
+
+
+def _cacheable(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and 'private' not in response.get('Cache-Control', '')
+        and 'no-store' not in response.get('Cache-Control', '')
+    )
+
+
+def _from_cache(request, response):
+    """A cached response, or 304 when the client's validators still match"""
+    if not response.has_header('ETag') and not response.has_header('Last-Modified'):
+        return response
+    last_modified = response.get('Last-Modified')
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=last_modified and parse_http_date_safe(last_modified),
+        response=response,
+    )
+
+
+def _has_messages(request):
+    storage = getattr(request, '_messages', None)
+    return storage is not None and len(storage) > 0
+
+
+def cached_response(request, render, models=(), bank_id=None):
+    """Return ``render()`` from the cache while the data it shows is unchanged"""
+    timeout = _timeout()
+    if request.method not in ('GET', 'HEAD') or not timeout or _has_messages(request):
+        return render()
+
+    scopes = [model_scope(model) for model in models]
+    if bank_id is not None:
+        scopes += [ALL_BANKS, bank_scope(bank_id)]
+    key = _response_key(request, get_versions(scopes))
+    cache = _cache()
+    response = cache.get(key)
+    if response is not None:
+        return _from_cache(request, response)
+
+    # Render from the primary, inside the block, so a lagging replica can't
+    # put old data under the new stamps
+    with pinned_to_primary():
+        response = render()
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+    if _cacheable(response):
+        cache.set(key, response, timeout)
+    return response
+
+
+def versioned_cache(models=(), bank_kwarg=None):
+    """Decorator caching a function view's responses; see ``cached_response``"""
+    def decorator(view):
+        @functools.wraps(view)
+        def inner(request, *args, **kwargs):
+            return cached_response(
+                request,
+                lambda: view(request, *args, **kwargs),
+                models=models,
+                bank_id=kwargs.get(bank_kwarg) if bank_kwarg else None,
+            )
+        return inner
+    return decorator
+
+
+class VersionedCacheMixin:
+    """Class-based view mixin caching responses until ``cache_models`` change"""
+    cache_models = ()
+    cache_bank_kwarg = None
+
+    def dispatch(self, request, *args, **kwargs):
+        return cached_response(
+            request,
+            lambda: super(VersionedCacheMixin, self).dispatch(request, *args, **kwargs),
+            models=self.cache_models,
+            bank_id=kwargs.get(self.cache_bank_kwarg) if self.cache_bank_kwarg else None,
+        )
@@ -0,0 +1,188 @@
+"""
+Daily rollups of donations and blood requests per bank and blood group.
+
+``update_rollups()`` finds the days touched since the last run (donations
+past the last seen id, donations and requests updated since the last run by
+their ``updated_at``) and recomputes just those days from the raw tables.
+Recomputing a whole day is idempotent, so runs can overlap a little
+(ROLLUP_OVERLAP) to pick up rows whose transactions committed late, and a
+request changing status is handled like any other change. A deleted row
+leaves nothing to find, so deleting a donation or request queues a rebuild
+of its day instead (see signals.py). Changes that bypass both, such as a
+bulk ``.update()`` that doesn't set ``updated_at`` or raw SQL, need
+``backfill=True``, which rebuilds every day. Reports read DailyRollup
+instead of scanning Donation and BloodRequest.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import BloodRequest, DailyRollup, Donation, RollupWatermark
+
+# Re-examine changes this far behind the high-water mark
+ROLLUP_OVERLAP = timedelta(minutes=5)
+
+# Days rebuilt per statement when backfilling
+BACKFILL_DAYS = 31
+
+STATUSES = ('pending', 'approved', 'rejected', 'completed')
+
+COUNTERS = (
+    'donations', 'units_donated', 'units_requested',
+    'requests_pending', 'requests_approved', 'requests_rejected', 'requests_completed',
+)
+
+# Grouping dimensions of rollup_report
+DIMENSIONS = {
+    'day': 'day',
+    'bank': 'blood_bank_id',
+    'group': 'blood_group',
+}
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _runs(days):
+    """Group sorted days into ``(first, last)`` runs of consecutive days"""
+    runs = []
+    for day in sorted(days):
+        if runs and day - runs[-1][1] == timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [tuple(run) for run in runs]
+
+
+def rebuild_days(first, last):
+    """Recompute the rollups of every day from ``first`` to ``last`` inclusive"""
+    start, end = _day_start(first), _day_start(last + timedelta(days=1))
+    rows = defaultdict(dict)
+
+    donations = (
+        Donation.objects.filter(donation_date__gte=start, donation_date__lt=end)
+        .annotate(day=TruncDate('donation_date'))
+        .values('day', 'blood_bank_id', 'blood_group')
+        .annotate(donations=Count('id'), units_donated=Sum('units_donated'))
+    )
+    for row in donations:
+        rows[row['day'], row['blood_bank_id'], row['blood_group']].update(
+            donations=row['donations'], units_donated=row['units_donated']
+        )
+
+    requests = (
+        BloodRequest.objects.filter(request_date__gte=start, request_date__lt=end)
+        .annotate(day=TruncDate('request_date'))
+        .values('day', 'blood_bank_id', 'blood_group')
+        .annotate(
+            units_requested=Sum('units_required'),
+            **{f'requests_{status}': Count('id', filter=Q(status=status)) for status in STATUSES}
+        )
+    )
+    for row in requests:
+        key = (row.pop('day'), row.pop('blood_bank_id'), row.pop('blood_group'))
+        rows[key].update(row)
+
+    with transaction.atomic():
+        DailyRollup.objects.filter(day__gte=first, day__lte=last).delete()
+        DailyRollup.objects.bulk_create(
+            (
+                DailyRollup(day=day, blood_bank_id=bank_id, blood_group=group, **counts)
+                for (day, bank_id, group), counts in rows.items()
+            ),
+            batch_size=500
+        )
+    return len(rows)
+
+
+def rebuild_dates(days):
+    """Recompute the rollups of the given days; returns ``(days rebuilt, rows written)``"""
+    rebuilt = rows = 0
+    for first, last in _runs(days):
+        rows += rebuild_days(first, last)
+        rebuilt += (last - first).days + 1
+    return rebuilt, rows
+
+
+def _touched_days(watermark):
+    """Local days with donations or request changes since the watermark"""
+    days = set(
+        Donation.objects.filter(pk__gt=watermark.last_donation_id)
+        .annotate(day=TruncDate('donation_date')).values_list('day', flat=True).distinct()
+    )
+    # Edited donations; new ones are found by id above
+    if watermark.last_donation_update is not None:
+        days.update(
+            Donation.objects.filter(updated_at__gte=watermark.last_donation_update - ROLLUP_OVERLAP)
+            .annotate(day=TruncDate('donation_date')).values_list('day', flat=True).distinct()
+        )
+    requests = BloodRequest.objects.all()
+    if watermark.last_request_update is not None:
+        requests = requests.filter(updated_at__gte=watermark.last_request_update - ROLLUP_OVERLAP)
+    days.update(
+        requests.annotate(day=TruncDate('request_date')).values_list('day', flat=True).distinct()
+    )
+    return days
+
+
+def update_rollups(backfill=False):
+    """Bring the rollups up to date; returns ``(days rebuilt, rows written)``"""
+    watermark, _ = RollupWatermark.objects.get_or_create(pk=1)
+    # Read the new marks first, so anything written while the days are
+    # rebuilt is picked up by the next run
+    marks = Donation.objects.aggregate(last_id=Max('id'))
+    update_mark = timezone.now()
+
+    if backfill:
+        bounds = [
+            Donation.objects.aggregate(first=Min('donation_date'), last=Max('donation_date')),
+            BloodRequest.objects.aggregate(first=Min('request_date'), last=Max('request_date')),
+        ]
+        bounds = [b for b in bounds if b['first'] is not None]
+        runs = []
+        if bounds:
+            day = min(timezone.localdate(b['first']) for b in bounds)
+            last = max(timezone.localdate(b['last']) for b in bounds)
+            DailyRollup.objects.exclude(day__range=(day, last)).delete()
+            while day <= last:
+                runs.append((day, min(day + timedelta(days=BACKFILL_DAYS - 1), last)))
+                day += timedelta(days=BACKFILL_DAYS)
+        else:
+            DailyRollup.objects.all().delete()
+    else:
+        runs = _runs(_touched_days(watermark))
+
+    days = rows = 0
+    for first, last in runs:
+        rows += rebuild_days(first, last)
+        days += (last - first).days + 1
+
+    watermark.last_donation_id = max(marks['last_id'] or 0, watermark.last_donation_id)
+    watermark.last_donation_update = update_mark
+    watermark.last_request_update = update_mark
+    watermark.save()
+    return days, rows
+
+
+def rollup_report(start=None, end=None, blood_bank=None, blood_group=None, by='day'):
+    """Summed rollup counters per day, bank or blood group, read from DailyRollup"""
+    rollups = DailyRollup.objects.all()
+    if start:
+        rollups = rollups.filter(day__gte=start)
+    if end:
+        rollups = rollups.filter(day__lte=end)
+    if blood_bank:
+        rollups = rollups.filter(blood_bank_id=blood_bank)
+    if blood_group:
+        rollups = rollups.filter(blood_group=blood_group)
+    key = DIMENSIONS[by]
+    return list(
+        rollups.values(key)
+        .annotate(**{counter: Sum(counter) for counter in COUNTERS})
+        .order_by(key)
+    )
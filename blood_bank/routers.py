@@ -0,0 +1,85 @@
+"""
+Database router sending reporting reads to read replicas.
+
+Reads only go to a replica inside ``replica_reads()`` (list views, exports
+and admin changelists opt in with ReplicaReadMixin / use_replica). Writes,
+reads inside a transaction (such as the inventory mutations) and requests
+pinned by ReplicaStickinessMiddleware after a write all use the primary.
+Replica aliases are listed in ``settings.DATABASE_REPLICAS``; with none
+configured the router does nothing.
+"""
+import functools
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica_reads = ContextVar('blood_bank_replica_reads', default=False)
+_pinned_to_primary = ContextVar('blood_bank_pinned_to_primary', default=False)
+
+
+@contextmanager
+def replica_reads():
+    """Let reads of blood_bank models inside the block use a replica"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def pinned_to_primary(pinned=True):
+    """Keep every read inside the block on the primary (when ``pinned``)"""
+    token = _pinned_to_primary.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+def use_replica(view):
+    """Decorator for function views whose GET/HEAD reads may use a replica"""
+    @functools.wraps(view)
+    def inner(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return inner
+
+
+class ReplicaReadMixin:
+    """Class-based view mixin: GET/HEAD reads may use a replica"""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        with replica_reads():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class PrimaryReplicaRouter:
+    app_label = 'blood_bank'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+        if not _replica_reads.get() or _pinned_to_primary.get():
+            return None
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
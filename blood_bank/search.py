@@ -0,0 +1,160 @@
+"""
+Full-text search over donors and blood requests.
+
+On SQLite with FTS5 every searchable model gets an external-content FTS5
+table (``<table>_fts``) kept in sync by triggers, so saves, deletes,
+bulk_create and queryset updates are all indexed without going through
+Python. User input becomes a prefix query (``"ann"* "smi"*``, every term
+required) ranked with bm25. Other databases, and SQLite builds without
+FTS5, fall back to ``icontains`` filters on the same fields.
+"""
+import re
+
+from django.db import OperationalError, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import BloodRequest, Donor
+
+# Indexed fields per model with their bm25 weights
+SEARCH_INDEXES = {
+    Donor: (('name', 10.0), ('email', 1.0)),
+    BloodRequest: (('requester_name', 10.0), ('hospital_name', 5.0)),
+}
+
+# Most results a ranked search returns
+SEARCH_LIMIT = 50
+
+_TERM = re.compile(r'\w+')
+
+# (alias, database name) -> names of the FTS tables there
+_available = {}
+
+
+def fts_table(model):
+    return f"{model._meta.db_table}_fts"
+
+
+def _schema(model):
+    """``(name, sql)`` of the FTS table and its triggers for a model"""
+    table = model._meta.db_table
+    fts = fts_table(model)
+    fields = [field for field, _ in SEARCH_INDEXES[model]]
+    columns = ', '.join(model._meta.get_field(field).column for field in fields)
+    new = ', '.join(f"new.{model._meta.get_field(field).column}" for field in fields)
+    old = ', '.join(f"old.{model._meta.get_field(field).column}" for field in fields)
+    delete = f"INSERT INTO {fts} ({fts}, rowid, {columns}) VALUES ('delete', old.id, {old});"
+    insert = f"INSERT INTO {fts} (rowid, {columns}) VALUES (new.id, {new});"
+    return [
+        (fts, f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+              f"{columns}, content='{table}', content_rowid='id', "
+              f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"),
+        (f"{fts}_ai", f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END"),
+        (f"{fts}_ad", f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END"),
+        (f"{fts}_au", f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {table} "
+                      f"BEGIN {delete} {insert} END"),
+    ]
+
+
+def install_search_index(connection):
+    """Create any missing FTS tables and triggers and (re)build those indexes.
+
+    Safe to run repeatedly. Triggers are lost whenever a migration rebuilds
+    a table on SQLite, so this also runs after every migrate. Returns False
+    when the database can't have an FTS5 index.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    _available.clear()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+            existing = {row[0] for row in cursor.fetchall()}
+            for model in SEARCH_INDEXES:
+                if model._meta.db_table not in existing:
+                    continue
+                missing = [sql for name, sql in _schema(model) if name not in existing]
+                for sql in missing:
+                    cursor.execute(sql)
+                if missing:
+                    fts = fts_table(model)
+                    cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+    except OperationalError:
+        # SQLite built without FTS5
+        return False
+    return True
+
+
+def drop_search_index(connection):
+    if connection.vendor != 'sqlite':
+        return
+    _available.clear()
+    with connection.cursor() as cursor:
+        for model in SEARCH_INDEXES:
+            for name, sql in reversed(_schema(model)):
+                kind = 'TABLE' if name == fts_table(model) else 'TRIGGER'
+                cursor.execute(f"DROP {kind} IF EXISTS {name}")
+
+
+def has_search_index(model, using):
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or model not in SEARCH_INDEXES:
+        return False
+    key = (using, str(connection.settings_dict['NAME']))
+    if key not in _available:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB '*_fts'")
+            _available[key] = {row[0] for row in cursor.fetchall()}
+    return fts_table(model) in _available[key]
+
+
+def match_expression(query):
+    """FTS5 query requiring a prefix match of every word, or None for no words"""
+    terms = _TERM.findall(query)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _fallback_filter(model, query):
+    condition = Q()
+    for term in _TERM.findall(query):
+        term_condition = Q()
+        for field, _ in SEARCH_INDEXES[model]:
+            term_condition |= Q(**{f'{field}__icontains': term})
+        condition &= term_condition
+    return condition
+
+
+def search_filter(queryset, query):
+    """Restrict a queryset to rows matching ``query``, in no particular order"""
+    match = match_expression(query)
+    if match is None:
+        return queryset
+    model = queryset.model
+    if not has_search_index(model, queryset.db):
+        return queryset.filter(_fallback_filter(model, query))
+    fts = fts_table(model)
+    return queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", [match]))
+
+
+def search(queryset, query, limit=SEARCH_LIMIT):
+    """Up to ``limit`` rows of a queryset matching ``query``, best match first"""
+    match = match_expression(query)
+    if match is None:
+        return []
+    model = queryset.model
+    if not has_search_index(model, queryset.db):
+        return list(queryset.filter(_fallback_filter(model, query))[:limit])
+
+    fts = fts_table(model)
+    weights = ', '.join(str(weight) for _, weight in SEARCH_INDEXES[model])
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s ORDER BY bm25({fts}, {weights}) LIMIT %s",
+            [match, limit]
+        )
+        ranked = [row[0] for row in cursor.fetchall()]
+    position = {pk: i for i, pk in enumerate(ranked)}
+    rows = queryset.filter(pk__in=ranked)
+    return sorted(rows, key=lambda row: position[row.pk])
@@ -0,0 +1,325 @@
+"""
+Synthetic data for development and benchmarking.
+
+``seed(...)`` fills the blood_bank tables with a reproducible, realistic
+mix of blood banks, donors, donations, blood requests and inventory. The
+same seed and volumes always produce the same rows. Rows are written with
+``bulk_create`` in batches, so millions of rows stay within a few hundred
+MB of memory. Inventory is derived from the generated donations minus the
+requests marked approved, which keeps the stock consistent with history.
+"""
+import random
+from collections import Counter
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .lots import reconstruct_lots
+from .models import (
+    BloodBank, BloodInventory, BloodLot, BloodRequest, BloodRequestAllocation, DailyRollup, Donation,
+    Donor, RollupWatermark, StockAlert, StockThreshold
+)
+
+# Named volumes for seed_data --size and run_benchmarks --sizes
+SIZES = {
+    'small': {'banks': 20, 'donors': 2000, 'donations': 10000, 'requests': 2000},
+    'medium': {'banks': 100, 'donors': 50000, 'donations': 250000, 'requests': 50000},
+    'large': {'banks': 500, 'donors': 500000, 'donations': 2500000, 'requests': 500000},
+    'xlarge': {'banks': 2000, 'donors': 2000000, 'donations': 10000000, 'requests': 2000000},
+}
+
+# Approximate share of each group in the donor population
+GROUP_WEIGHTS = {
+    'O+': 38, 'A+': 34, 'B+': 9, 'O-': 7, 'A-': 6, 'AB+': 3, 'B-': 2, 'AB-': 1,
+}
+
+FIRST_NAMES = [
+    'Aisha', 'Ben', 'Carlos', 'Dana', 'Elif', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jamal',
+    'Kofi', 'Lena', 'Mateo', 'Nadia', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sven', 'Tara',
+    'Umar', 'Vera', 'Wei', 'Ximena', 'Yusuf', 'Zoe',
+]
+LAST_NAMES = [
+    'Adams', 'Bose', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Haddad', 'Ito', 'Jensen',
+    'Khan', 'Lopez', 'Moreau', 'Nowak', 'Okafor', 'Patel', 'Quist', 'Rossi', 'Silva', 'Tanaka',
+]
+CITIES = [
+    'Springfield', 'Riverside', 'Fairview', 'Greenville', 'Madison', 'Clinton', 'Franklin',
+    'Georgetown', 'Salem', 'Ashland', 'Oakland', 'Dover',
+]
+STREETS = ['Main St', 'Oak Ave', 'Park Rd', 'Elm St', 'Lake Dr', 'Hill Rd', 'Cedar Ln', 'Maple Ave']
+
+# Weights for pending/approved/rejected/completed and routine/urgent/emergency
+STATUS_WEIGHTS = {'pending': 20, 'approved': 30, 'rejected': 10, 'completed': 40}
+PRIORITY_WEIGHTS = {0: 80, 1: 15, 2: 5}
+
+# Latitude and longitude ranges banks and hospitals are placed in
+REGION = ((25.0, 49.0), (-124.0, -67.0))
+
+
+class Seeder:
+    """Generates one data set; see ``seed`` for the parameters"""
+
+    def __init__(self, seed=0, history_days=730, batch_size=5000, stdout=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.history_days = history_days
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.now = timezone.now()
+        self.groups = list(GROUP_WEIGHTS)
+        self.group_weights = list(GROUP_WEIGHTS.values())
+        # Separate stream, so locations don't change the rest of a data set
+        self.location_rng = random.Random(f"{seed}-locations")
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    # Helpers
+
+    def person(self):
+        return f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+
+    def address(self):
+        return f"{self.rng.randint(1, 999)} {self.rng.choice(STREETS)}, {self.rng.choice(CITIES)}"
+
+    def phone(self):
+        return f"+1{self.rng.randint(2000000000, 9999999999)}"
+
+    def past(self, days=None):
+        """A random moment within the last ``days`` (default: the whole history)"""
+        seconds = (days or self.history_days) * 86400
+        return self.now - timedelta(seconds=self.rng.randint(0, seconds))
+
+    def location(self):
+        (south, north), (west, east) = REGION
+        return (
+            round(self.location_rng.uniform(south, north), 5),
+            round(self.location_rng.uniform(west, east), 5),
+        )
+
+    def blood_group(self):
+        return self.rng.choices(self.groups, self.group_weights)[0]
+
+    def batches(self, total, build):
+        """Yield lists of up to batch_size objects built by ``build(n)``"""
+        for start in range(0, total, self.batch_size):
+            yield [build(n) for n in range(start, min(start + self.batch_size, total))]
+
+    # Tables
+
+    def banks(self, count):
+        def build(n):
+            latitude, longitude = self.location()
+            return BloodBank(
+                name=f"{self.rng.choice(CITIES)} Blood Bank {n + 1}",
+                address=self.address(),
+                contact_number=self.phone(),
+                email=f"bank{n + 1}.s{self.seed}@seed.example.org",
+                latitude=latitude,
+                longitude=longitude,
+            )
+
+        for batch in self.batches(count, build):
+            BloodBank.objects.bulk_create(batch)
+        ids = list(BloodBank.objects.filter(email__endswith=f".s{self.seed}@seed.example.org")
+                   .order_by('id').values_list('id', flat=True))
+        self.log(f"  {len(ids)} blood banks")
+        return ids
+
+    def donors(self, count):
+        def build(n):
+            created_at = self.past()
+            return Donor(
+                name=self.person(),
+                email=f"donor{n + 1}.s{self.seed}@seed.example.org",
+                age=self.rng.randint(18, 65),
+                blood_type=self.blood_group(),
+                created_at=created_at,
+                next_eligible_date=timezone.localdate(created_at),
+            )
+
+        for batch in self.batches(count, build):
+            Donor.objects.bulk_create(batch)
+        donors = list(Donor.objects.filter(email__endswith=f".s{self.seed}@seed.example.org")
+                      .order_by('id').values_list('id', 'blood_type'))
+        self.log(f"  {len(donors)} donors")
+        return donors
+
+    def donations(self, count, donors, bank_ids):
+        """Create donations and return the units given per (bank, group)"""
+        stock = Counter()
+        latest = {}
+
+        def build(n):
+            donor_id, blood_group = self.rng.choice(donors)
+            bank_id = self.rng.choice(bank_ids)
+            units = self.rng.choices([1, 2], [90, 10])[0]
+            stock[bank_id, blood_group] += units
+            donation_date = self.past()
+            donated_on = timezone.localdate(donation_date)
+            latest[donor_id] = max(latest.get(donor_id, donated_on), donated_on)
+            return Donation(
+                donor_id=donor_id,
+                blood_bank_id=bank_id,
+                blood_group=blood_group,
+                units_donated=units,
+                donation_date=donation_date,
+            )
+
+        # bulk_create skips Donation.save(), so stock and donor eligibility
+        # are brought up to date afterwards
+        for batch in self.batches(count, build):
+            Donation.objects.bulk_create(batch)
+        donor_ids = list(latest)
+        for start in range(0, len(donor_ids), self.batch_size):
+            Donor.objects.record_donations({pk: latest[pk] for pk in donor_ids[start:start + self.batch_size]})
+        self.log(f"  {count} donations")
+        return stock
+
+    def requests(self, count, bank_ids, stock):
+        """Create requests; approved and completed ones consume stock when it allows"""
+        statuses = list(STATUS_WEIGHTS)
+        status_weights = list(STATUS_WEIGHTS.values())
+        priorities = list(PRIORITY_WEIGHTS)
+        priority_weights = list(PRIORITY_WEIGHTS.values())
+        allocations = []
+
+        def build(n):
+            blood_group = self.blood_group()
+            units = self.rng.choices([1, 2, 3, 4, 6], [40, 30, 15, 10, 5])[0]
+            status = self.rng.choices(statuses, status_weights)[0]
+            bank_id = self.rng.choice(bank_ids)
+            if status in ('approved', 'completed'):
+                if stock[bank_id, blood_group] >= units:
+                    stock[bank_id, blood_group] -= units
+                    allocations.append((n, bank_id, blood_group, units))
+                else:
+                    status = 'pending'
+            hospital_latitude, hospital_longitude = self.location()
+            return BloodRequest(
+                requester_name=self.person(),
+                blood_group=blood_group,
+                units_required=units,
+                hospital_name=f"{self.rng.choice(CITIES)} General Hospital",
+                hospital_address=self.address(),
+                hospital_latitude=hospital_latitude,
+                hospital_longitude=hospital_longitude,
+                contact_number=self.phone(),
+                email=f"request{n + 1}.s{self.seed}@seed.example.org",
+                status=status,
+                priority=self.rng.choices(priorities, priority_weights)[0],
+                blood_bank_id=bank_id if status != 'pending' else None,
+            )
+
+        for batch in self.batches(count, build):
+            BloodRequest.objects.bulk_create(batch)
+
+        # request_date is auto_now_add, so spread it out after the insert
+        request_ids = list(BloodRequest.objects.filter(email__endswith=f".s{self.seed}@seed.example.org")
+                           .order_by('id').values_list('id', flat=True))
+        BloodRequestAllocation.objects.bulk_create(
+            (
+                BloodRequestAllocation(
+                    request_id=request_ids[n], blood_bank_id=bank_id, blood_group=group, units=units
+                )
+                for n, bank_id, group, units in allocations
+            ),
+            batch_size=self.batch_size
+        )
+        self.spread_request_dates(request_ids)
+        self.log(f"  {len(request_ids)} blood requests ({len(allocations)} filled)")
+
+    def spread_request_dates(self, request_ids):
+        # One UPDATE per day bucket keeps this to history_days statements
+        by_day = {}
+        for request_id in request_ids:
+            by_day.setdefault(self.rng.randint(0, self.history_days), []).append(request_id)
+        for day, ids in by_day.items():
+            when = self.now - timedelta(days=day, seconds=self.rng.randint(0, 86399))
+            for start in range(0, len(ids), 500):
+                BloodRequest.objects.filter(pk__in=ids[start:start + 500]).update(request_date=when)
+
+    def inventory(self, stock):
+        rows = [
+            BloodInventory(blood_bank_id=bank_id, blood_group=group, units_available=units)
+            for (bank_id, group), units in sorted(stock.items())
+        ]
+        # Existing rows (from an earlier seed) are topped up instead
+        existing = set(BloodInventory.objects.filter(
+            blood_bank_id__in={bank_id for bank_id, _ in stock}
+        ).values_list('blood_bank_id', 'blood_group'))
+        BloodInventory.objects.bulk_create(
+            [row for row in rows if (row.blood_bank_id, row.blood_group) not in existing],
+            batch_size=self.batch_size
+        )
+        for row in rows:
+            if (row.blood_bank_id, row.blood_group) in existing:
+                BloodInventory.add_units(row.blood_bank_id, row.blood_group, row.units_available)
+        self.log(f"  {len(rows)} inventory rows")
+        lots = reconstruct_lots(BloodInventory, Donation, BloodLot, batch_size=self.batch_size)
+        self.log(f"  {lots} blood lots")
+
+
+def flush():
+    """Delete every row of the blood_bank tables.
+
+    Plain DELETE statements, children first; going through the ORM would
+    load every row to run cascades and signals.
+    """
+    models = (
+        BloodRequestAllocation, BloodRequest, BloodLot, Donation, BloodInventory, Donor,
+        StockAlert, StockThreshold, DailyRollup, RollupWatermark, BloodBank
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model in models:
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)}")
+
+    from .alerts import stock_thresholds
+    from .availability import availability_matrix
+    from .geo import bank_locations
+    from .response_cache import data_changed
+
+    availability_matrix.invalidate()
+    bank_locations.invalidate()
+    stock_thresholds.invalidate()
+    data_changed(BloodBank, BloodInventory, Donor, all_banks=True)
+
+
+def seed(banks, donors, donations, requests, seed=0, history_days=730, batch_size=5000, stdout=None):
+    """Generate a data set with the given volumes; returns the Seeder used.
+
+    Seeded rows are recognisable by their ``.s<seed>@seed.example.org``
+    e-mail addresses, so the same seed can't be loaded twice without a
+    ``flush()`` first.
+    """
+    suffix = f".s{seed}@seed.example.org"
+    if BloodBank.objects.filter(email__endswith=suffix).exists() or \
+            Donor.objects.filter(email__endswith=suffix).exists():
+        raise ValueError(f"Seed {seed} is already loaded; flush first or pick another seed")
+
+    seeder = Seeder(seed=seed, history_days=history_days, batch_size=batch_size, stdout=stdout)
+    with transaction.atomic():
+        bank_ids = seeder.banks(banks)
+        donor_rows = seeder.donors(donors)
+        stock = seeder.donations(donations, donor_rows, bank_ids) if donor_rows else Counter()
+        seeder.requests(requests, bank_ids, stock)
+        seeder.inventory(stock)
+
+    # Fresh planner statistics, also used for the estimated donor count
+    if connection.vendor in ('sqlite', 'postgresql'):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    from .alerts import evaluate_stock_alerts
+    from .availability import availability_matrix
+    from .geo import bank_locations
+    from .response_cache import data_changed
+
+    availability_matrix.invalidate()
+    bank_locations.invalidate()
+    data_changed(BloodBank, BloodInventory, Donor, all_banks=True)
+    # The seeded stock bypassed the per-change alert checks
+    evaluate_stock_alerts()
+    return seeder
@@ -0,0 +1,35 @@
+"""
+Session engine for the low-write session mode (SESSION_ENGINE =
+'blood_bank.sessions').
+
+Django's cached_db engine with one change: a session whose data is the
+same as when it was loaded isn't written again, even when it was marked
+modified. Reads come from the cache and fall back to the database; real
+changes are written through to both, so sessions survive a cache restart.
+Unchanged sessions aren't rewritten, so their expiry is only pushed back
+when their data changes.
+"""
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+
+class SessionStore(CachedDBStore):
+    _loaded_state = None
+
+    def _state(self, session):
+        return self.serializer().dumps(session)
+
+    def load(self):
+        session = super().load()
+        self._loaded_state = self._state(session)
+        return session
+
+    def save(self, must_create=False):
+        if (
+            not must_create
+            and self.session_key is not None
+            and self._loaded_state is not None
+            and self._state(self._get_session()) == self._loaded_state
+        ):
+            return
+        super().save(must_create=must_create)
+        self._loaded_state = self._state(self._get_session())
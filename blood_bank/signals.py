@@ -0,0 +1,120 @@
+"""
+Signals of the Blood Bank Management System and the handlers that keep
+in-process caches in step with the database.
+"""
+from django.db import connections, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .alerts import evaluate_stock_alerts, stock_changed, stock_thresholds
+from .availability import availability_matrix
+from .geo import bank_locations
+from .jobs import enqueue
+from .models import BloodBank, BloodInventory, BloodRequest, Donation, Donor, StockThreshold
+from .response_cache import data_changed
+from .search import install_search_index
+from .tasks import rebuild_rollup_days
+
+# Sent by BloodInventory.add_units/remove_units, whose F() updates bypass
+# post_save. Arguments: blood_bank_id, blood_group, units_available,
+# previous_units
+inventory_changed = Signal()
+
+
+@receiver(inventory_changed, sender=BloodInventory)
+def update_availability_on_change(sender, blood_bank_id, blood_group, units_available, **kwargs):
+    transaction.on_commit(
+        lambda: availability_matrix.set_units(blood_bank_id, blood_group, units_available)
+    )
+    data_changed(BloodInventory, bank_ids=[blood_bank_id])
+
+
+@receiver(post_save, sender=BloodInventory)
+def update_availability_on_save(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: availability_matrix.set_units(
+            instance.blood_bank_id, instance.blood_group, instance.units_available
+        )
+    )
+
+
+# Low-stock alerts (see alerts.py), in the transaction of the change
+@receiver(inventory_changed, sender=BloodInventory)
+def check_stock_alert_on_change(sender, blood_bank_id, blood_group, units_available, previous_units=None, **kwargs):
+    stock_changed(blood_bank_id, blood_group, units_available, previous_units)
+
+
+@receiver(post_save, sender=BloodInventory)
+def check_stock_alert_on_save(sender, instance, **kwargs):
+    stock_changed(instance.blood_bank_id, instance.blood_group, instance.units_available)
+
+
+@receiver(post_save, sender=StockThreshold)
+@receiver(post_delete, sender=StockThreshold)
+def reevaluate_stock_alerts(sender, instance, **kwargs):
+    bank_ids = None if instance.blood_bank_id is None else [instance.blood_bank_id]
+    transaction.on_commit(stock_thresholds.invalidate)
+    transaction.on_commit(
+        lambda: evaluate_stock_alerts(bank_ids=bank_ids, blood_groups=[instance.blood_group])
+    )
+
+
+@receiver(post_delete, sender=BloodInventory)
+def update_availability_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: availability_matrix.set_units(instance.blood_bank_id, instance.blood_group, 0)
+    )
+
+
+@receiver(post_delete, sender=BloodBank)
+def update_availability_on_bank_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: availability_matrix.discard_bank(instance.pk))
+
+
+@receiver(post_save, sender=BloodBank)
+@receiver(post_delete, sender=BloodBank)
+def update_bank_locations(sender, **kwargs):
+    transaction.on_commit(bank_locations.invalidate)
+
+
+# Versions of the cached public pages (see response_cache.py)
+@receiver(post_save, sender=BloodBank)
+@receiver(post_delete, sender=BloodBank)
+def bump_bank_versions(sender, instance, **kwargs):
+    data_changed(BloodBank, bank_ids=[instance.pk])
+
+
+@receiver(post_save, sender=BloodInventory)
+@receiver(post_delete, sender=BloodInventory)
+def bump_inventory_versions(sender, instance, **kwargs):
+    data_changed(BloodInventory, bank_ids=[instance.blood_bank_id])
+
+
+@receiver(post_save, sender=Donor)
+@receiver(post_delete, sender=Donor)
+def bump_donor_versions(sender, **kwargs):
+    data_changed(Donor)
+
+
+# Daily rollups (see rollups.py) find new and edited rows themselves; a
+# deleted row's day is rebuilt by the job worker
+@receiver(post_delete, sender=Donation)
+def rebuild_rollups_on_donation_delete(sender, instance, **kwargs):
+    enqueue(rebuild_rollup_days, {'day': timezone.localdate(instance.donation_date).isoformat()})
+
+
+@receiver(post_delete, sender=BloodRequest)
+def rebuild_rollups_on_request_delete(sender, instance, **kwargs):
+    enqueue(rebuild_rollup_days, {'day': timezone.localdate(instance.request_date).isoformat()})
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    # SQLite migrations that rebuild a table drop its FTS triggers
+    if sender.name != 'blood_bank':
+        return
+    connection = connections[using]
+    if ('blood_bank', '0007_search_index') in MigrationRecorder(connection).applied_migrations():
+        install_search_index(connection)
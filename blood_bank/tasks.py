@@ -0,0 +1,88 @@
+"""
+Background jobs run by the ``run_jobs`` worker (see jobs.py).
+
+Emails are batch jobs: every due notice is sent over one connection of the
+configured EMAIL_BACKEND.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from .jobs import job
+from .models import BloodRequest, Donation
+from .rollups import rebuild_dates, update_rollups
+
+REQUEST_NOTICES = {
+    'received': (
+        "Blood request received",
+        "Your request for {units} unit(s) of {group} for {hospital} has been received "
+        "and will be processed as soon as stock is available.",
+    ),
+    'approved': (
+        "Blood request approved",
+        "Your request for {units} unit(s) of {group} for {hospital} has been approved{bank}.",
+    ),
+    'rejected': (
+        "Blood request rejected",
+        "Your request for {units} unit(s) of {group} for {hospital} could not be fulfilled "
+        "and has been rejected.",
+    ),
+}
+
+
+def _send(messages):
+    if messages:
+        get_connection().send_messages(messages)
+
+
+@job(batch=True)
+def send_donation_thanks(payloads):
+    """Thank donors; payloads are ``{'donation_id': ...}``"""
+    donations = Donation.objects.filter(
+        pk__in=[payload['donation_id'] for payload in payloads]
+    ).select_related('donor', 'blood_bank')
+    _send([
+        EmailMessage(
+            "Thank you for your donation",
+            f"Dear {donation.donor.name},\n\nThank you for donating {donation.units_donated} "
+            f"unit(s) of {donation.blood_group} at {donation.blood_bank.name}. You will be "
+            f"eligible to donate again after {settings.MINIMUM_DONATION_INTERVAL_DAYS} days.",
+            to=[donation.donor.email],
+        )
+        for donation in donations
+    ])
+
+
+@job(batch=True)
+def send_request_notices(payloads):
+    """Tell requesters about their requests; payloads are ``{'request_id': ..., 'event': ...}``"""
+    requests = BloodRequest.objects.select_related('blood_bank').in_bulk(
+        {payload['request_id'] for payload in payloads}
+    )
+    messages = []
+    for payload in payloads:
+        request = requests.get(payload['request_id'])
+        if request is None:
+            continue
+        subject, body = REQUEST_NOTICES[payload['event']]
+        body = body.format(
+            units=request.units_required,
+            group=request.blood_group,
+            hospital=request.hospital_name,
+            bank=f" and will be supplied by {request.blood_bank.name}" if request.blood_bank else '',
+        )
+        messages.append(EmailMessage(subject, f"Dear {request.requester_name},\n\n{body}", to=[request.email]))
+    _send(messages)
+
+
+@job(batch=True)
+def refresh_rollups(payloads):
+    """Bring the daily rollups up to date; any number of queued refreshes run once"""
+    update_rollups()
+
+
+@job(batch=True)
+def rebuild_rollup_days(payloads):
+    """Recompute the rollups of days that lost rows; payloads are ``{'day': 'YYYY-MM-DD'}``"""
+    rebuild_dates({date.fromisoformat(payload['day']) for payload in payloads})
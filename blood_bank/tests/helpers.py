@@ -0,0 +1,69 @@
+"""
+Shared fixtures for the blood_bank tests.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache as default_cache
+from django.test import TestCase
+from django.utils import timezone
+
+from blood_bank.alerts import stock_thresholds
+from blood_bank.availability import availability_matrix
+from blood_bank.geo import bank_locations
+from blood_bank.models import BloodBank, BloodInventory, BloodLot, BloodRequest
+
+
+def make_bank(name='Central', **fields):
+    return BloodBank.objects.create(
+        name=name,
+        address=f"1 {name} Road",
+        contact_number='+15550000000',
+        email=f"{name.lower().replace(' ', '')}@example.com",
+        **fields
+    )
+
+
+def add_lot(bank, blood_group, units, expires_in=30):
+    """Stock ``units`` of a group as one lot expiring in ``expires_in`` days"""
+    today = timezone.localdate()
+    lot = BloodLot.objects.create(
+        blood_bank=bank,
+        blood_group=blood_group,
+        units=units,
+        units_remaining=units,
+        collected_at=timezone.now() - timedelta(days=1),
+        expires_on=today + timedelta(days=expires_in),
+    )
+    BloodInventory.add_units(bank, blood_group, units)
+    return lot
+
+
+def make_request(blood_group, units_required, **fields):
+    fields = {
+        'requester_name': 'Ward Sister',
+        'hospital_name': 'General Hospital',
+        'hospital_address': '2 Main Street',
+        'contact_number': '+15550000001',
+        'email': 'ward@example.com',
+        **fields,
+    }
+    return BloodRequest.objects.create(blood_group=blood_group, units_required=units_required, **fields)
+
+
+def units_available(bank, blood_group):
+    return BloodInventory.objects.filter(
+        blood_bank=bank, blood_group=blood_group
+    ).values_list('units_available', flat=True).first()
+
+
+class BloodBankTestCase(TestCase):
+    """Starts every test with empty in-process caches"""
+
+    def setUp(self):
+        super().setUp()
+        # Cached pages and their version stamps outlive the test transaction
+        default_cache.clear()
+        self.addCleanup(default_cache.clear)
+        for cache in (availability_matrix, bank_locations, stock_thresholds):
+            cache.invalidate()
+            self.addCleanup(cache.invalidate)
@@ -0,0 +1,56 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+
+from blood_bank.exceptions import InsufficientBloodUnitsError
+from blood_bank.models import BloodRequest
+
+from .helpers import BloodBankTestCase, add_lot, make_bank, make_request
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+class ApproveSelectedTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        self.url = reverse('admin:blood_bank_bloodrequest_changelist')
+        self.bank = make_bank('Central')
+        add_lot(self.bank, 'O+', 5)
+
+    def approve(self, *requests):
+        return self.client.post(
+            self.url,
+            {'action': 'approve_selected', '_selected_action': [request.pk for request in requests]},
+            follow=True,
+        )
+
+    def messages(self, response):
+        return [(message.level_tag, str(message)) for message in response.context['messages']]
+
+    def test_approves_and_reports_what_was_left_pending(self):
+        filled = make_request('O+', 4)
+        short = make_request('O+', 3)
+
+        response = self.approve(filled, short)
+
+        self.assertEqual(self.messages(response), [
+            ('info', "Approved 1 request(s), allocating 4 unit(s)."),
+            ('warning', "1 request(s) left pending: not enough stock."),
+        ])
+        filled.refresh_from_db()
+        self.assertEqual((filled.status, filled.blood_bank_id), ('approved', self.bank.pk))
+
+    def test_a_conflicting_batch_is_reported_as_an_error(self):
+        request = make_request('O+', 2)
+        conflict = InsufficientBloodUnitsError("Stock changed while allocating; run the batch again")
+
+        with mock.patch('blood_bank.admin.allocate_requests', side_effect=conflict):
+            response = self.approve(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.messages(response), [
+            ('error', "Nothing was approved: Stock changed while allocating; run the batch again"),
+        ])
+        self.assertEqual(BloodRequest.objects.get(pk=request.pk).status, 'pending')
@@ -0,0 +1,84 @@
+from blood_bank.alerts import evaluate_stock_alerts, stock_changed
+from blood_bank.models import BloodInventory, StockAlert, StockThreshold
+
+from .helpers import BloodBankTestCase, add_lot, make_bank
+
+
+class StockAlertTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bank = make_bank()
+        add_lot(self.bank, 'O-', 12)
+        with self.captureOnCommitCallbacks(execute=True):
+            StockThreshold.objects.create(blood_group='O-', low_units=5, clear_units=10)
+
+    def open_alerts(self):
+        return StockAlert.objects.filter(cleared_at__isnull=True)
+
+    def test_opens_when_stock_falls_to_the_low_level(self):
+        BloodInventory.remove_units(self.bank, 'O-', 6)
+        self.assertFalse(self.open_alerts().exists())
+
+        BloodInventory.remove_units(self.bank, 'O-', 1)
+
+        alert = self.open_alerts().get()
+        self.assertEqual((alert.blood_group, alert.low_units, alert.units_at_open), ('O-', 5, 5))
+
+    def test_moves_between_the_levels_change_nothing(self):
+        BloodInventory.remove_units(self.bank, 'O-', 8)
+        BloodInventory.add_units(self.bank, 'O-', 3)
+        BloodInventory.remove_units(self.bank, 'O-', 3)
+        add_lot(self.bank, 'O-', 5)
+
+        self.assertEqual(StockAlert.objects.count(), 1)
+        self.assertEqual(self.open_alerts().get().units_at_open, 4)
+
+    def test_clears_when_stock_is_back_at_the_clear_level(self):
+        BloodInventory.remove_units(self.bank, 'O-', 8)
+        add_lot(self.bank, 'O-', 5)
+        self.assertTrue(self.open_alerts().exists())
+
+        add_lot(self.bank, 'O-', 1)
+
+        alert = StockAlert.objects.get()
+        self.assertIsNotNone(alert.cleared_at)
+        self.assertEqual(alert.units_at_clear, 10)
+
+        # The next crossing opens a new alert
+        BloodInventory.remove_units(self.bank, 'O-', 5)
+        self.assertEqual(StockAlert.objects.count(), 2)
+        self.assertEqual(self.open_alerts().count(), 1)
+
+    def test_bank_levels_override_the_default(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            StockThreshold.objects.create(blood_bank=self.bank, blood_group='O-', low_units=10, clear_units=15)
+
+        # Re-evaluated on save: 12 units are above the new low level
+        self.assertFalse(self.open_alerts().exists())
+        BloodInventory.remove_units(self.bank, 'O-', 2)
+        self.assertEqual(self.open_alerts().get().low_units, 10)
+
+    def test_no_threshold_no_alert(self):
+        add_lot(self.bank, 'A+', 1)
+        BloodInventory.remove_units(self.bank, 'A+', 1)
+        self.assertFalse(StockAlert.objects.exists())
+
+    def test_repeated_crossings_keep_one_open_alert(self):
+        stock_changed(self.bank.pk, 'O-', 3, previous_units=6)
+        stock_changed(self.bank.pk, 'O-', 2, previous_units=6)
+        self.assertEqual(self.open_alerts().count(), 1)
+
+    def test_evaluate_compares_stored_stock_with_open_alerts(self):
+        empty = make_bank('Empty')
+        BloodInventory.objects.filter(blood_bank=self.bank).update(units_available=3)
+
+        self.assertEqual(evaluate_stock_alerts(), (2, 0))
+        self.assertEqual(
+            set(self.open_alerts().values_list('blood_bank_id', 'units_at_open')),
+            {(self.bank.pk, 3), (empty.pk, 0)}
+        )
+        self.assertEqual(evaluate_stock_alerts(), (0, 0))
+
+        BloodInventory.objects.filter(blood_bank=self.bank).update(units_available=11)
+        self.assertEqual(evaluate_stock_alerts(bank_ids=[self.bank.pk]), (0, 1))
+        self.assertEqual(list(self.open_alerts().values_list('blood_bank_id', flat=True)), [empty.pk])
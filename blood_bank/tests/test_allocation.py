@@ -0,0 +1,194 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from blood_bank.allocation import NEAREST_BANKS, Allocator, allocate_requests, plan_allocation
+from blood_bank.geo import bank_locations
+from blood_bank.exceptions import InsufficientBloodUnitsError
+from blood_bank.models import BloodInventory, BloodLot, BloodRequest, BloodRequestAllocation, Job
+
+from .helpers import BloodBankTestCase, add_lot, make_bank, make_request, units_available
+
+
+class AllocatorTests(SimpleTestCase):
+    def test_a_bank_that_can_cover_the_request_supplies_it_alone(self):
+        plan = Allocator({'A+': {1: 3, 2: 9}}).plan('A+', 5)
+
+        self.assertTrue(plan.is_complete)
+        self.assertEqual(plan.lines, [(2, 'A+', 5)])
+        self.assertEqual(plan.primary_bank_id, 2)
+
+    def test_split_across_banks_and_groups(self):
+        stock = {'A+': {1: 2, 2: 3}, 'O+': {3: 1}, 'A-': {1: 4}, 'O-': {4: 10}}
+
+        plan = Allocator(stock).plan('A+', 9)
+
+        self.assertTrue(plan.is_complete)
+        self.assertEqual(plan.lines, [(2, 'A+', 3), (1, 'A+', 2), (3, 'O+', 1), (1, 'A-', 3)])
+        self.assertEqual(plan.primary_bank_id, 2)
+        self.assertEqual(plan.units_allocated, 9)
+
+    def test_incompatible_stock_is_never_used(self):
+        plan = Allocator({'B+': {1: 10}, 'AB-': {2: 10}, 'A+': {3: 10}}).plan('A-', 2)
+
+        self.assertFalse(plan.is_complete)
+        self.assertEqual(plan.lines, [])
+
+    def test_short_plan_is_incomplete(self):
+        plan = Allocator({'B-': {1: 2}, 'O-': {2: 1}}).plan('B-', 5)
+
+        self.assertFalse(plan.is_complete)
+        self.assertEqual(plan.shortfall, 2)
+        self.assertEqual(plan.lines, [(1, 'B-', 2), (2, 'O-', 1)])
+
+    def test_planning_leaves_the_stock_alone_until_commit(self):
+        allocator = Allocator({'O+': {1: 4}})
+        plan = allocator.plan('O+', 3)
+        self.assertEqual(allocator.stock, {'O+': {1: 4}})
+
+        allocator.commit(plan)
+
+        self.assertEqual(allocator.stock, {'O+': {1: 1}})
+        self.assertFalse(allocator.plan('O+', 2).is_complete)
+
+
+class AllocateRequestsTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.north = make_bank('North')
+        self.south = make_bank('South')
+        add_lot(self.north, 'A+', 4)
+        add_lot(self.south, 'A+', 6)
+
+    def test_approves_what_the_stock_covers(self):
+        urgent = make_request('A+', 5, priority=2)
+        routine = make_request('A+', 4)
+        too_large = make_request('A+', 3)
+
+        report = allocate_requests()
+
+        self.assertEqual(report.approved, [urgent.pk, routine.pk])
+        self.assertEqual(report.left_pending, 1)
+        urgent.refresh_from_db()
+        self.assertEqual((urgent.status, urgent.blood_bank_id), ('approved', self.south.pk))
+        too_large.refresh_from_db()
+        self.assertEqual(too_large.status, 'pending')
+        self.assertEqual(units_available(self.north, 'A+'), 0)
+        self.assertEqual(units_available(self.south, 'A+'), 1)
+        self.assertEqual(
+            sum(BloodLot.objects.filter(blood_group='A+').values_list('units_remaining', flat=True)), 1
+        )
+        self.assertEqual(Job.objects.filter(name='send_request_notices').count(), 2)
+
+    def test_keeps_an_assigned_bank_that_can_fill_the_request(self):
+        request = make_request('A+', 3, blood_bank=self.north)
+
+        allocate_requests()
+
+        request.refresh_from_db()
+        self.assertEqual((request.status, request.blood_bank_id), ('approved', self.north.pk))
+        self.assertEqual(units_available(self.north, 'A+'), 1)
+        self.assertEqual(units_available(self.south, 'A+'), 6)
+
+    def test_replaces_an_assigned_bank_that_cannot_fill_the_request(self):
+        request = make_request('A+', 5, blood_bank=self.north)
+
+        allocate_requests()
+
+        request.refresh_from_db()
+        self.assertEqual((request.status, request.blood_bank_id), ('approved', self.south.pk))
+        self.assertEqual(units_available(self.north, 'A+'), 4)
+
+    def test_dry_run_writes_nothing(self):
+        make_request('A+', 5)
+
+        report = allocate_requests(dry_run=True)
+
+        self.assertEqual(report.units_allocated, 5)
+        self.assertFalse(BloodRequest.objects.exclude(status='pending').exists())
+        self.assertEqual(units_available(self.south, 'A+'), 6)
+
+    def _plan_then(self, change):
+        """Patch Allocator.plan so ``change`` happens while the batch is being planned"""
+        plan = Allocator.plan
+
+        def planning(allocator, *args, **kwargs):
+            if not planning.changed:
+                planning.changed = True
+                change()
+            return plan(allocator, *args, **kwargs)
+
+        planning.changed = False
+        return mock.patch.object(Allocator, 'plan', planning)
+
+    def assertNothingAllocated(self, *requests):
+        for request in requests:
+            request.refresh_from_db()
+            self.assertIsNone(request.blood_bank_id)
+        self.assertFalse(BloodRequestAllocation.objects.exists())
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(
+            sum(BloodLot.objects.filter(blood_group='A+').values_list('units_remaining', flat=True)), 10
+        )
+
+    def test_stock_taken_meanwhile_rolls_the_batch_back(self):
+        first = make_request('A+', 6)
+        second = make_request('A+', 4)
+
+        def take_stock():
+            BloodInventory.objects.filter(blood_bank=self.south, blood_group='A+').update(units_available=2)
+
+        with self._plan_then(take_stock), self.assertRaises(InsufficientBloodUnitsError):
+            allocate_requests()
+
+        self.assertNothingAllocated(first, second)
+        self.assertEqual(units_available(self.south, 'A+'), 2)
+        self.assertEqual(units_available(self.north, 'A+'), 4)
+        self.assertEqual(BloodRequest.objects.filter(status='pending').count(), 2)
+
+    def test_request_decided_meanwhile_rolls_the_batch_back(self):
+        first = make_request('A+', 6)
+        second = make_request('A+', 4)
+
+        def reject():
+            BloodRequest.objects.filter(pk=second.pk).update(status='rejected')
+
+        with self._plan_then(reject), self.assertRaisesMessage(
+            InsufficientBloodUnitsError, "Requests changed while allocating"
+        ):
+            allocate_requests()
+
+        self.assertNothingAllocated(first, second)
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'pending')
+        self.assertEqual(units_available(self.south, 'A+'), 6)
+        self.assertEqual(units_available(self.north, 'A+'), 4)
+
+
+class PlanAllocationTests(BloodBankTestCase):
+    def test_nearest_banks_first_then_largest_stock(self):
+        # One unit at each of the nearest banks; the farthest bank holds more
+        banks = [
+            make_bank(f"Bank {i}", latitude=10 + i * 0.05, longitude=20.0)
+            for i in range(NEAREST_BANKS + 2)
+        ]
+        stock = {'O-': {bank.pk: 1 for bank in banks}}
+        stock['O-'][banks[-1].pk] = 5
+        bank_locations.invalidate()
+
+        plan = plan_allocation('O-', NEAREST_BANKS + 1, stock=stock, near=(10.0, 20.0))
+
+        self.assertTrue(plan.is_complete)
+        used = [line.blood_bank_id for line in plan.lines]
+        self.assertEqual(used[:NEAREST_BANKS], [bank.pk for bank in banks[:NEAREST_BANKS]])
+        # The 21st nearest bank is past the cap; the largest stock is used instead
+        self.assertEqual(used[NEAREST_BANKS:], [banks[-1].pk])
+
+    def test_banks_without_compatible_stock_are_skipped(self):
+        near, far = make_bank('Near', latitude=0.0, longitude=0.0), make_bank('Far', latitude=1.0, longitude=1.0)
+        stock = {'B+': {near.pk: 9}, 'O-': {far.pk: 2}}
+        bank_locations.invalidate()
+
+        plan = plan_allocation('A-', 2, stock=stock, near=(0.0, 0.0))
+
+        self.assertEqual(plan.lines, [(far.pk, 'O-', 2)])
@@ -0,0 +1,136 @@
+from django.test import SimpleTestCase, override_settings
+
+from blood_bank.availability import AvailabilityMatrix, availability_matrix
+from blood_bank.models import BloodInventory
+
+from .helpers import BloodBankTestCase, add_lot, make_bank
+
+
+class AvailabilityMatrixTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.north = make_bank('North')
+        self.south = make_bank('South')
+        add_lot(self.north, 'A+', 3)
+        add_lot(self.south, 'A+', 8)
+
+    def test_cold_matrix_loads_with_one_query_then_answers_from_memory(self):
+        with self.assertNumQueries(1):
+            found = BloodInventory.find_available_stock('A+', 2)
+        self.assertEqual(found, [(self.south.pk, 8), (self.north.pk, 3)])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(BloodInventory.find_available_stock('A+', 4), [(self.south.pk, 8)])
+            self.assertEqual(availability_matrix.get_units(self.north.pk, 'O-'), 0)
+
+    def test_committed_changes_patch_the_matrix(self):
+        availability_matrix.snapshot()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BloodInventory.add_units(self.north, 'O-', 2)
+            BloodInventory.remove_units(self.south, 'A+', 5)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(availability_matrix.get_group('O-'), {self.north.pk: 2})
+            self.assertEqual(availability_matrix.get_units(self.south.pk, 'A+'), 3)
+
+    def test_deleted_rows_and_banks_leave_the_matrix(self):
+        availability_matrix.snapshot()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BloodInventory.objects.get(blood_bank=self.north, blood_group='A+').delete()
+        self.assertEqual(availability_matrix.get_group('A+'), {self.south.pk: 8})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.south.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(availability_matrix.get_group('A+'), {})
+
+    def test_uncommitted_changes_are_not_applied(self):
+        availability_matrix.snapshot()
+
+        with self.captureOnCommitCallbacks(execute=False):
+            BloodInventory.add_units(self.north, 'A+', 10)
+
+        self.assertEqual(availability_matrix.get_units(self.north.pk, 'A+'), 3)
+
+    def test_invalidate_reloads_from_the_database(self):
+        availability_matrix.snapshot()
+        # Not seen by the signal handlers, as with a change from another process
+        BloodInventory.objects.filter(blood_bank=self.north).update(units_available=7)
+        self.assertEqual(availability_matrix.get_units(self.north.pk, 'A+'), 3)
+
+        availability_matrix.invalidate()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(availability_matrix.get_units(self.north.pk, 'A+'), 7)
+
+    def test_expired_matrix_reloads(self):
+        matrix = AvailabilityMatrix(ttl=0)
+
+        with self.assertNumQueries(2):
+            matrix.get_units(self.north.pk, 'A+')
+            matrix.get_units(self.north.pk, 'A+')
+
+    @override_settings(BLOOD_AVAILABILITY_CACHE_TTL=60)
+    def test_ttl_from_settings(self):
+        self.assertEqual(AvailabilityMatrix().ttl, 60)
+        self.assertEqual(AvailabilityMatrix(ttl=5).ttl, 5)
+
+
+class StubMatrix(AvailabilityMatrix):
+    """Reads a fixed table instead of the database; ``during_query`` runs mid-load"""
+
+    def __init__(self, rows):
+        super().__init__(ttl=60)
+        self.rows = rows
+        self.during_query = []
+
+    def _rows(self):
+        rows = list(self.rows)
+        if self.during_query:
+            self.during_query.pop(0)()
+        return rows
+
+
+class OverlappingLoadTests(SimpleTestCase):
+    def test_changes_during_overlapping_loads_are_kept(self):
+        matrix = StubMatrix([(1, 'A+', 4)])
+
+        def second_load():
+            # Starts and finishes while the first load's query is running
+            matrix.set_units(2, 'O-', 3)
+            matrix._load()
+            matrix.set_units(1, 'A+', 9)
+
+        matrix.during_query = [second_load, lambda: matrix.set_units(3, 'B+', 1)]
+
+        matrix._load()
+
+        self.assertEqual(matrix.get_group('A+'), {1: 9})
+        self.assertEqual(matrix.get_group('O-'), {2: 3})
+        self.assertEqual(matrix.get_group('B+'), {3: 1})
+        self.assertIsNone(matrix._pending)
+
+    def test_a_load_started_before_invalidate_is_not_installed(self):
+        matrix = StubMatrix([(1, 'A+', 4)])
+        matrix.during_query = [matrix.invalidate]
+
+        self.assertEqual(matrix._load()['A+'], {1: 4})
+
+        self.assertFalse(matrix.is_warm())
+        matrix.rows = [(1, 'A+', 6)]
+        self.assertEqual(matrix.get_units(1, 'A+'), 6)
+
+    def test_a_failed_load_stops_recording_changes(self):
+        matrix = StubMatrix([])
+
+        def fail():
+            raise RuntimeError('database is locked')
+
+        matrix.during_query = [fail]
+        with self.assertRaises(RuntimeError):
+            matrix._load()
+
+        self.assertIsNone(matrix._pending)
+        self.assertFalse(matrix.is_warm())
@@ -0,0 +1,46 @@
+from django.test import SimpleTestCase
+
+from blood_bank.exceptions import InvalidBloodGroupError
+from blood_bank.models import BloodGroup
+
+# Red cell compatibility, written out by hand: recipient -> donor groups
+CAN_RECEIVE = {
+    'O-': {'O-'},
+    'O+': {'O+', 'O-'},
+    'A-': {'A-', 'O-'},
+    'A+': {'A+', 'A-', 'O+', 'O-'},
+    'B-': {'B-', 'O-'},
+    'B+': {'B+', 'B-', 'O+', 'O-'},
+    'AB-': {'AB-', 'A-', 'B-', 'O-'},
+    'AB+': {'AB+', 'AB-', 'A+', 'A-', 'B+', 'B-', 'O+', 'O-'},
+}
+
+
+class CompatibilityTests(SimpleTestCase):
+    def test_every_recipient_and_donor_pair(self):
+        self.assertEqual(set(CAN_RECEIVE), set(BloodGroup.GROUPS))
+        for recipient in BloodGroup.GROUPS:
+            donors = BloodGroup.compatible_donors(recipient)
+            self.assertEqual(len(donors), len(set(donors)))
+            for i, donor in enumerate(BloodGroup.GROUPS):
+                with self.subTest(recipient=recipient, donor=donor):
+                    allowed = donor in CAN_RECEIVE[recipient]
+                    self.assertEqual(donor in donors, allowed)
+                    self.assertEqual(bool(BloodGroup.DONOR_MASKS[recipient] >> i & 1), allowed)
+
+    def test_own_group_first_and_o_negative_last(self):
+        for recipient in BloodGroup.GROUPS:
+            with self.subTest(recipient=recipient):
+                donors = BloodGroup.compatible_donors(recipient)
+                self.assertEqual(donors[0], recipient)
+                self.assertEqual(donors[-1], 'O-')
+
+    def test_ab_positive_accepts_every_group(self):
+        self.assertEqual(set(BloodGroup.compatible_donors('AB+')), set(BloodGroup.GROUPS))
+
+    def test_o_negative_receives_only_o_negative(self):
+        self.assertEqual(BloodGroup.compatible_donors('O-'), ['O-'])
+
+    def test_unknown_group(self):
+        with self.assertRaises(InvalidBloodGroupError):
+            BloodGroup.compatible_donors('C+')
@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from blood_bank.exceptions import DonationError, InvalidBloodGroupError
+from blood_bank.models import Donation, Donor
+
+from .helpers import BloodBankTestCase, make_bank, units_available
+
+
+def make_donor(name, blood_type, **fields):
+    return Donor.objects.create(
+        name=name, email=f"{name.lower()}@example.com", blood_type=blood_type, **fields
+    )
+
+
+class DonorEligibilityTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.interval = timedelta(days=settings.MINIMUM_DONATION_INTERVAL_DAYS)
+
+    def test_new_donors_are_eligible_at_once(self):
+        donor = make_donor('Ada', 'O-')
+
+        self.assertTrue(donor.can_donate())
+        self.assertEqual(list(Donor.objects.eligible()), [donor])
+
+    def test_eligible_by_group_longest_waiting_first(self):
+        recent = make_donor('Recent', 'A+', next_eligible_date=self.today - timedelta(days=1))
+        waiting = make_donor('Waiting', 'A+', next_eligible_date=self.today - timedelta(days=30))
+        resting = make_donor('Resting', 'A+', next_eligible_date=self.today + timedelta(days=1))
+        universal = make_donor('Universal', 'O-', next_eligible_date=self.today - timedelta(days=5))
+        make_donor('Other', 'B+')
+
+        self.assertEqual(list(Donor.objects.eligible('A+')), [waiting, recent])
+        self.assertEqual(list(Donor.objects.eligible(['A+', 'O-'])), [waiting, universal, recent])
+        self.assertEqual(list(Donor.objects.eligible_for('A-')), [universal])
+        self.assertIn(resting, Donor.objects.eligible('A+', on=self.today + timedelta(days=1)))
+
+        with self.assertRaises(InvalidBloodGroupError):
+            Donor.objects.eligible('C+')
+
+    def test_record_donation_starts_the_interval(self):
+        donor = make_donor('Ada', 'O-')
+
+        donor.record_donation(self.today)
+
+        donor.refresh_from_db()
+        self.assertEqual(donor.last_donation_date, self.today)
+        self.assertEqual(donor.next_eligible_date, self.today + self.interval)
+        self.assertFalse(donor.can_donate())
+        self.assertTrue(donor.can_donate(on=self.today + self.interval))
+        self.assertFalse(Donor.objects.eligible().exists())
+
+    def test_record_donation_refuses_a_donor_not_yet_eligible(self):
+        donor = make_donor('Ada', 'O-', next_eligible_date=self.today - timedelta(days=365))
+        donor.record_donation(self.today - timedelta(days=10))
+        # A stale copy still thinks the donor is eligible
+        stale = Donor.objects.get(pk=donor.pk)
+        stale.next_eligible_date = self.today
+
+        with self.assertRaisesMessage(DonationError, "not eligible"):
+            stale.record_donation(self.today)
+
+        donor.refresh_from_db()
+        self.assertEqual(donor.last_donation_date, self.today - timedelta(days=10))
+
+    def test_refused_donation_adds_no_stock(self):
+        bank = make_bank()
+        donor = make_donor('Ada', 'O-')
+        Donation.objects.create(donor=donor, blood_bank=bank, blood_group='O-', units_donated=1)
+
+        with self.assertRaises(DonationError):
+            Donation.objects.create(donor=donor, blood_bank=bank, blood_group='O-', units_donated=1)
+
+        self.assertEqual(Donation.objects.count(), 1)
+        self.assertEqual(units_available(bank, 'O-'), 1)
+
+    def test_record_donations_keeps_the_latest_date(self):
+        first = make_donor('First', 'A+')
+        second = make_donor('Second', 'B+', next_eligible_date=self.today - timedelta(days=365))
+        second.record_donation(self.today - timedelta(days=5))
+
+        updated = Donor.objects.record_donations({
+            first.pk: self.today - timedelta(days=20),
+            second.pk: self.today - timedelta(days=40),
+        })
+
+        self.assertEqual(updated, 1)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.next_eligible_date, self.today - timedelta(days=20) + self.interval)
+        self.assertEqual(second.last_donation_date, self.today - timedelta(days=5))
@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from blood_bank.models import BloodRequest
+
+from .helpers import BloodBankTestCase, add_lot, make_bank, make_request
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+class ExportTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        self.north = make_bank('North')
+        self.south = make_bank('South')
+        add_lot(self.north, 'A+', 3)
+        add_lot(self.south, 'O-', 2)
+        today = timezone.localdate()
+        self.old = make_request('A+', 1, blood_bank=self.north)
+        self.recent = make_request('A+', 2, blood_bank=self.north)
+        self.other_group = make_request('B-', 3, blood_bank=self.north)
+        self.other_bank = make_request('A+', 4, blood_bank=self.south)
+        BloodRequest.objects.filter(pk=self.old.pk).update(request_date=timezone.now() - timedelta(days=10))
+        self.since = today - timedelta(days=1)
+
+    def export(self, name, **params):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse(f'export_{name}'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_staff_only(self):
+        url = reverse('export_donations')
+        self.assertRedirects(self.client.get(url), f"{reverse('login')}?next={url}", fetch_redirect_response=False)
+
+        self.client.force_login(User.objects.create_user('donor', password='secret'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_requests_csv_with_filters(self):
+        content = self.export(
+            'requests', start=self.since.isoformat(), blood_bank=self.north.pk, blood_group='A+'
+        )
+
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0][:3], ['id', 'request_date', 'requester_name'])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [self.recent.pk])
+
+    def test_end_date_includes_the_whole_day(self):
+        content = self.export('requests', end=timezone.localdate().isoformat(), blood_group='A+')
+
+        ids = [int(row[0]) for row in list(csv.reader(io.StringIO(content)))[1:]]
+        self.assertEqual(ids, [self.old.pk, self.recent.pk, self.other_bank.pk])
+
+    def test_inventory_ndjson(self):
+        content = self.export('inventory', format='ndjson', blood_bank=self.south.pk)
+
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(
+            {key: rows[0][key] for key in ('blood_bank', 'blood_group', 'units_available')},
+            {'blood_bank': 'South', 'blood_group': 'O-', 'units_available': 2},
+        )
+
+    def test_invalid_filters(self):
+        self.client.force_login(self.staff)
+        for params in ({'start': '2024-02-01', 'end': '2024-01-01'}, {'blood_group': 'C+'}, {'format': 'xml'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('export_requests'), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['status'], 'error')
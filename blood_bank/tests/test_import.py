@@ -0,0 +1,110 @@
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from blood_bank.management.commands.import_blood_bank_data import Command
+from blood_bank.models import BloodLot, Donation, Donor, ImportProgress
+
+from .helpers import BloodBankTestCase, make_bank, units_available
+
+
+class ImportDonationsTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bank = make_bank()
+        Donor.objects.create(name='Ada', email='ada@example.com', blood_type='O-')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_csv(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def test_lots_past_their_expiry_are_imported_as_expired(self):
+        old = timezone.now() - timedelta(days=60)
+        recent = timezone.now() - timedelta(days=5)
+        path = self.write_csv('donations.csv', (
+            "donor_email,bank_name,blood_group,units_donated,donation_date\n"
+            f"ada@example.com,Central,O-,3,{old:%Y-%m-%d %H:%M:%S}\n"
+            f"ada@example.com,Central,O-,2,{recent:%Y-%m-%d %H:%M:%S}\n"
+        ))
+
+        call_command('import_blood_bank_data', donations=path, stdout=StringIO(), stderr=StringIO())
+
+        expired = BloodLot.objects.get(units=3)
+        self.assertEqual((expired.units_remaining, expired.units_expired), (0, 3))
+        self.assertIsNotNone(expired.expired_at)
+        fresh = BloodLot.objects.get(units=2)
+        self.assertEqual((fresh.units_remaining, fresh.units_expired), (2, 0))
+        self.assertIsNone(fresh.expired_at)
+        self.assertEqual(units_available(self.bank, 'O-'), 2)
+        self.assertEqual(BloodLot.objects.expire(), {})
+
+    def donations_csv(self, count):
+        return self.write_csv('donations.csv', "donor_email,bank_name,blood_group,units_donated\n" + "".join(
+            f"ada@example.com,Central,O-,{units}\n" for units in range(1, count + 1)
+        ))
+
+    def run_import(self, path, **options):
+        call_command(
+            'import_blood_bank_data', donations=path, chunk_size=2, stdout=StringIO(), stderr=StringIO(), **options
+        )
+
+    def test_progress_is_checkpointed_per_file(self):
+        path = self.donations_csv(5)
+
+        self.run_import(path)
+
+        self.assertEqual(ImportProgress.objects.get(path=os.path.abspath(path)).rows, 5)
+        # Running again imports nothing new
+        self.run_import(path)
+        self.assertEqual(Donation.objects.count(), 5)
+
+    def test_progress_is_committed_with_its_chunk(self):
+        path = self.donations_csv(5)
+        save_progress = Command.save_progress
+
+        def fail_on_second_chunk(command, path, rows):
+            if rows > 2:
+                raise RuntimeError('interrupted')
+            save_progress(command, path, rows)
+
+        with mock.patch.object(Command, 'save_progress', fail_on_second_chunk), \
+                self.assertRaises(RuntimeError):
+            self.run_import(path)
+
+        # The second chunk rolled back together with its checkpoint
+        donated = Donation.objects.order_by('units_donated').values_list('units_donated', flat=True)
+        self.assertEqual(list(donated), [1, 2])
+        self.assertEqual(units_available(self.bank, 'O-'), 3)
+        self.assertEqual(ImportProgress.objects.get().rows, 2)
+
+        self.run_import(path)
+
+        self.assertEqual(Donation.objects.count(), 5)
+        self.assertEqual(units_available(self.bank, 'O-'), 15)
+
+    def test_restart_ignores_saved_progress(self):
+        path = self.donations_csv(2)
+        self.run_import(path)
+
+        self.run_import(path, restart=True)
+
+        self.assertEqual(Donation.objects.count(), 4)
+        self.assertEqual(ImportProgress.objects.get().rows, 2)
+
+    def test_resumes_from_a_progress_file_left_by_earlier_versions(self):
+        path = self.donations_csv(3)
+        with open(f"{path}.progress", 'w') as f:
+            f.write('{"rows": 2}')
+
+        self.run_import(path)
+
+        self.assertEqual(list(Donation.objects.values_list('units_donated', flat=True)), [3])
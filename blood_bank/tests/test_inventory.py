@@ -0,0 +1,74 @@
+from blood_bank.exceptions import BloodRequestError, InsufficientBloodUnitsError
+from blood_bank.models import BloodInventory
+from blood_bank.signals import inventory_changed
+
+from .helpers import BloodBankTestCase, add_lot, make_bank, units_available
+
+
+class AddUnitsTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bank = make_bank()
+
+    def test_creates_the_row_then_increments_it(self):
+        self.assertEqual(BloodInventory.add_units(self.bank, 'A+', 3), 3)
+        self.assertEqual(BloodInventory.add_units(self.bank.pk, 'A+', 4), 7)
+        self.assertEqual(BloodInventory.objects.filter(blood_bank=self.bank, blood_group='A+').count(), 1)
+        self.assertEqual(units_available(self.bank, 'A+'), 7)
+
+    def test_increment_is_applied_by_the_database(self):
+        BloodInventory.add_units(self.bank, 'A+', 3)
+        stale = BloodInventory.objects.get(blood_bank=self.bank, blood_group='A+')
+        # Another process adds units after this one read the row
+        BloodInventory.objects.filter(pk=stale.pk).update(units_available=10)
+
+        self.assertEqual(BloodInventory.add_units(self.bank, 'A+', 2), 12)
+
+    def test_sends_the_levels_before_and_after(self):
+        BloodInventory.add_units(self.bank, 'A+', 3)
+        sent = []
+
+        def receiver(**kwargs):
+            sent.append((kwargs['units_available'], kwargs['previous_units']))
+
+        inventory_changed.connect(receiver, sender=BloodInventory)
+        self.addCleanup(inventory_changed.disconnect, receiver, sender=BloodInventory)
+        BloodInventory.add_units(self.bank, 'A+', 2)
+
+        self.assertEqual(sent, [(5, 3)])
+
+
+class RemoveUnitsTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bank = make_bank()
+        add_lot(self.bank, 'B-', 5)
+
+    def test_decrements_and_returns_the_new_level(self):
+        self.assertEqual(BloodInventory.remove_units(self.bank, 'B-', 2), 3)
+        self.assertEqual(BloodInventory.remove_units(self.bank.pk, 'B-', 3), 0)
+        self.assertEqual(units_available(self.bank, 'B-'), 0)
+
+    def test_never_goes_negative(self):
+        with self.assertRaisesMessage(InsufficientBloodUnitsError, "Only 5 units available"):
+            BloodInventory.remove_units(self.bank, 'B-', 6)
+        self.assertEqual(units_available(self.bank, 'B-'), 5)
+
+    def test_condition_is_checked_against_the_stored_level(self):
+        # Another approval took units after this one read the row
+        BloodInventory.objects.filter(blood_bank=self.bank, blood_group='B-').update(units_available=1)
+
+        with self.assertRaises(InsufficientBloodUnitsError):
+            BloodInventory.remove_units(self.bank, 'B-', 2)
+        self.assertEqual(units_available(self.bank, 'B-'), 1)
+
+    def test_missing_row(self):
+        with self.assertRaisesMessage(BloodRequestError, "No inventory found for blood group O+"):
+            BloodInventory.remove_units(self.bank, 'O+', 1)
+
+    def test_lots_short_of_the_counter_roll_the_decrement_back(self):
+        BloodInventory.objects.filter(blood_bank=self.bank, blood_group='B-').update(units_available=8)
+
+        with self.assertRaises(InsufficientBloodUnitsError):
+            BloodInventory.remove_units(self.bank, 'B-', 7)
+        self.assertEqual(units_available(self.bank, 'B-'), 8)
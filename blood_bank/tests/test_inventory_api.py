@@ -0,0 +1,80 @@
+from django.test import override_settings
+from django.urls import reverse
+
+from blood_bank.models import BloodGroup, BloodInventory
+
+from .helpers import BloodBankTestCase, add_lot, make_bank
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+class InventoryApiTests(BloodBankTestCase):
+    url = reverse('inventory_api')
+
+    def setUp(self):
+        super().setUp()
+        self.north = make_bank('North')
+        self.south = make_bank('South')
+        self.empty = make_bank('Empty')
+        add_lot(self.north, 'A+', 3)
+        add_lot(self.north, 'O-', 1)
+        add_lot(self.south, 'B+', 5)
+
+    def inventory(self, units=()):
+        return {**dict.fromkeys(BloodGroup.GROUPS, 0), **dict(units)}
+
+    def test_units_per_bank_and_group(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'])
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(response.json(), {'banks': [
+            {'id': self.north.pk, 'name': 'North', 'inventory': self.inventory({'A+': 3, 'O-': 1}), 'total': 4},
+            {'id': self.south.pk, 'name': 'South', 'inventory': self.inventory({'B+': 5}), 'total': 5},
+        ]})
+
+    def test_unchanged_poll_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+
+        # Only the aggregate that fingerprints the rows
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_changed_stock_gets_a_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        BloodInventory.add_units(self.south, 'B+', 1)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['banks'][1]['total'], 6)
+
+    def test_many_banks_in_one_request(self):
+        response = self.client.get(self.url, {'bank': [self.south.pk, self.empty.pk]})
+
+        self.assertEqual([bank['id'] for bank in response.json()['banks']], [self.south.pk])
+        self.assertEqual(self.client.get(self.url, {'bank': 'north'}).status_code, 400)
+
+    def test_one_bank(self):
+        response = self.client.get(reverse('bank_inventory_api', args=[self.north.pk]))
+        self.assertEqual(response.json()['inventory'], self.inventory({'A+': 3, 'O-': 1}))
+
+        etag = response['ETag']
+        response = self.client.get(reverse('bank_inventory_api', args=[self.north.pk]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_bank_without_stock_or_missing(self):
+        response = self.client.get(reverse('bank_inventory_api', args=[self.empty.pk]))
+        self.assertEqual(response.json(), {
+            'id': self.empty.pk, 'name': 'Empty', 'inventory': self.inventory(), 'total': 0,
+        })
+
+        self.assertEqual(self.client.get(reverse('bank_inventory_api', args=[10 ** 6])).status_code, 404)
+
+    def test_read_only(self):
+        self.assertEqual(self.client.post(self.url).status_code, 405)
@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from blood_bank.jobs import Worker, enqueue, enqueue_many, job
+from blood_bank.models import Job
+
+from .helpers import BloodBankTestCase
+
+calls = []
+
+
+@job(name='tests.record')
+def record(**payload):
+    calls.append(payload)
+
+
+@job(name='tests.record_batch', batch=True)
+def record_batch(payloads):
+    calls.append(payloads)
+
+
+@job(name='tests.fail', max_attempts=3, retry_delay=10)
+def fail(**payload):
+    raise RuntimeError("boom")
+
+
+class WorkerTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        calls.clear()
+        self.worker = Worker(threads=1, batch_size=10)
+
+    def run_due(self):
+        """Claim and run the due jobs in this thread, as run() does on its pool"""
+        claimed = self.worker.claim()
+        for spec, jobs in self.worker.units(claimed):
+            self.worker.execute(spec, jobs)
+        return claimed
+
+    def test_claim_takes_due_jobs_once(self):
+        due = enqueue(record, {'n': 1})
+        later = enqueue(record, {'n': 2}, delay=timedelta(minutes=5))
+
+        claimed = self.worker.claim()
+
+        self.assertEqual([j.pk for j in claimed], [due.pk])
+        due.refresh_from_db()
+        self.assertEqual((due.status, due.attempts), ('running', 1))
+        self.assertTrue(due.claimed_by)
+        self.assertEqual(Worker().claim(), [])
+        later.refresh_from_db()
+        self.assertEqual(later.status, 'queued')
+
+    def test_claim_respects_the_batch_size(self):
+        enqueue_many(record, [{'n': n} for n in range(15)])
+
+        self.assertEqual(len(self.worker.claim()), 10)
+        self.assertEqual(len(self.worker.claim()), 5)
+        self.assertEqual(self.worker.claim(), [])
+
+    def test_jobs_of_a_dead_worker_are_claimed_again(self):
+        abandoned = enqueue(record)
+        self.worker.claim()
+        Job.objects.filter(pk=abandoned.pk).update(claimed_at=timezone.now() - timedelta(hours=1))
+
+        claimed = Worker().claim()
+
+        self.assertEqual([j.pk for j in claimed], [abandoned.pk])
+        self.assertEqual(claimed[0].attempts, 2)
+
+    def test_runs_jobs_and_marks_them_done(self):
+        done = enqueue(record, {'n': 1})
+
+        self.run_due()
+
+        self.assertEqual(calls, [{'n': 1}])
+        done.refresh_from_db()
+        self.assertEqual(done.status, 'done')
+        self.assertIsNotNone(done.finished_at)
+        self.assertEqual(self.worker.done, 1)
+
+    def test_batch_jobs_run_once_with_every_payload(self):
+        enqueue_many(record_batch, [{'n': 1}, {'n': 2}, {'n': 3}])
+
+        self.run_due()
+
+        self.assertEqual(calls, [[{'n': 1}, {'n': 2}, {'n': 3}]])
+        self.assertEqual(Job.objects.filter(status='done').count(), 3)
+
+    def test_failed_jobs_are_retried_with_backoff_then_left_failed(self):
+        failing = enqueue(fail)
+        delays = []
+        for attempt in range(1, 4):
+            Job.objects.filter(pk=failing.pk).update(run_at=timezone.now())
+            before = timezone.now()
+            with self.assertLogs('blood_bank.jobs', 'ERROR'):
+                self.run_due()
+            failing.refresh_from_db()
+            self.assertEqual(failing.attempts, attempt)
+            self.assertIn("RuntimeError: boom", failing.last_error)
+            if failing.status == 'queued':
+                delays.append(round((failing.run_at - before).total_seconds()))
+
+        self.assertEqual(delays, [10, 20])
+        self.assertEqual(failing.status, 'failed')
+        self.assertEqual(self.worker.failed, 1)
+        self.assertEqual(self.run_due(), [])
+
+    def test_unknown_jobs_fail_at_once(self):
+        unknown = enqueue('tests.missing')
+
+        self.run_due()
+
+        unknown.refresh_from_db()
+        self.assertEqual(unknown.status, 'failed')
+        self.assertEqual(unknown.last_error, "Unknown job 'tests.missing'")
+
+    def test_release_returns_unstarted_jobs_to_the_queue(self):
+        queued = enqueue(record)
+        claimed = self.worker.claim()
+
+        self.worker.release(claimed)
+
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts, queued.claimed_by), ('queued', 0, ''))
@@ -0,0 +1,99 @@
+from blood_bank.allocation import allocate_requests
+from blood_bank.exceptions import InsufficientBloodUnitsError
+from blood_bank.models import BloodInventory, BloodLot
+
+from .helpers import BloodBankTestCase, add_lot, make_bank, make_request, units_available
+
+
+class FifoConsumptionTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bank = make_bank()
+
+    def test_soonest_expiry_is_taken_first(self):
+        later = add_lot(self.bank, 'A+', 4, expires_in=20)
+        sooner = add_lot(self.bank, 'A+', 3, expires_in=5)
+
+        BloodInventory.remove_units(self.bank, 'A+', 5)
+
+        sooner.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual(sooner.units_remaining, 0)
+        self.assertEqual(later.units_remaining, 2)
+        self.assertEqual(units_available(self.bank, 'A+'), 2)
+
+    def test_lots_short_of_the_counter_raise(self):
+        add_lot(self.bank, 'A+', 2)
+        with self.assertRaises(InsufficientBloodUnitsError):
+            BloodLot.objects.consume_fifo({(self.bank.pk, 'A+'): 3})
+
+
+class ExpiryTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bank = make_bank()
+
+    def test_expire_retires_lots_and_decrements_counters(self):
+        expired = add_lot(self.bank, 'O-', 4, expires_in=-1)
+        fresh = add_lot(self.bank, 'O-', 3)
+        add_lot(self.bank, 'B+', 2, expires_in=-3)
+
+        swept = BloodLot.objects.expire()
+
+        self.assertEqual(swept, {(self.bank.pk, 'O-'): 4, (self.bank.pk, 'B+'): 2})
+        expired.refresh_from_db()
+        self.assertEqual((expired.units_remaining, expired.units_expired), (0, 4))
+        self.assertIsNotNone(expired.expired_at)
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.units_remaining, 3)
+        self.assertEqual(units_available(self.bank, 'O-'), 3)
+        self.assertEqual(units_available(self.bank, 'B+'), 0)
+        self.assertEqual(BloodLot.objects.expire(), {})
+
+    def test_lot_expiring_today_is_still_usable(self):
+        lot = add_lot(self.bank, 'O-', 2, expires_in=0)
+        self.assertEqual(BloodLot.objects.expire(), {})
+        BloodLot.objects.consume_fifo({(self.bank.pk, 'O-'): 2})
+        lot.refresh_from_db()
+        self.assertEqual(lot.units_remaining, 0)
+        self.assertEqual(lot.units_expired, 0)
+
+    def test_consume_fifo_never_takes_an_expired_lot(self):
+        expired = add_lot(self.bank, 'O-', 5, expires_in=-1)
+
+        with self.assertRaises(InsufficientBloodUnitsError):
+            BloodLot.objects.consume_fifo({(self.bank.pk, 'O-'): 1})
+
+        expired.refresh_from_db()
+        self.assertEqual(expired.units_remaining, 5)
+
+    def test_remove_units_skips_expired_lots_before_the_sweep(self):
+        expired = add_lot(self.bank, 'O-', 5, expires_in=-1)
+        fresh = add_lot(self.bank, 'O-', 5, expires_in=10)
+
+        BloodInventory.remove_units(self.bank, 'O-', 3)
+
+        expired.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((expired.units_remaining, expired.units_expired), (0, 5))
+        self.assertEqual(fresh.units_remaining, 2)
+        self.assertEqual(units_available(self.bank, 'O-'), 2)
+        with self.assertRaises(InsufficientBloodUnitsError):
+            BloodInventory.remove_units(self.bank, 'O-', 3)
+
+    def test_batch_allocation_skips_expired_lots_before_the_sweep(self):
+        expired = add_lot(self.bank, 'AB+', 6, expires_in=-2)
+        fresh = add_lot(self.bank, 'AB+', 2)
+        too_large = make_request('AB+', 4)
+        fits = make_request('AB+', 2)
+
+        report = allocate_requests()
+
+        self.assertEqual(report.approved, [fits.pk])
+        too_large.refresh_from_db()
+        self.assertEqual(too_large.status, 'pending')
+        expired.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((expired.units_remaining, expired.units_expired), (0, 6))
+        self.assertEqual(fresh.units_remaining, 0)
+        self.assertEqual(units_available(self.bank, 'AB+'), 0)
@@ -0,0 +1,91 @@
+import json
+
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from blood_bank.middleware import QueryRecorder, RequestInstrumentationMiddleware
+from blood_bank.models import BloodBank, BloodInventory
+
+from .helpers import BloodBankTestCase, add_lot, make_bank
+
+
+class RequestInstrumentationTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.banks = [make_bank(f"Bank {i}") for i in range(6)]
+
+    def run_view(self, view):
+        middleware = RequestInstrumentationMiddleware(view)
+        with self.assertLogs('blood_bank.instrumentation') as logs:
+            response = middleware(RequestFactory().get('/banks/'))
+        self.assertEqual(len(logs.records), 1)
+        return response, logs.records[0], json.loads(logs.records[0].getMessage())
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0)
+    def test_sampled_request_is_timed_and_logged(self):
+        def view(request):
+            names = list(BloodBank.objects.values_list('name', flat=True))
+            BloodInventory.add_units(self.banks[0], 'A+', 1)
+            return HttpResponse(', '.join(names))
+
+        response, record, logged = self.run_view(view)
+
+        metrics = [part.split(';')[0] for part in response['Server-Timing'].split(', ')]
+        self.assertEqual(metrics, ['db', 'total'])
+        self.assertIn('desc="', response['Server-Timing'])
+        self.assertEqual(record.levelname, 'INFO')
+        self.assertEqual((logged['method'], logged['path'], logged['status']), ('GET', '/banks/', 200))
+        self.assertGreaterEqual(logged['queries'], 2)
+        self.assertGreaterEqual(logged['writes'], 1)
+        self.assertEqual(logged['n_plus_one'], [])
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0, INSTRUMENTATION_N_PLUS_ONE_THRESHOLD=5)
+    def test_repeated_queries_are_flagged(self):
+        def view(request):
+            for bank in self.banks:
+                BloodBank.objects.get(pk=bank.pk)
+            return HttpResponse()
+
+        _, record, logged = self.run_view(view)
+
+        self.assertEqual(record.levelname, 'WARNING')
+        self.assertEqual(len(logged['n_plus_one']), 1)
+        self.assertEqual(logged['n_plus_one'][0]['count'], len(self.banks))
+        self.assertIn('blood_bank_bloodbank', logged['n_plus_one'][0]['sql'])
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0)
+    def test_template_responses_report_render_time(self):
+        add_lot(self.banks[0], 'A+', 2)
+
+        with self.assertLogs('blood_bank.instrumentation') as logs:
+            response = self.client.get(reverse('blood_bank_list'))
+
+        self.assertIn('render;dur=', response['Server-Timing'])
+        self.assertIn('render_ms', json.loads(logs.records[0].getMessage()))
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0)
+    async def test_async_requests_are_timed_as_a_whole(self):
+        with self.assertLogs('blood_bank.instrumentation'):
+            response = await self.async_client.get(reverse('availability_api_async'), {'group': 'A+'})
+
+        self.assertTrue(response['Server-Timing'].startswith('total;dur='))
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_left_alone(self):
+        with self.assertNoLogs('blood_bank.instrumentation'):
+            response = self.client.get(reverse('blood_bank_list'))
+
+        self.assertNotIn('Server-Timing', response)
+
+    def test_in_lists_of_any_length_share_a_shape(self):
+        recorder = QueryRecorder()
+
+        def execute(sql, params, many, context):
+            return None
+
+        for params in ([1, 2], [1, 2, 3, 4]):
+            sql = f"SELECT * FROM t WHERE id IN ({', '.join(['%s'] * len(params))})"
+            recorder(execute, sql, params, False, {})
+
+        self.assertEqual(recorder.repeated(2), [('SELECT * FROM t WHERE id IN (...)', 2)])
@@ -0,0 +1,94 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from blood_bank.models import BloodRequest
+from blood_bank.pagination import decode_cursor, encode_cursor
+from blood_bank.views import BloodRequestListView, DonorListView
+
+from .helpers import BloodBankTestCase, make_request
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+@mock.patch.object(BloodRequestListView, 'paginate_by', 3)
+class KeysetPaginationTests(BloodBankTestCase):
+    url = reverse('blood_request_list')
+
+    def setUp(self):
+        super().setUp()
+        # Rows sharing a request_date are ordered by id
+        now = timezone.now()
+        for days_ago in (2, 2, 2, 1, 1, 1, 0, 0):
+            request = make_request('A+', 1)
+            BloodRequest.objects.filter(pk=request.pk).update(request_date=now - timedelta(days=days_ago))
+        self.newest_first = list(
+            BloodRequest.objects.order_by('-request_date', '-id').values_list('pk', flat=True)
+        )
+
+    def page(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['page_obj']
+
+    def test_forward_then_back_without_gaps_or_repeats(self):
+        pages = [self.page()]
+        while pages[-1].has_next:
+            pages.append(self.page(after=pages[-1].next_cursor))
+
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertEqual([request.pk for page in pages for request in page], self.newest_first)
+        self.assertFalse(pages[0].has_previous)
+
+        back = [pages[-1]]
+        while back[-1].has_previous:
+            back.append(self.page(before=back[-1].previous_cursor))
+
+        self.assertEqual(
+            [[request.pk for request in page] for page in back],
+            [[request.pk for request in page] for page in reversed(pages)],
+        )
+        self.assertTrue(all(page.has_next for page in back[1:]))
+
+    def test_deep_pages_cost_the_same_as_the_first(self):
+        cursor = self.page(after=self.page().next_cursor).next_cursor
+        # The page itself; no COUNT(*) and no OFFSET
+        with self.assertNumQueries(1) as queries:
+            self.client.get(self.url, {'after': cursor})
+        sql = queries.captured_queries[0]['sql']
+        self.assertNotIn('OFFSET', sql)
+        self.assertNotIn('COUNT', sql)
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ('not-a-cursor', encode_cursor(['2024-01-01'])):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(self.url, {'after': cursor}).status_code, 404)
+
+    def test_cursor_round_trip(self):
+        request = BloodRequest.objects.get(pk=self.newest_first[4])
+        fields = [BloodRequest._meta.get_field(name) for name in ('request_date', 'id')]
+
+        self.assertEqual(
+            decode_cursor(encode_cursor([request.request_date, request.pk]), fields),
+            [request.request_date, request.pk],
+        )
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+class DonorCountTests(BloodBankTestCase):
+    url = reverse('donor_list')
+
+    def test_total_is_estimated(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual((response.context['total_count'], response.context['total_is_estimate']), (0, True))
+
+    @mock.patch.object(DonorListView, 'count_strategy', None)
+    def test_total_can_be_skipped(self):
+        # Just the page of donors
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+
+        self.assertIsNone(response.context['total_count'])
@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.test import override_settings
+from django.urls import reverse
+
+from blood_bank.models import BloodBank, BloodInventory
+from blood_bank.response_cache import data_changed, get_versions, model_scope
+
+from .helpers import BloodBankTestCase, add_lot, make_bank
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=0, RESPONSE_CACHE_TTL=600)
+class VersionedCacheTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.north = make_bank('North')
+        self.south = make_bank('South')
+        add_lot(self.north, 'A+', 3)
+        add_lot(self.south, 'A+', 5)
+
+    def test_pages_are_served_from_the_cache_until_their_data_changes(self):
+        url = reverse('blood_bank_list')
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'North')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BloodInventory.add_units(self.north, 'A+', 4)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertContains(response, '<strong>Units Available:</strong> 7', html=False)
+
+    def test_stamps_are_bumped_on_commit_only(self):
+        scope = model_scope(BloodBank)
+        before = get_versions([scope])
+
+        with self.captureOnCommitCallbacks(execute=False):
+            data_changed(BloodBank)
+        self.assertEqual(get_versions([scope]), before)
+
+        try:
+            with transaction.atomic():
+                data_changed(BloodBank)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(get_versions([scope]), before)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            data_changed(BloodBank)
+        self.assertNotEqual(get_versions([scope]), before)
+
+    def test_bank_pages_follow_their_own_bank(self):
+        north_url = reverse('bank_inventory_api', args=[self.north.pk])
+        self.client.get(north_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BloodInventory.add_units(self.south, 'A+', 1)
+        with self.assertNumQueries(0):
+            self.client.get(north_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            data_changed(all_banks=True)
+        with self.assertNumQueries(2):
+            response = self.client.get(north_url)
+        self.assertEqual(response.json()['total'], 3)
+
+    def test_cached_responses_answer_conditional_gets(self):
+        url = reverse('bank_inventory_api', args=[self.north.pk])
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_query_strings_are_cached_apart(self):
+        url = reverse('bank_inventory_api', args=[self.north.pk])
+        self.client.get(url, {'a': 1})
+
+        with self.assertNumQueries(2):
+            self.client.get(url, {'a': 2})
+
+    @override_settings(RESPONSE_CACHE_TTL=0)
+    def test_disabled_with_a_zero_ttl(self):
+        url = reverse('blood_bank_list')
+        self.client.get(url)
+
+        with self.assertNumQueries(1):
+            self.client.get(url)
@@ -0,0 +1,59 @@
+from blood_bank.jobs import Worker
+from blood_bank.models import DailyRollup, Donation, Donor, Job
+from blood_bank.rollups import update_rollups
+
+from .helpers import BloodBankTestCase, add_lot, make_bank, make_request
+
+
+class RollupTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bank = make_bank()
+        self.donor = Donor.objects.create(name='Ada', email='ada@example.com', blood_type='B+')
+
+    def rollup(self, **filters):
+        return DailyRollup.objects.filter(blood_bank=self.bank, **filters).values(
+            'donations', 'units_donated', 'units_requested', 'requests_pending', 'requests_approved'
+        ).get()
+
+    def run_jobs(self):
+        worker = Worker(threads=1)
+        for spec, jobs in worker.units(worker.claim()):
+            worker.execute(spec, jobs)
+
+    def test_new_and_edited_donations(self):
+        donation = Donation.objects.create(donor=self.donor, blood_bank=self.bank, blood_group='B+', units_donated=2)
+        update_rollups()
+        self.assertEqual(self.rollup()['units_donated'], 2)
+
+        donation.units_donated = 3
+        donation.save()
+        update_rollups()
+
+        self.assertEqual(self.rollup()['units_donated'], 3)
+
+    def test_edited_requests(self):
+        add_lot(self.bank, 'A+', 5)
+        request = make_request('A+', 2, blood_bank=self.bank)
+        update_rollups()
+        self.assertEqual(self.rollup(blood_group='A+')['requests_pending'], 1)
+
+        request.approve_request()
+        update_rollups()
+
+        counts = self.rollup(blood_group='A+')
+        self.assertEqual((counts['requests_pending'], counts['requests_approved']), (0, 1))
+
+    def test_deleted_donations_and_requests(self):
+        donation = Donation.objects.create(donor=self.donor, blood_bank=self.bank, blood_group='B+', units_donated=2)
+        request = make_request('B+', 1, blood_bank=self.bank)
+        update_rollups()
+        self.assertEqual(self.rollup()['donations'], 1)
+        Job.objects.all().delete()
+
+        donation.delete()
+        request.delete()
+
+        self.assertEqual(Job.objects.filter(name='rebuild_rollup_days').count(), 2)
+        self.run_jobs()
+        self.assertFalse(DailyRollup.objects.exists())
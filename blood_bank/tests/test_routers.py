@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import tempfile
+
+from django.db import connections, transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from blood_bank.middleware import ReplicaStickinessMiddleware
+from blood_bank.models import BloodBank, BloodRequest
+from blood_bank.routers import PrimaryReplicaRouter, pinned_to_primary, replica_reads
+
+from .helpers import make_bank, make_request
+
+REPLICA = 'test_replica'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], INSTRUMENTATION_SAMPLE_RATE=0)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Routing against a second SQLite file standing in for a replica.
+
+    The replica starts as a copy of the migrated test database and is then
+    written to directly, so a read shows which database answered it.
+    """
+
+    def setUp(self):
+        super().setUp()
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+
+        primary = connections['default']
+        primary.ensure_connection()
+        copy = sqlite3.connect(path)
+        primary.connection.backup(copy)
+        copy.close()
+
+        connections.settings[REPLICA] = {**connections.settings['default'], 'NAME': path}
+        self.addCleanup(connections.settings.pop, REPLICA)
+        self.addCleanup(delattr, connections._connections, REPLICA)
+        self.addCleanup(lambda: connections[REPLICA].close())
+
+        self.only_on_replica = BloodRequest.objects.using(REPLICA).create(
+            requester_name='Replica Only', blood_group='A+', units_required=1,
+            hospital_name='Replica Hospital', hospital_address='3 Copy Lane',
+            contact_number='+15550000002', email='replica@example.com',
+        )
+
+    def test_reads_outside_replica_reads_use_the_primary(self):
+        self.assertFalse(BloodRequest.objects.exists())
+
+    def test_reads_inside_replica_reads_use_the_replica(self):
+        with replica_reads():
+            self.assertEqual(list(BloodRequest.objects.all()), [self.only_on_replica])
+            self.assertEqual(BloodRequest.objects.all().db, REPLICA)
+
+    def test_writes_use_the_primary(self):
+        with replica_reads():
+            bank = make_bank()
+            BloodRequest.objects.filter(pk=self.only_on_replica.pk).update(status='approved')
+
+        self.assertEqual(bank._state.db, 'default')
+        self.assertTrue(BloodBank.objects.using('default').filter(pk=bank.pk).exists())
+        self.assertFalse(BloodBank.objects.using(REPLICA).exists())
+        self.assertEqual(BloodRequest.objects.using(REPLICA).get().status, 'pending')
+
+    def test_reads_inside_a_transaction_use_the_primary(self):
+        with replica_reads(), transaction.atomic():
+            self.assertFalse(BloodRequest.objects.exists())
+
+    def test_pinned_reads_use_the_primary(self):
+        with replica_reads(), pinned_to_primary():
+            self.assertFalse(BloodRequest.objects.exists())
+
+    def test_other_apps_are_not_routed(self):
+        from django.contrib.auth.models import User
+
+        with replica_reads():
+            self.assertIsNone(PrimaryReplicaRouter().db_for_read(User))
+
+    def test_no_replicas_configured(self):
+        with override_settings(DATABASE_REPLICAS=[]), replica_reads():
+            self.assertFalse(BloodRequest.objects.exists())
+
+    def test_list_view_reads_the_replica(self):
+        response = self.client.get(reverse('blood_request_list'))
+
+        self.assertContains(response, 'Replica Only')
+        self.assertNotIn(ReplicaStickinessMiddleware.cookie_name, response.cookies)
+
+    def test_a_write_pins_the_next_reads_to_the_primary(self):
+        make_request('O+', 2, requester_name='Primary Only')
+
+        # Any unsafe method may have written, whatever its response
+        response = self.client.post(reverse('blood_request_list'))
+        cookie = response.cookies[ReplicaStickinessMiddleware.cookie_name]
+        self.assertEqual(cookie['max-age'], 10)
+
+        response = self.client.get(reverse('blood_request_list'))
+        self.assertContains(response, 'Primary Only')
+        self.assertNotContains(response, 'Replica Only')
+
+    def test_reads_return_to_the_replica_once_the_pin_expires(self):
+        self.client.cookies[ReplicaStickinessMiddleware.cookie_name] = '1'
+
+        response = self.client.get(reverse('blood_request_list'))
+
+        self.assertContains(response, 'Replica Only')
@@ -0,0 +1,75 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.template import Context, Template, TemplateSyntaxError
+from django.test import SimpleTestCase, override_settings
+
+ROWS = Template(
+    '{% load row_cache %}'
+    '{% cachedrows "row" item in items key item.pk item.version %}[{{ item.label }}]{% endcachedrows %}'
+)
+
+
+class Row:
+    def __init__(self, pk, version=1):
+        self.pk = pk
+        self.version = version
+        self.renders = 0
+
+    @property
+    def label(self):
+        self.renders += 1
+        return f"{self.pk}.{self.version}"
+
+
+@override_settings(FRAGMENT_CACHE_TTL=60)
+class CachedRowsTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.items = [Row(1), Row(2), Row(3)]
+
+    def render(self):
+        return ROWS.render(Context({'items': self.items}))
+
+    def renders(self):
+        return [item.renders for item in self.items]
+
+    def test_only_changed_rows_are_rendered_again(self):
+        self.assertEqual(self.render(), '[1.1][2.1][3.1]')
+        self.assertEqual(self.renders(), [1, 1, 1])
+
+        self.assertEqual(self.render(), '[1.1][2.1][3.1]')
+        self.assertEqual(self.renders(), [1, 1, 1])
+
+        self.items[1].version = 2
+        self.items.append(Row(4))
+        self.assertEqual(self.render(), '[1.1][2.2][3.1][4.1]')
+        self.assertEqual(self.renders(), [1, 2, 1, 1])
+
+    def test_one_cache_round_trip_each_way(self):
+        cache = caches['default']
+        with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many, \
+                mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            self.render()
+            self.render()
+
+        self.assertEqual(get_many.call_count, 2)
+        self.assertEqual(set_many.call_count, 1)
+
+    @override_settings(FRAGMENT_CACHE_TTL=0)
+    def test_disabled_with_a_zero_ttl(self):
+        self.render()
+        self.render()
+
+        self.assertEqual(self.renders(), [2, 2, 2])
+
+    def test_empty_list(self):
+        self.items = []
+
+        self.assertEqual(self.render(), '')
+
+    def test_invalid_syntax(self):
+        for tag in ('{% cachedrows "row" item items key item.pk %}', '{% cachedrows "row" item in items %}'):
+            with self.subTest(tag=tag), self.assertRaises(TemplateSyntaxError):
+                Template('{% load row_cache %}' + tag + '{% endcachedrows %}')
@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+
+from blood_bank.models import BloodRequest, Donor
+from blood_bank.search import has_search_index, match_expression, search, search_filter
+
+from .helpers import BloodBankTestCase, make_request
+
+
+def make_donor(name, email=None):
+    return Donor.objects.create(name=name, email=email or f"{name.split()[0].lower()}@example.com")
+
+
+class SearchTests(BloodBankTestCase):
+    def setUp(self):
+        super().setUp()
+        if not has_search_index(Donor, connection.alias):
+            self.skipTest('SQLite without FTS5')
+        self.zoe = make_donor('Zoë Ånderson')
+        self.anna = make_donor('Anna Smith')
+        self.bob = make_donor('Bob Jones', email='anderson.fan@example.com')
+
+    def names(self, query):
+        return [donor.name for donor in search(Donor.objects.all(), query)]
+
+    def test_prefix_terms_ignoring_case_and_accents(self):
+        self.assertEqual(self.names('zoe'), ['Zoë Ånderson'])
+        self.assertEqual(self.names('ANN smi'), ['Anna Smith'])
+        self.assertEqual(self.names('an sm jo'), [])
+        self.assertEqual(self.names('"); DROP TABLE x; --'), [])
+        self.assertEqual(self.names('  !! '), [])
+
+    def test_name_matches_rank_above_email_matches(self):
+        self.assertEqual(self.names('anderson'), ['Zoë Ånderson', 'Bob Jones'])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.zoe.name = 'Zoë Baker'
+        self.zoe.save()
+        Donor.objects.filter(pk=self.anna.pk).update(name='Anne Taylor')
+        self.bob.delete()
+
+        self.assertEqual(self.names('anderson'), [])
+        self.assertEqual(self.names('baker'), ['Zoë Baker'])
+        self.assertEqual(self.names('smith'), [])
+        self.assertEqual(self.names('taylor'), ['Anne Taylor'])
+        self.assertEqual(self.names('jones'), [])
+
+    def test_bulk_created_rows_are_indexed(self):
+        Donor.objects.bulk_create([
+            Donor(name='Carla Diaz', email='carla@example.com'),
+            Donor(name='Carlos Diaz', email='carlos@example.com'),
+        ])
+
+        self.assertEqual(sorted(self.names('diaz carl')), ['Carla Diaz', 'Carlos Diaz'])
+
+    def test_requests_filtered_by_hospital(self):
+        general = make_request('A+', 1)
+        make_request('A+', 1, hospital_name='Riverside Clinic')
+
+        matches = search_filter(BloodRequest.objects.all(), 'general hosp')
+
+        self.assertEqual(list(matches), [general])
+
+    def test_fallback_without_an_index(self):
+        with mock.patch('blood_bank.search.has_search_index', return_value=False):
+            self.assertEqual(self.names('smi ann'), ['Anna Smith'])
+            # icontains doesn't fold accents, so Ånderson is missed
+            self.assertEqual(list(search_filter(Donor.objects.all(), 'anderson')), [self.bob])
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_donor_list_search(self):
+        response = self.client.get(reverse('donor_list'), {'q': 'anna'})
+
+        self.assertEqual(list(response.context['donors']), [self.anna])
+        self.assertEqual(response.context['total_count'], 1)
+
+    def test_match_expression(self):
+        self.assertEqual(match_expression('ann-marie o\'neil'), '"ann"* "marie"* "o"* "neil"*')
+        self.assertIsNone(match_expression('*'))
@@ -0,0 +1,65 @@
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from blood_bank.sessions import SessionStore
+
+
+def session_writes(queries):
+    return [
+        query['sql'] for query in queries
+        if 'django_session' in query['sql'] and not query['sql'].startswith('SELECT')
+    ]
+
+
+class LowWriteSessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        store = SessionStore()
+        store['cart'] = [1, 2]
+        store.create()
+        self.key = store.session_key
+
+    def test_new_sessions_are_written_through(self):
+        self.assertEqual(Session.objects.get(pk=self.key).get_decoded(), {'cart': [1, 2]})
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(SessionStore(self.key)['cart'], [1, 2])
+
+    def test_unchanged_session_is_not_saved(self):
+        store = SessionStore(self.key)
+        store['cart'] = [1, 2]
+        self.assertTrue(store.modified)
+
+        with self.assertNumQueries(0):
+            store.save()
+
+    def test_changed_session_is_saved(self):
+        store = SessionStore(self.key)
+        store['cart'] = [1, 2, 3]
+
+        with CaptureQueriesContext(connection) as queries:
+            store.save()
+
+        self.assertTrue(session_writes(queries))
+        cache.clear()
+        self.assertEqual(SessionStore(self.key)['cart'], [1, 2, 3])
+
+    @override_settings(
+        SESSION_ENGINE='blood_bank.sessions', SESSION_SAVE_EVERY_REQUEST=True, INSTRUMENTATION_SAMPLE_RATE=0
+    )
+    def test_read_only_requests_write_nothing(self):
+        self.client.force_login(User.objects.create_user('reader', password='secret'))
+        self.client.get(reverse('home'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session_writes(queries), [])
@@ -0,0 +1,120 @@
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+
+from blood_bank.availability import availability_matrix
+from blood_bank.models import BloodInventory, BloodRequest
+
+from .helpers import BloodBankTestCase, add_lot, make_bank
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+class AvailabilityApiAsyncTests(BloodBankTestCase):
+    url = reverse('availability_api_async')
+
+    def setUp(self):
+        super().setUp()
+        self.north = make_bank('North')
+        self.south = make_bank('South')
+        add_lot(self.north, 'A+', 3)
+        add_lot(self.south, 'A+', 8)
+        add_lot(self.south, 'O-', 1)
+
+    async def test_banks_per_group_largest_stock_first(self):
+        response = await self.async_client.get(self.url, {'group': ['A+', 'O-', 'B+'], 'units': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'units': 2,
+            'availability': {
+                'A+': [
+                    {'id': self.south.pk, 'name': 'South', 'units': 8},
+                    {'id': self.north.pk, 'name': 'North', 'units': 3},
+                ],
+                'O-': [],
+                'B+': [],
+            },
+        })
+
+    def test_answered_from_the_availability_matrix(self):
+        availability_matrix.snapshot()
+        # Changes the matrix hasn't seen yet don't show until it reloads
+        BloodInventory.objects.filter(blood_bank=self.north).update(units_available=0)
+
+        # Only the bank names are read
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'group': 'A+'})
+
+        self.assertEqual([bank['id'] for bank in response.json()['availability']['A+']], [self.south.pk, self.north.pk])
+
+    def test_cold_matrix_is_loaded_alongside_the_names(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'group': 'O-'})
+
+        self.assertEqual(response.json()['availability']['O-'], [{'id': self.south.pk, 'name': 'South', 'units': 1}])
+        self.assertTrue(availability_matrix.is_warm())
+
+    async def test_warm_matrix_is_read_on_the_event_loop(self):
+        await sync_to_async(availability_matrix.snapshot)()
+
+        with mock.patch('blood_bank.views.sync_to_async', side_effect=AssertionError('left the event loop')):
+            response = await self.async_client.get(self.url, {'group': 'A+', 'units': 4})
+
+        self.assertEqual(response.json()['availability']['A+'], [{'id': self.south.pk, 'name': 'South', 'units': 8}])
+
+    async def test_rejects_bad_parameters(self):
+        for params in ({'units': 0}, {'units': -3}, {'units': 'many'}, {'group': 'C+'}):
+            with self.subTest(params=params):
+                response = await self.async_client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['status'], 'error')
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+class BloodBankListViewTests(BloodBankTestCase):
+    url = reverse('blood_bank_list')
+
+    def test_one_query_however_many_banks(self):
+        north = make_bank('North')
+        add_lot(north, 'A+', 3)
+        add_lot(north, 'O-', 2)
+        make_bank('South')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+
+        banks = response.context['blood_banks']
+        self.assertEqual([(bank.name, bank.total_inventory) for bank in banks], [('North', 5), ('South', 0)])
+        self.assertEqual(banks[0].get_inventory_by_group(), {
+            'A+': 3, 'A-': 0, 'B+': 0, 'B-': 0, 'O+': 0, 'O-': 2, 'AB+': 0, 'AB-': 0,
+        })
+
+        for i in range(10):
+            add_lot(make_bank(f"Bank {i}"), 'B+', i + 1)
+        self.client.get(self.url)
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['blood_banks']), 12)
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+class BloodRequestCreateViewTests(BloodBankTestCase):
+    url = reverse('blood_request_create')
+
+    def test_public_requests_are_routine(self):
+        add_lot(make_bank(), 'A+', 5)
+
+        response = self.client.post(self.url, {
+            'requester_name': 'Ward Sister', 'blood_group': 'A+', 'units_required': 2,
+            'hospital_name': 'General Hospital', 'hospital_address': '2 Main Street',
+            'contact_number': '+15550000001', 'email': 'ward@example.com',
+            'priority': 2,
+        })
+
+        self.assertRedirects(response, reverse('blood_request_list'))
+        self.assertEqual(BloodRequest.objects.get().priority, 0)
+        self.assertNotIn('priority', self.client.get(self.url).context['form'].fields)
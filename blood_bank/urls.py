@@ -24,4 +24,20 @@ urlpatterns = [
     
     # Blood Bank URLs
     path('banks/', views.BloodBankListView.as_view(), name='blood_bank_list'),
+
+    # Inventory API
+    path('api/inventory/', views.inventory_api, name='inventory_api'),
+    path('api/inventory/<int:bank_id>/', views.bank_inventory_api, name='bank_inventory_api'),
+    path('api/rollups/', views.rollups_api, name='rollups_api'),
+    path('api/nearest-banks/', views.nearest_banks_api, name='nearest_banks_api'),
+
+    # Async variants for ASGI deployments
+    path('async/banks/', views.blood_bank_list_async, name='blood_bank_list_async'),
+    path('api/async/inventory/', views.inventory_api_async, name='inventory_api_async'),
+    path('api/async/availability/', views.availability_api_async, name='availability_api_async'),
+
+    # Export URLs (staff only)
+    path('exports/donations/', views.export_donations, name='export_donations'),
+    path('exports/requests/', views.export_requests, name='export_requests'),
+    path('exports/inventory/', views.export_inventory, name='export_inventory'),
 ] 
\ No newline at end of file
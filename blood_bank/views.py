@@ -1,6 +1,11 @@
+import asyncio
+import functools
+import hashlib
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
 from django.contrib import messages
@@ -8,11 +13,30 @@ from django.views.generic import (
     ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
 )
 from django.urls import reverse_lazy
-from .models import BloodBank, Donor, BloodRequest, Donation, BloodInventory
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.db import transaction
+from .models import (
+    BloodBank, BloodGroup, Donor, BloodRequest, Donation, BloodInventory, BloodRequestAllocation
+)
+from .allocation import plan_allocation
+from .availability import availability_matrix
+from .geo import bank_locations
+from .jobs import enqueue
+from .pagination import KeysetPage, KeysetPaginationMixin
+from .routers import ReplicaReadMixin, use_replica
+from .response_cache import VersionedCacheMixin, versioned_cache
+from .rollups import rollup_report
+from .search import search
+from .tasks import send_request_notices
 from .forms import (
     DonorRegistrationForm, DonorProfileForm, BloodRequestForm,
-    DonationForm, BloodBankForm, UserRegistrationForm
+    DonationForm, BloodBankForm, UserRegistrationForm, ExportFilterForm, RollupFilterForm
 )
+from .exports import export_response
 from .exceptions import *
 
 class HomeView(TemplateView):
@@ -74,6 +98,7 @@ def request_blood(request):
     return render(request, 'blood_bank/request_blood.html', {'form': form})
 
 # Blood Bank List
+@versioned_cache(models=(BloodBank,))
 def blood_banks(request):
     banks = BloodBank.objects.all()
     return render(request, 'blood_bank/blood_banks.html', {'banks': banks})
@@ -132,31 +157,52 @@ class BloodRequestCreateView(SuccessMessageMixin, CreateView):
 
     def form_valid(self, form):
         try:
-            # Find suitable blood banks
+            # Plan where the units come from, allowing compatible groups
+            # and splitting across banks when no single bank has enough
             blood_group = form.cleaned_data['blood_group']
             units_required = form.cleaned_data['units_required']
-            
-            available_banks = BloodInventory.get_available_blood_banks(
-                blood_group, units_required
+
+            # Nearest banks first when the hospital location is known
+            plan = plan_allocation(
+                blood_group, units_required, near=form.instance.hospital_location
             )
 
-            if not available_banks.exists():
+            if not plan.is_complete:
                 messages.warning(
                     self.request,
                     f"No blood banks currently have {units_required} units of {blood_group} available."
                 )
                 # Save the request anyway with pending status
                 form.instance.status = 'pending'
-                return super().form_valid(form)
+                with transaction.atomic():
+                    response = super().form_valid(form)
+                    self.notify_received()
+                return response
 
-            # Assign to the first available blood bank
-            form.instance.blood_bank = available_banks.first().blood_bank
-            return super().form_valid(form)
+            # Assign to the blood bank supplying most of the units
+            form.instance.blood_bank_id = plan.primary_bank_id
+            with transaction.atomic():
+                response = super().form_valid(form)
+                BloodRequestAllocation.objects.bulk_create(
+                    BloodRequestAllocation(
+                        request=self.object,
+                        blood_bank_id=line.blood_bank_id,
+                        blood_group=line.blood_group,
+                        units=line.units
+                    )
+                    for line in plan.lines
+                )
+                self.notify_received()
+            return response
 
         except Exception as e:
             messages.error(self.request, str(e))
             return self.form_invalid(form)
 
+    def notify_received(self):
+        """Queue the acknowledgement email; the job worker sends it after the commit"""
+        enqueue(send_request_notices, {'request_id': self.object.pk, 'event': 'received'})
+
 class DonationCreateView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
     """View for creating donations"""
     model = Donation
@@ -182,36 +228,34 @@ class DonationCreateView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
             messages.error(self.request, f"An error occurred: {str(e)}")
             return self.form_invalid(form)
 
-class BloodBankListView(ListView):
+class BloodBankListView(VersionedCacheMixin, ListView):
     """View for listing blood banks"""
     model = BloodBank
+    cache_models = (BloodBank, BloodInventory)
     template_name = 'blood_bank/bloodbank_list.html'
     context_object_name = 'blood_banks'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        try:
-            for bank in context['blood_banks']:
-                bank.total_inventory = bank.get_total_inventory()
-        except Exception as e:
-            messages.error(self.request, f"Error loading inventory: {str(e)}")
-        return context
+    def get_queryset(self):
+        """Load banks with their inventory totals aggregated in a single query"""
+        return BloodBank.objects.with_inventory_totals().order_by('name')
 
-class BloodRequestListView(ListView):
+class BloodRequestListView(ReplicaReadMixin, KeysetPaginationMixin, ListView):
     """View for listing blood requests"""
     model = BloodRequest
     template_name = 'blood_bank/bloodrequest_list.html'
     context_object_name = 'requests'
+    keyset = ('request_date', 'id')
 
     def get_queryset(self):
         """Get all blood requests ordered by most recent first"""
         return BloodRequest.objects.all().order_by('-request_date')
 
-class DonationListView(LoginRequiredMixin, ListView):
+class DonationListView(LoginRequiredMixin, ReplicaReadMixin, KeysetPaginationMixin, ListView):
     """View for listing donations"""
     model = Donation
     template_name = 'blood_bank/donation_list.html'
     context_object_name = 'donations'
+    keyset = ('donation_date', 'id')
 
     def get_queryset(self):
         if self.request.user.is_staff:
@@ -220,18 +264,278 @@ class DonationListView(LoginRequiredMixin, ListView):
             donor=self.request.user.donor
         ).order_by('-donation_date')
 
+@versioned_cache()
 def home(request):
     return render(request, 'blood_bank/home.html')
 
 # Donor List View
-class DonorListView(ListView):
+class DonorListView(VersionedCacheMixin, ReplicaReadMixin, KeysetPaginationMixin, ListView):
     """View for listing all registered donors"""
     model = Donor
+    cache_models = (Donor,)
     template_name = 'blood_bank/donor_list.html'
     context_object_name = 'donors'
-    ordering = ['-created_at']
+    keyset = ('created_at', 'id')
+    count_strategy = 'estimate'
+
+    @property
+    def search_query(self):
+        return self.request.GET.get('q', '').strip()
+
+    def paginate_queryset(self, queryset, page_size):
+        # Searches show the best matches on a single page instead
+        if not self.search_query:
+            return super().paginate_queryset(queryset, page_size)
+        results = self.search_results = search(queryset, self.search_query)
+        page = KeysetPage(results, self.keyset, has_next=False, has_previous=False)
+        return None, page, results, False
+
+    def get_total_count(self):
+        if self.search_query:
+            return len(self.search_results), False
+        return super().get_total_count()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['total_donors'] = Donor.objects.count()
+        context['search_query'] = self.search_query
         return context
+
+# Data exports (staff only)
+def _export(request, name):
+    form = ExportFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
+    filters = form.cleaned_data
+    return export_response(
+        name,
+        export_format=filters['format'] or 'csv',
+        start=filters['start'],
+        end=filters['end'],
+        blood_bank=filters['blood_bank'],
+        blood_group=filters['blood_group']
+    )
+
+@user_passes_test(lambda user: user.is_staff)
+@use_replica
+def export_donations(request):
+    return _export(request, 'donations')
+
+@user_passes_test(lambda user: user.is_staff)
+@use_replica
+def export_requests(request):
+    return _export(request, 'requests')
+
+@user_passes_test(lambda user: user.is_staff)
+@use_replica
+def export_inventory(request):
+    return _export(request, 'inventory')
+
+# Inventory API
+def _inventory_aggregates():
+    return {
+        'last_updated': Max('last_updated'), 'rows': Count('id'), 'units': Sum('units_available')
+    }
+
+def _inventory_validators(state):
+    """Return ``(etag, last_modified)`` for the aggregate state of a set of inventory rows.
+
+    One aggregate query fingerprints the rows, so a poll whose data has
+    not changed is answered with 304 without loading the rows themselves.
+    """
+    fingerprint = f"{state['last_updated']}|{state['rows']}|{state['units']}"
+    etag = quote_etag(hashlib.md5(fingerprint.encode()).hexdigest())
+    last_modified = int(state['last_updated'].timestamp()) if state['last_updated'] else None
+    return etag, last_modified
+
+def _inventory_rows(inventory):
+    return inventory.order_by('blood_bank_id').values_list(
+        'blood_bank_id', 'blood_bank__name', 'blood_group', 'units_available'
+    )
+
+def _inventory_payload(rows):
+    banks = {}
+    for bank_id, bank_name, blood_group, units in rows:
+        bank = banks.setdefault(bank_id, {
+            'id': bank_id,
+            'name': bank_name,
+            'inventory': {group: 0 for group in BloodGroup.GROUPS},
+            'total': 0
+        })
+        bank['inventory'][blood_group] = units
+        bank['total'] += units
+    return list(banks.values())
+
+def _empty_bank_payload(bank):
+    return {
+        'id': bank.pk,
+        'name': bank.name,
+        'inventory': {group: 0 for group in BloodGroup.GROUPS},
+        'total': 0
+    }
+
+def _with_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+def _requested_bank_ids(request):
+    """Bank ids from ?bank=1&bank=2; raises ValueError for non-integers"""
+    return [int(bank_id) for bank_id in request.GET.getlist('bank')]
+
+def _conditional_json(request, inventory, build):
+    etag, last_modified = _inventory_validators(inventory.aggregate(**_inventory_aggregates()))
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(build())
+    return _with_validators(response, etag, last_modified)
+
+@user_passes_test(lambda user: user.is_staff)
+@require_safe
+@use_replica
+def rollups_api(request):
+    """Donation and request totals per day, bank or group, read from the daily rollups"""
+    form = RollupFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
+    filters = form.cleaned_data
+    by = filters.pop('by') or 'day'
+    return JsonResponse({'by': by, 'rows': rollup_report(by=by, **filters)})
+
+@require_safe
+def nearest_banks_api(request):
+    """The k nearest banks holding enough units (?lat=&lon=&group=&units=1&k=5)"""
+    try:
+        lat, lon = float(request.GET['lat']), float(request.GET['lon'])
+        units = int(request.GET.get('units', 1))
+        k = int(request.GET.get('k', 5))
+    except (KeyError, ValueError):
+        return JsonResponse(
+            {'status': 'error', 'message': 'lat and lon are required numbers; units and k are integers'},
+            status=400
+        )
+    blood_group = request.GET.get('group')
+    if blood_group not in BloodGroup.GROUPS:
+        return JsonResponse({'status': 'error', 'message': 'group must be a blood group'}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or units < 1 or not 1 <= k <= 50:
+        return JsonResponse({'status': 'error', 'message': 'parameter out of range'}, status=400)
+
+    found = bank_locations.nearest_with_stock(lat, lon, blood_group, units, k)
+    names = dict(BloodBank.objects.filter(pk__in=[bank_id for bank_id, _, _ in found])
+                 .values_list('id', 'name'))
+    return JsonResponse({
+        'blood_group': blood_group,
+        'banks': [
+            {'id': bank_id, 'name': names.get(bank_id), 'distance_km': round(km, 2),
+             'units_available': units_available}
+            for bank_id, km, units_available in found
+        ],
+    })
+
+@require_safe
+def inventory_api(request):
+    """Units available per blood group for many banks (?bank=1&bank=2, default all)"""
+    inventory = BloodInventory.objects.all()
+    try:
+        bank_ids = _requested_bank_ids(request)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'bank must be an integer id'}, status=400)
+    if bank_ids:
+        inventory = inventory.filter(blood_bank_id__in=bank_ids)
+    return _conditional_json(
+        request, inventory, lambda: {'banks': _inventory_payload(_inventory_rows(inventory))}
+    )
+
+@require_safe
+@versioned_cache(bank_kwarg='bank_id')
+def bank_inventory_api(request, bank_id):
+    """Units available per blood group for one bank"""
+    inventory = BloodInventory.objects.filter(blood_bank_id=bank_id)
+
+    def build():
+        banks = _inventory_payload(_inventory_rows(inventory))
+        if banks:
+            return banks[0]
+        return _empty_bank_payload(get_object_or_404(BloodBank, pk=bank_id))
+
+    return _conditional_json(request, inventory, build)
+
+# Async views, served natively under ASGI (blood_management_system.asgi).
+# They only read, and evaluate every queryset with the async ORM before
+# rendering so no query runs from the template.
+def require_safe_async(view):
+    """require_safe for async views; Django 4.2's decorator only wraps sync views"""
+    @functools.wraps(view)
+    async def inner(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        return await view(request, *args, **kwargs)
+    return inner
+
+@require_safe_async
+async def inventory_api_async(request):
+    """Async variant of inventory_api"""
+    inventory = BloodInventory.objects.all()
+    try:
+        bank_ids = _requested_bank_ids(request)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'bank must be an integer id'}, status=400)
+    if bank_ids:
+        inventory = inventory.filter(blood_bank_id__in=bank_ids)
+    etag, last_modified = _inventory_validators(await inventory.aaggregate(**_inventory_aggregates()))
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        rows = [row async for row in _inventory_rows(inventory)]
+        response = JsonResponse({'banks': _inventory_payload(rows)})
+    return _with_validators(response, etag, last_modified)
+
+def _banks_with_stock(groups, units):
+    return {group: availability_matrix.banks_with_stock(group, units) for group in groups}
+
+async def _availability_stock(groups, units):
+    """``{group: [(bank_id, units), ...]}`` from the availability matrix"""
+    if availability_matrix.is_warm():
+        # In memory; cheaper than a hop to a thread
+        return _banks_with_stock(groups, units)
+    # Reloading the matrix is a sync ORM call, so it runs off the event loop
+    return await sync_to_async(_banks_with_stock)(groups, units)
+
+async def _bank_names(groups):
+    """Names of the banks stocking any of ``groups``, from the async ORM"""
+    banks = BloodBank.objects.filter(bloodinventory__blood_group__in=groups).values_list('id', 'name')
+    return {bank_id: name async for bank_id, name in banks.distinct()}
+
+@require_safe_async
+async def availability_api_async(request):
+    """Banks holding at least ?units= units of each requested ?group=, largest stock first"""
+    groups = request.GET.getlist('group') or BloodGroup.GROUPS
+    try:
+        units = int(request.GET.get('units', 1))
+        for group in groups:
+            BloodGroup.validate_blood_group(group)
+    except (ValueError, InvalidBloodGroupError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    if units < 1:
+        return JsonResponse({'status': 'error', 'message': 'units must be at least 1'}, status=400)
+
+    # The stock lookup and the bank names are independent, so they run together
+    found, names = await asyncio.gather(_availability_stock(groups, units), _bank_names(groups))
+    availability = {
+        group: [
+            {'id': bank_id, 'name': names.get(bank_id), 'units': available}
+            for bank_id, available in banks
+        ]
+        for group, banks in found.items()
+    }
+    return JsonResponse({'units': units, 'availability': availability})
+
+@require_safe_async
+async def blood_bank_list_async(request):
+    """Async variant of BloodBankListView"""
+    banks = [
+        bank async for bank in BloodBank.objects.with_inventory_totals().order_by('name')
+    ]
+    return render(request, 'blood_bank/bloodbank_list.html', {
+        'blood_banks': banks,
+        'object_list': banks
+    })
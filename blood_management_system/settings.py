@@ -45,8 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'blood_bank.middleware.RequestInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'blood_bank.middleware.ReplicaStickinessMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -61,6 +63,8 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
+        # Without explicit 'loaders', Django wraps these in the cached loader;
+        # runserver's autoreloader resets it when a template changes
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -86,6 +90,38 @@ DATABASES = {
     }
 }
 
+# Production SQLite profile: BLOOD_BANK_DB_PROFILE=production switches to the
+# tuned backend (WAL, busy timeout, mmap, larger cache) with persistent
+# connections. BLOOD_BANK_DB_IMMEDIATE=1 additionally starts every
+# transaction with BEGIN IMMEDIATE.
+DB_PROFILE = os.environ.get('BLOOD_BANK_DB_PROFILE', 'default')
+
+if DB_PROFILE == 'production':
+    DATABASES['default'].update({
+        'ENGINE': 'blood_bank.backends.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'immediate_transactions': os.environ.get('BLOOD_BANK_DB_IMMEDIATE') == '1',
+        },
+    })
+
+# Read replicas for list pages, exports and admin changelists. Set
+# BLOOD_BANK_REPLICA_DB to a second SQLite file to try it locally.
+DATABASE_REPLICAS = []
+if os.environ.get('BLOOD_BANK_REPLICA_DB'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['BLOOD_BANK_REPLICA_DB'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+
+DATABASE_ROUTERS = ['blood_bank.routers.PrimaryReplicaRouter']
+
+# Seconds a client's reads stay on the primary after it writes
+REPLICA_STICKY_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -139,8 +175,18 @@ LOGIN_REDIRECT_URL = 'home'
 LOGIN_URL = 'login'
 LOGOUT_REDIRECT_URL = 'home'
 
-# Messages
-MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
+# Sessions and messages. The default low-write mode keeps flash messages in
+# a signed cookie (falling back to the session when they don't fit) and
+# reads sessions from the cache, writing them through to the database only
+# when their data changed. BLOOD_BANK_SESSION_MODE=db restores database
+# sessions with session-stored messages.
+SESSION_MODE = os.environ.get('BLOOD_BANK_SESSION_MODE', 'low-write')
+if SESSION_MODE == 'db':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+    MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
+else:
+    SESSION_ENGINE = 'blood_bank.sessions'
+    MESSAGE_STORAGE = 'django.contrib.messages.storage.fallback.FallbackStorage'
 
 # Crispy Forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
@@ -166,4 +212,81 @@ CSRF_TRUSTED_ORIGINS = [
 # Custom settings
 MINIMUM_DONATION_AGE = 18
 MINIMUM_DONATION_INTERVAL_DAYS = 90
+# Days donated red cells can be used for, counted from the collection date
+BLOOD_SHELF_LIFE_DAYS = 42
 MAXIMUM_REQUEST_UNITS = 10
+
+# Request instrumentation (Server-Timing header and a log line per sampled
+# request on the blood_bank.instrumentation logger)
+INSTRUMENTATION_SAMPLE_RATE = float(
+    os.environ.get('BLOOD_BANK_INSTRUMENTATION_SAMPLE_RATE', 1.0 if DEBUG else 0.01)
+)
+INSTRUMENTATION_N_PLUS_ONE_THRESHOLD = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'blood_bank.instrumentation': {
+            'handlers': ['console'],
+            'level': os.environ.get('BLOOD_BANK_INSTRUMENTATION_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Seconds the in-process blood availability matrix is trusted before it is
+# reloaded from the database (0 disables the cache)
+BLOOD_AVAILABILITY_CACHE_TTL = int(os.environ.get('BLOOD_AVAILABILITY_CACHE_TTL', 30))
+
+# Seconds the in-process index of blood bank coordinates is trusted before it
+# is rebuilt; local changes rebuild it straight away
+BLOOD_BANK_LOCATION_TTL = int(os.environ.get('BLOOD_BANK_LOCATION_TTL', 300))
+
+# Seconds the in-process copy of the low-stock thresholds is trusted before
+# it is reloaded; local changes reload it straight away
+STOCK_THRESHOLD_TTL = int(os.environ.get('BLOOD_BANK_STOCK_THRESHOLD_TTL', 300))
+
+# Shared cache for the versioned public page cache (blood_bank/response_cache.py).
+# Local memory is per process; point BLOOD_BANK_CACHE_DIR at a directory to
+# share pages and their versions between worker processes
+if os.environ.get('BLOOD_BANK_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['BLOOD_BANK_CACHE_DIR'],
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'blood-bank',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+    }
+
+# Seconds a cached public page is kept (0 disables the cache); data changes
+# invalidate pages straight away
+RESPONSE_CACHE_TTL = int(os.environ.get('BLOOD_BANK_RESPONSE_CACHE_TTL', 600))
+
+# Seconds a cached row of the donor and request lists is kept ({% cachedrows %},
+# keyed on the row's pk and updated_at; 0 disables it)
+FRAGMENT_CACHE_TTL = int(os.environ.get('BLOOD_BANK_FRAGMENT_CACHE_TTL', 3600))
+
+# Background jobs (blood_bank/jobs.py), run by `manage.py run_jobs`: worker
+# threads, jobs claimed per round, seconds between polls of an empty queue,
+# attempts before a job is left failed, seconds before the first retry
+# (doubling after each failure), seconds after which a claimed job is taken
+# to be abandoned, and days finished jobs are kept
+JOB_WORKER_THREADS = int(os.environ.get('BLOOD_BANK_JOB_THREADS', 4))
+JOB_BATCH_SIZE = 100
+JOB_POLL_INTERVAL = float(os.environ.get('BLOOD_BANK_JOB_POLL_INTERVAL', 1.0))
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 30
+JOB_LOCK_TIMEOUT = 600
+JOB_RETENTION_DAYS = 7